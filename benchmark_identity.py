@@ -0,0 +1,63 @@
+"""
+Benchmark of BaseModel.__hash__ and __eq__: identity key against the repr based versions
+they replaced. Builds a throwaway in-memory SQLite database, loads a player's units and
+times building a set of them, membership checks against that set, and reloading a
+relationship collection.
+
+Usage: python benchmark_identity.py [unit count]
+"""
+
+import sys
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import BaseModel, Player, Unit, UnitType
+
+def repr_hash(self):
+    return hash(repr(self))
+
+def repr_eq(self, other):
+    if not isinstance(other, self.__class__):
+        return False
+    return repr(self) == repr(other)
+
+def bench(label: str, session, player: Player, units: list[Unit]) -> None:
+    build = min(timeit.repeat(lambda: set(units), number=200, repeat=5)) / 200
+    probe = set(units)
+    member = min(timeit.repeat(lambda: [unit in probe for unit in units], number=200, repeat=5)) / 200
+
+    def reload():
+        session.expire(player, ["active_units"])
+        return player.active_units
+
+    load = min(timeit.repeat(reload, number=20, repeat=5)) / 20
+    print(f"{label}: set({len(units)} units) {build * 1e6:.0f}us, {len(units)} membership checks {member * 1e6:.0f}us, load active_units {load * 1e3:.2f}ms")
+
+def main(count: int) -> None:
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add(UnitType(unit_type="INF"))
+        player = Player(discord_id=1, name="benchmark")
+        session.add(player)
+        session.flush()
+        session.add_all([Unit(name=f"unit {i}", player_id=player.id, unit_type="INF", active=True) for i in range(count)])
+        session.commit()
+
+    session = Session()
+    player = session.query(Player).first()
+    units = session.query(Unit).all()
+    identity_hash, identity_eq = BaseModel.__hash__, BaseModel.__eq__
+    try:
+        BaseModel.__hash__, BaseModel.__eq__ = repr_hash, repr_eq
+        bench("repr", session, player, units)
+    finally:
+        BaseModel.__hash__, BaseModel.__eq__ = identity_hash, identity_eq
+    bench("identity key", session, player, units)
+    session.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
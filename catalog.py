@@ -0,0 +1,195 @@
+"""
+Read-through cache of the shop catalog: unit types, upgrade types, shop upgrades and which
+unit types can buy which upgrades.
+
+These tables only change when an admin edits them, but the shop and management views read
+them on every open and callback. `CatalogCache.get` returns an immutable `Catalog` snapshot
+with lookup indexes by id, name and unit type, so menus can be built without catalog queries.
+The snapshot is built with four plain column selects and replaced in one assignment, so
+readers always see either the old or the new catalog, never a mix.
+
+`CatalogCache.install` listens for session events: a transaction that flushed a catalog row
+invalidates the snapshot when it commits, and the next `get` rebuilds it. Writes that bypass
+the ORM unit of work (bulk `update()`/`delete()` statements, or `upgrade_uploader.py` running
+in another process) are not seen; call `invalidate` after those, the optional TTL covers the
+out of process case.
+"""
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from logging import getLogger
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import ShopUpgrade, ShopUpgradeUnitTypes, UnitType, UpgradeType
+
+logger = getLogger(__name__)
+
+catalog_rebuilds = Counter("armcobot_catalog_rebuilds_total", "Total number of catalog snapshot rebuilds")
+catalog_rebuild_time = Histogram("armcobot_catalog_rebuild_seconds", "Seconds taken to rebuild the catalog snapshot",
+                                 buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+CATALOG_MODELS = (UnitType, UpgradeType, ShopUpgrade, ShopUpgradeUnitTypes)
+
+@dataclass(frozen=True, slots=True)
+class UpgradeTypeEntry:
+    name: str
+    emoji: str
+    is_refit: bool
+    non_purchaseable: bool
+    can_use_unit_req: bool
+    sort_order: int
+
+@dataclass(frozen=True, slots=True)
+class ShopUpgradeEntry:
+    id: int
+    name: str
+    type: str
+    cost: int
+    refit_target: str | None
+    required_upgrade_id: int | None
+    disabled: bool
+    repeatable: int
+    sort_key: int
+
+@dataclass(frozen=True, slots=True)
+class UnitTypeEntry:
+    unit_type: str
+    is_base: bool
+    free_upgrade_1: int | None
+    free_upgrade_2: int | None
+    unit_req: int
+
+class Catalog:
+    """
+    An immutable snapshot of the catalog.
+
+    Attributes:
+        upgrade_types: Upgrade types by name, in sort order.
+        upgrades: Shop upgrades by id, ordered like the management upgrade list.
+        upgrades_by_name: Shop upgrades by name; names are not unique, so each maps to a tuple.
+        unit_types: Unit types by name.
+        upgrades_by_unit_type: The upgrades each unit type can buy, ordered like `Unit.available_upgrades`.
+        unit_types_by_upgrade: The unit types each upgrade id is compatible with.
+        generation: The `CatalogCache` generation the snapshot was built for.
+        built_at: `time.monotonic()` when the snapshot was built.
+    """
+
+    __slots__ = ("upgrade_types", "upgrades", "upgrades_by_name", "unit_types", "upgrades_by_unit_type", "unit_types_by_upgrade", "generation", "built_at")
+
+    def __init__(self, upgrade_types: list[UpgradeTypeEntry], upgrades: list[ShopUpgradeEntry], unit_types: list[UnitTypeEntry],
+                 compatibility: list[tuple[str, int]], generation: int = 0):
+        upgrades = sorted(upgrades, key=lambda upgrade: (upgrade.sort_key, upgrade.type, upgrade.id))
+        by_name: dict[str, list[ShopUpgradeEntry]] = {}
+        for upgrade in upgrades:
+            by_name.setdefault(upgrade.name, []).append(upgrade)
+        by_id = {upgrade.id: upgrade for upgrade in upgrades}
+        by_unit_type: dict[str, list[ShopUpgradeEntry]] = {unit_type.unit_type: [] for unit_type in unit_types}
+        by_upgrade: dict[int, list[str]] = {upgrade.id: [] for upgrade in upgrades}
+        for unit_type, upgrade_id in compatibility:
+            if unit_type not in by_unit_type or upgrade_id not in by_id:
+                continue
+            by_unit_type[unit_type].append(by_id[upgrade_id])
+            by_upgrade[upgrade_id].append(unit_type)
+        order = {upgrade.id: index for index, upgrade in enumerate(upgrades)}
+
+        self.upgrade_types: Mapping[str, UpgradeTypeEntry] = MappingProxyType({entry.name: entry for entry in sorted(upgrade_types, key=lambda entry: (entry.sort_order, entry.name))})
+        self.upgrades: Mapping[int, ShopUpgradeEntry] = MappingProxyType(by_id)
+        self.upgrades_by_name: Mapping[str, tuple[ShopUpgradeEntry, ...]] = MappingProxyType({name: tuple(entries) for name, entries in by_name.items()})
+        self.unit_types: Mapping[str, UnitTypeEntry] = MappingProxyType({entry.unit_type: entry for entry in unit_types})
+        self.upgrades_by_unit_type: Mapping[str, tuple[ShopUpgradeEntry, ...]] = MappingProxyType(
+            {unit_type: tuple(sorted(entries, key=lambda upgrade: order[upgrade.id])) for unit_type, entries in by_unit_type.items()})
+        self.unit_types_by_upgrade: Mapping[int, frozenset[str]] = MappingProxyType({upgrade_id: frozenset(names) for upgrade_id, names in by_upgrade.items()})
+        self.generation = generation
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def load(cls, session: Session, generation: int = 0) -> "Catalog":
+        """Build a snapshot from the database. Selects plain columns, so no ORM objects or eager loads are involved."""
+
+        upgrade_types = [UpgradeTypeEntry(*row) for row in session.execute(select(
+            UpgradeType.name, UpgradeType.emoji, UpgradeType.is_refit, UpgradeType.non_purchaseable, UpgradeType.can_use_unit_req, UpgradeType.sort_order))]
+        upgrades = [ShopUpgradeEntry(*row) for row in session.execute(select(
+            ShopUpgrade.id, ShopUpgrade.name, ShopUpgrade.type, ShopUpgrade.cost, ShopUpgrade.refit_target,
+            ShopUpgrade.required_upgrade_id, ShopUpgrade.disabled, ShopUpgrade.repeatable, ShopUpgrade.sort_key))]
+        unit_types = [UnitTypeEntry(*row) for row in session.execute(select(
+            UnitType.unit_type, UnitType.is_base, UnitType.free_upgrade_1, UnitType.free_upgrade_2, UnitType.unit_req))]
+        compatibility = [tuple(row) for row in session.execute(select(ShopUpgradeUnitTypes.unit_type, ShopUpgradeUnitTypes.shop_upgrade_id))]
+        return cls(upgrade_types, upgrades, unit_types, compatibility, generation)
+
+    def upgrade_type_of(self, upgrade: ShopUpgradeEntry) -> UpgradeTypeEntry | None:
+        return self.upgrade_types.get(upgrade.type)
+
+class CatalogCache:
+    """
+    Holds the current `Catalog` snapshot and rebuilds it after catalog edits.
+
+    Invalidation bumps a generation counter; `get` rebuilds when the snapshot is older than the
+    counter or than `ttl` seconds. Rebuilds are serialized by a lock, readers never take it.
+    """
+
+    _DIRTY = "catalog_dirty"
+
+    def __init__(self, sessionmaker: sessionmaker, ttl: float = 0.0):
+        self.sessionmaker = sessionmaker
+        self.ttl = ttl
+        self._snapshot: Catalog | None = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def install(self, target: Any) -> None:
+        """Listen for the session events of a sessionmaker, Session class or session."""
+
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "after_commit", self._after_commit)
+        event.listen(target, "after_rollback", self._after_rollback)
+
+    def _after_flush(self, session: Session, flush_context: Any) -> None:
+        if session.info.get(self._DIRTY):
+            return
+        if any(isinstance(obj, CATALOG_MODELS) for obj in itertools.chain(session.new, session.dirty, session.deleted)):
+            session.info[self._DIRTY] = True
+
+    def _after_commit(self, session: Session) -> None:
+        if session.info.pop(self._DIRTY, False):
+            self.invalidate()
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop(self._DIRTY, None)
+
+    def invalidate(self) -> None:
+        """Mark the snapshot stale; the next `get` rebuilds it."""
+
+        self._generation += 1
+        logger.debug(f"Catalog invalidated, generation {self._generation}")
+
+    def _fresh(self, snapshot: Catalog | None) -> bool:
+        if snapshot is None or snapshot.generation != self._generation:
+            return False
+        return not self.ttl or time.monotonic() - snapshot.built_at < self.ttl
+
+    def get(self) -> Catalog:
+        """The current snapshot, rebuilt first if it is stale."""
+
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if self._fresh(snapshot):
+                return snapshot # another thread rebuilt it while we waited
+            generation = self._generation
+            started = time.perf_counter()
+            with self.sessionmaker() as session:
+                snapshot = Catalog.load(session, generation)
+            catalog_rebuild_time.observe(time.perf_counter() - started)
+            catalog_rebuilds.inc()
+            self._snapshot = snapshot
+            logger.debug(f"Catalog rebuilt: {len(snapshot.unit_types)} unit types, {len(snapshot.upgrades)} upgrades")
+            return snapshot
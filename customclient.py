@@ -3,7 +3,7 @@ CustomClient is a specialized subclass of `discord.ext.commands.Bot` to facilita
 
 *Features*:
     - Integrates with SQLAlchemy for database operations.
-    - Uses an asynchronous task queue for handling various player and unit-related tasks.
+    - Uses an asynchronous, per-player coalescing task queue for handling various player and unit-related tasks.
     - Periodically keeps the database session alive.
     - Manages bot commands and extensions.
     - Syncs slash commands with Discord's command tree.
@@ -21,21 +21,25 @@ import asyncio
 import logging
 import os
 import traceback
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from os import unlink
-from typing import Any, Callable, overload
+from typing import Callable, overload
 
-from discord import Interaction, Intents, Status, Activity, ActivityType, Member, TextChannel, app_commands, NotFound
+from discord import Interaction, Intents, Status, Activity, ActivityType, Member, TextChannel, User, app_commands, NotFound
 from discord.ext.commands import Bot
 from discord.ext import tasks
 from prometheus_client import Counter, Gauge
-from sqlalchemy import text, func
+from sqlalchemy import inspect, text, func
 from sqlalchemy.orm import Session
+import dbmetrics
 import templates as tmpl
 from singleton import Singleton
+from catalog import CatalogCache
+from taskqueue import BULK, INTERACTIVE, LANES, AdaptivePacer, ChangeTracker, CoalescingQueue, QueueJournal, QueueTask, ThroughputMeter, backoff_delay, queue_deferred_size, queue_delayed_size, queue_lane_size
 
-from models import Config, Dossier, Extension, Medals, Player, PlayerUpgrade, Statistic, Unit
-from utils import EnvironHelpers, LastErrorRecord, RatelimitError, UserSemaphore, uses_db, RollingCounterDict, callback_listener, toggle_command_ban, is_management_no_notify, on_error_decorator, error_counter, fuzzy_autocomplete_caches
+from models import ConfigDict, DeadLetter, Dossier, Extension, Player, PlayerUpgrade, Statistic, StatisticPage, Unit, load_render_graph
+from utils import EnvironHelpers, LastErrorRecord, RatelimitError, UserSemaphore, content_hash, uses_db, RollingCounterDict, callback_listener, paginate, is_management_no_notify, on_error_decorator, error_counter, fuzzy_autocomplete_caches
 
 use_ephemeral = EnvironHelpers.get_bool("EPHEMERAL", False)
 
@@ -46,11 +50,21 @@ logging.getLogger("discord").setLevel(logging.WARNING)
 interaction_counter = Counter("armcobot_interactions_total", "Total number of interactions", labelnames=["guild_name"])
 ratelimited_counter = Counter("armcobot_ratelimited_total", "Total number of commands dropped due to ratelimits", labelnames=["guild_name"])
 queue_size_metric = Gauge("armcobot_queue_size", "The size of the queue")
+publish_retries = Counter("armcobot_publish_retries_total", "Total number of failed publish tasks scheduled for a retry")
+dead_letters = Counter("armcobot_dead_letters_total", "Total number of publish tasks given up on and moved to the dead letters")
+skipped_edits = Counter("armcobot_publish_skipped_edits_total", "Total number of message edits skipped because the content was unchanged", labelnames=["kind"])
 discord_latency = Gauge("armcobot_discord_latency_seconds", "The latency of the bot to Discord")
 discord_connection_status = Gauge("armcobot_discord_connection_status", "The connection status of the bot to Discord")
 
 _ACQUIRED = object()
 
+# models a deletion task (type 2) can target, by the class name stored in the task
+DELETABLE_MODELS = {model.__name__: model for model in (Dossier, Statistic, Unit, PlayerUpgrade)}
+
+# below this many tasks/s (nothing completing, e.g. during an outage) the presence shows no ETA
+MIN_ETA_THROUGHPUT = 1e-3
+MAX_ETA = timedelta(days=7)
+
 @Singleton
 class CustomClient(Bot): # need to inherit from Bot to use Cogs
     """
@@ -62,6 +76,8 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         - `use_ephemeral`: (bool) Controls whether to send messages as ephemeral.
         - `config`: (dict) Bot configuration loaded from the database.
         - `uses_db`: (Callable) A decorator for database operations.
+        - `async_sessionmaker`: (async_sessionmaker | None) Sessions on the async engine for `uses_async_db`, None unless ASYNC_DATABASE is set.
+        - `catalog`: (CatalogCache) Snapshot cache of unit types, upgrade types and shop upgrades.
     """
 
     mod_roles: set[int] = {EnvironHelpers.get_int("MOD_ROLE_1", 0), EnvironHelpers.get_int("MOD_ROLE_2", 0)}
@@ -71,67 +87,69 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
     config: dict
     last_error: LastErrorRecord | None = None
     sessionmaker: Callable
+    async_sessionmaker: Callable | None
+    catalog: CatalogCache
     start_time: datetime
 
-    def __init__(self, session: Session,/, sessionmaker: Callable, dialect: str, **kwargs):
+    def __init__(self, session: Session,/, sessionmaker: Callable, dialect: str, async_sessionmaker: Callable | None = None, **kwargs):
         """
         Initializes the CustomClient instance.
 
         Args:
             session (Session): The SQLAlchemy session for database operations.
+            async_sessionmaker (async_sessionmaker | None): Sessionmaker of the async engine, if there is one.
             **kwargs: Additional keyword arguments for the Bot constructor.
 
         Merges the `DEFAULTS` with provided `kwargs`, loads configurations, and initializes
-        the task queue. Additionally, loads or initializes `BOT_CONFIG` and `MEDAL_EMOTES` in the database.
+        the task queue. Additionally, loads the config rows and initializes `EXTENSIONS` and `MEDAL_EMOTES`.
         """
 
         defintents = Intents.default()
-        DEFAULTS = {"command_prefix":"\0", "intents":defintents}
+        # paces the publisher per channel, fed by the rate limit headers of every Discord response
+        self.publish_pacer = AdaptivePacer(EnvironHelpers.get_float("PUBLISH_RATE", 1.0), EnvironHelpers.get_float("PUBLISH_BURST", 5.0),
+                                           min_rate=EnvironHelpers.get_float("PUBLISH_MIN_RATE", 0.1), max_rate=EnvironHelpers.get_float("PUBLISH_MAX_RATE", 5.0))
+        DEFAULTS = {"command_prefix":"\0", "intents":defintents, "http_trace":self.publish_pacer.trace_config()}
         kwargs = {**DEFAULTS, **kwargs} # merge DEFAULTS and kwargs, kwargs takes precedence
         super().__init__(**kwargs)
         self.owner_ids = {EnvironHelpers.get_int("BOT_OWNER_ID", 0), EnvironHelpers.get_int("BOT_OWNER_ID_2", 0)}
         self.sessionmaker = sessionmaker
-        self.queue = asyncio.Queue()
+        self.async_sessionmaker = async_sessionmaker
+        self.queue = CoalescingQueue(EnvironHelpers.get_float("QUEUE_DEBOUNCE", 2.0), EnvironHelpers.get_int("QUEUE_INTERACTIVE_WEIGHT", 4),
+                                     high_watermark=EnvironHelpers.get_int("QUEUE_HIGH_WATERMARK", 1200), low_watermark=EnvironHelpers.get_int("QUEUE_LOW_WATERMARK", 800),
+                                     quotas={INTERACTIVE: EnvironHelpers.get_int("QUEUE_INTERACTIVE_QUOTA", 0), BULK: EnvironHelpers.get_int("QUEUE_BULK_QUOTA", 1000)})
+        self.publish_throughput = ThroughputMeter()
+        # committed changes to players, units and upgrades enqueue their own publish tasks
+        self.change_tracker = ChangeTracker(self.queue, EnvironHelpers.get_int("PUBLISH_TRACK_BULK_THRESHOLD", 25))
+        self.change_tracker.install(sessionmaker)
+        # immutable snapshot of the shop catalog, rebuilt after commits that edit it
+        self.catalog = CatalogCache(sessionmaker, EnvironHelpers.get_float("CATALOG_CACHE_TTL", 300.0))
+        self.catalog.install(sessionmaker)
+        if EnvironHelpers.get_bool("PERSIST_QUEUE"):
+            self.queue.journal = QueueJournal()
         self.dialect = dialect
         self.consumer_running = False
+        self._workers_running = 0 # publish workers that have not yet seen the termination task
         self.shutdown_hook_running = False
         self.queue_consumer_started = False
-        _Config = session.query(Config).filter(Config.key == "BOT_CONFIG").first()
-        if not _Config:
-            _Config = Config(key="BOT_CONFIG", value={"EXTENSIONS":[]})
-            session.add(_Config)
-            session.commit()
+        self._fetched_users: OrderedDict[int, User] = OrderedDict()
+        self._fetched_users_limit = max(1, EnvironHelpers.get_int("USER_CACHE_SIZE", 128))
+        self._presence: str | None = None # the presence text last sent by update_presence
+        # every config row, read from memory and written through to the database on assignment
+        self.config = ConfigDict(sessionmaker)
+        self.config.setdefault("EXTENSIONS", [])
+        _Medal_Emotes = self.config.setdefault("MEDAL_EMOTES", {})
 
         # If the stored value is a string (e.g., from pickle serialization), convert it to dict
-        if isinstance(_Config.value, str):
+        if isinstance(_Medal_Emotes, str):
             try:
                 import ast
                 # Try to safely evaluate the string as a Python literal
-                _Config.value = ast.literal_eval(_Config.value)
-                session.commit()  # Save the corrected value back to DB
+                _Medal_Emotes = self.config["MEDAL_EMOTES"] = ast.literal_eval(_Medal_Emotes)
             except (ValueError, SyntaxError):
                 # If ast fails, keep as string and log warning
-                logger.warning(f"Could not parse config value from string: {_Config.value}")
+                logger.warning(f"Could not parse medal_emotes value from string: {_Medal_Emotes}")
 
-        self.config = _Config.value  # type: ignore
-        _Medal_Emotes = session.query(Config).filter(Config.key == "MEDAL_EMOTES").first()
-        if not _Medal_Emotes:
-            _Medal_Emotes = Config(key="MEDAL_EMOTES", value={})
-            session.add(_Medal_Emotes)
-            session.commit()
-
-        # If the stored value is a string (e.g., from pickle serialization), convert it to dict
-        if isinstance(_Medal_Emotes.value, str):
-            try:
-                import ast
-                # Try to safely evaluate the string as a Python literal
-                _Medal_Emotes.value = ast.literal_eval(_Medal_Emotes.value)
-                session.commit()  # Save the corrected value back to DB
-            except (ValueError, SyntaxError):
-                # If ast fails, keep as string and log warning
-                logger.warning(f"Could not parse medal_emotes value from string: {_Medal_Emotes.value}")
-
-        self.medal_emotes: dict = _Medal_Emotes.value  # type: ignore
+        self.medal_emotes: dict = _Medal_Emotes  # type: ignore
         self.use_ephemeral = use_ephemeral
         self.tree.interaction_check = self.no_commands if os.path.exists("maintenance.flag") else self.check_banned_interaction # type: ignore
         self.user_semaphore = UserSemaphore(EnvironHelpers.get_int("RATELIMIT_MAX", 5), EnvironHelpers.get_float("RATELIMIT_DELAY", 0.1))
@@ -166,18 +184,19 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         """
         Synchronizes the bot configuration with the database.
 
-        Fetches and updates the in-memory configuration, ensuring the bot is synchronized with the database.
+        Assignments to `config` are written through when they happen, this writes back the
+        values that were changed in place, like `unit_types` or `EXTENSIONS`.
 
         Raises:
             SQLAlchemyError: If a database operation fails.
         """
-        _Config = session.query(Config).filter(Config.key == "BOT_CONFIG").first()
-        _Config.value = self.config  # type: ignore
-        logger.debug(f"Resynced config: {self.config}")
+        for key in self.config:
+            self.config.sync(key)
+        logger.debug(f"Resynced config: {dict(self.config)}")
 
-    async def queue_consumer(self, session: Session):
+    async def queue_consumer(self):
         """
-        Consumes tasks from the queue for processing player and unit actions.
+        Starts the publisher workers and supervises the queue until they terminate.
 
         *Task Types*:
             - **0**: Creation tasks.
@@ -186,11 +205,10 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             - **4**: Graceful termination of the queue consumer.
             - **5**: Keep-alive task (executes SELECT 1 to maintain database connection).
 
-        This method runs indefinitely, processing tasks from the queue and managing associated database
-        operations, while updating channels as necessary.
-
-        Raises:
-            Exception: If task processing encounters an error.
+        `PUBLISH_WORKERS` workers share the queue, which never hands the same player to two
+        workers at once, and pace their Discord calls per channel through `publish_pacer`.
+        The presence is kept up to date separately by `update_presence`. The queue bounds itself
+        through its watermarks and lane quotas, so commands keep working under load.
         """
 
         if self.consumer_running:
@@ -198,126 +216,103 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             return
         self.consumer_running = True
         logger.info("queue consumer started")
+        ratelimit = RollingCounterDict(30)
+        worker_count = max(1, EnvironHelpers.get_int("PUBLISH_WORKERS", 4))
+        self._workers_running = worker_count
+        workers = [asyncio.create_task(self._publish_worker(worker_id, ratelimit)) for worker_id in range(worker_count)]
+        logger.debug(f"Started {worker_count} publish workers")
+
+        await asyncio.wait(workers)
+        for worker in workers:
+            if not worker.cancelled() and worker.exception():
+                logger.error(f"Publish worker stopped with an error: {worker.exception()}")
+        self.consumer_running = False
+        logger.info("queue consumer stopped")
+
+    async def _publish_worker(self, worker_id: int, ratelimit: RollingCounterDict, session: Session):
+        """
+        Takes tasks from the queue and processes them until a termination task is received.
+        One of `PUBLISH_WORKERS` concurrent workers started by `queue_consumer`.
+        """
+
         unknown_handler = lambda task: logger.error(f"Unknown task type: {task}")
+        max_attempts = EnvironHelpers.get_int("PUBLISH_MAX_ATTEMPTS", 5)
+        retry_base = EnvironHelpers.get_float("PUBLISH_RETRY_BASE", 5.0)
+        retry_cap = EnvironHelpers.get_float("PUBLISH_RETRY_CAP", 600.0)
+        metrics_scope = f"{__name__}.CustomClient._publish_worker"
+        session.info[ChangeTracker.SUPPRESS] = True # the handlers share this session, their writes must not requeue
         handlers = {
             0: self._handle_create_task,
             1: self._handle_update_task,
             2: self._handle_delete_task,
             4: self._handle_terminate_task
         }
-        ratelimit = RollingCounterDict(30)
-        nosleep = True
-        queue_banned = False
-        size_at_ban = 2**64  # Large number to indicate no ban
 
         while True:
-            if nosleep:
-                await asyncio.sleep(0)
-                nosleep = False
-            else:
-                await asyncio.sleep(7)  # Maintain pacing to avoid hitting downstream timeouts
-            queue_size = self.queue.qsize()
-            eta = timedelta(seconds=queue_size * 7)
-            logger.debug(f"Queue size: {queue_size}, Empty in {eta}")
-            try:
-                await self.change_presence(status=Status.online, activity=Activity(name="Meta Campaign" if queue_size == 0 else f"Updating {queue_size} dossiers, Finished in {eta}", type=ActivityType.playing))
-            except Exception as e:
-                logger.debug("change_presence skipped (race with reflector or connection): %s", e)
-
-            if queue_size >= 1200 and not queue_banned:
-                logger.critical(f"Queue size is {queue_size}, this is too high!")
-                # fetch the discord user for the bot owner, message them, then call self.close()
-                owner = await self.fetch_user(EnvironHelpers.required_int("BOT_OWNER_ID"))
-                if owner:
-                    await owner.send("Queue size is too high, Initiating a System Ban")
-                await toggle_command_ban(True, self.user.mention)  # type: ignore
-                queue_banned = True
-                size_at_ban = queue_size
-            if queue_banned and queue_size < 100:
-                logger.debug("Queue size is below 100, disabling command ban")
-                await toggle_command_ban(False, self.user.mention)  # type: ignore
-                queue_banned = False
-                size_at_ban = 2**64  # Large number to indicate no ban
-            if queue_banned and queue_size >= size_at_ban+200:
-                logger.debug("Queue is still growing, Purging")
-                owner = await self.fetch_user(EnvironHelpers.required_int("BOT_OWNER_ID"))
-                if owner:
-                    await owner.send("Queue is still growing, Purging")
-                while not self.queue.empty():
-                    self.queue.get_nowait()
-                    self.queue.task_done()
             task = await self.queue.get()
-            if not isinstance(task, tuple):
-                logger.error("Task is not a tuple, skipping")
-                nosleep = True
-                continue
-            # we need to recraft the tuple before we can log it, because the session is detached
-            if len(task) == 3:
-                if not task[1]:
-                    logger.error("Task is a tuple of length 3, but the second element is None, skipping")
-                    nosleep = True
-                    continue
-                task = (task[0], session.merge(task[1]), task[2])
-            elif len(task) == 2:
-                if not task[1]:
-                    logger.error("Task is a tuple of length 2, but the second element is None, skipping")
-                    nosleep = True
-                    continue
-                task = (task[0], session.merge(task[1]), 0)
-            elif len(task) == 1:
-                if task[0] not in (4, 5):
-                    logger.error(f"Task is a tuple of length 1, but the first element is not 4 or 5, skipping: {task[0]}")
-                    nosleep = True
-                    continue
-            else:
-                logger.error(f"Task is a tuple of length {len(task)}, skipping")
-                nosleep = True
-                continue
-            # Skip ratelimit check for task types that don't have a player object (4, 5)
-            if task[0] not in (4, 5):
-                ratelimit.set(str(task[1]))  # type: ignore
-                if ratelimit.get(str(task[1])) >=5: # window is 30s, which is 6 tasks, this requires at least 50% different tasks  # type: ignore
-                    logger.warning(f"Ratelimit hit for {task[1]}")  # type: ignore
-                    nosleep = True
-                    continue # just discard the task
-            #logger.debug(f"Processing task: {task}")
-            # Initialize fail count
-            fail_count = task[2] if len(task) > 2 else 0
-            if fail_count > 5:
-                logger.error(f"Task {task} failed too many times, skipping")
-                nosleep = True
-                continue
-
-            # Handle keep-alive task directly using queue consumer's session
-            if task[0] == 5:
+            with dbmetrics.scope(metrics_scope): # the loop never returns, so each task gets its own scope
                 try:
-                    await self._handle_keep_alive_task(task, session)
-                except Exception as e:
-                    logger.error(f"Error processing keep-alive task: {e}")
-                self.queue.task_done()
-                continue
+                    if task.kind not in (4, 5) and task.id is None:
+                        logger.error(f"Task {task} has no target id, skipping")
+                        continue
+                    # Skip ratelimit check for task types that don't have a target (4, 5)
+                    if task.kind not in (4, 5):
+                        ratelimit.set(task.key)  # type: ignore
+                        if ratelimit.get(task.key) >=5: # window is 30s, this requires at least 50% different tasks  # type: ignore
+                            logger.warning(f"Ratelimit hit for {task.model} {task.id}")
+                            continue # just discard the task
+                    if task.attempts >= max_attempts:
+                        self._dead_letter(task, "Too many attempts", session)
+                        continue
+
+                    # Handle keep-alive task directly using the worker's session
+                    if task.kind == 5:
+                        try:
+                            await self._handle_keep_alive_task(task, session)
+                        except Exception as e:
+                            logger.error(f"Error processing keep-alive task: {e}")
+                        continue
 
-            try:
-                result = await handlers.get(task[0], unknown_handler)(task)
-                #session.expunge(task[1]) # expunge the instance to avoid memory leak or stale commits
-                if result:
-                    break
-            except Exception as e:
-                logger.error(f"Error processing task: {e}")
-                # Requeue the task with an incremented fail count
-                new_fail_count = fail_count + 1
-                if len(task) > 2:
-                    task = (*task[:2], new_fail_count)  # Update fail count
-                else:
-                    task = (*task, new_fail_count)  # Add fail count
-                self.queue.put_nowait(task)
-            self.queue.task_done()
-        self.consumer_running = False
-        logger.info("queue consumer stopped")
+                    try:
+                        result = await handlers.get(task.kind, unknown_handler)(task)
+                        if result:
+                            self._workers_running -= 1
+                            if self._workers_running > 0:
+                                self.queue.put_nowait(QueueTask(4)) # pass the termination on to the workers that haven't seen it yet
+                            break
+                        self.publish_throughput.record()
+                    except Exception as e:
+                        logger.error(f"Error processing task {task}: {e}")
+                        task = task.retry()
+                        if task.attempts >= max_attempts:
+                            self._dead_letter(task, e, session)
+                        else:
+                            # back off in the retry heap instead of requeueing at the tail
+                            publish_retries.inc()
+                            self.queue.schedule(task, backoff_delay(task.attempts, retry_base, retry_cap))
+                finally:
+                    self.queue.task_done(task)
+        logger.debug(f"Publish worker {worker_id} stopped")
+
+    def _dead_letter(self, task: QueueTask, error: Exception | str, session: Session):
+        """
+        Give up on a task: store it in the dead letters with its last error, to be
+        inspected, replayed or purged through /debug deadletters.
+        """
+
+        dead_letters.inc()
+        logger.error(f"Task {task} failed {task.attempts} times, moving it to the dead letters")
+        try:
+            session.add(DeadLetter(task_type=task.kind, model=task.model or "", target_id=task.id or 0, attempts=task.attempts,
+                                   error=str(error)[:1000], enqueued_at=datetime.fromtimestamp(task.enqueued_at), failed_at=datetime.now()))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error storing dead letter for task {task}: {e}")
 
     # we are going to start subdividing the queue consumer into multiple functions, for clarity
 
-    async def _handle_create_task(self, task: tuple[int, Player, int], session: Session):
+    async def _handle_create_task(self, task: QueueTask, session: Session):
         """
         Process a creation task (type 0): create or update dossier and
         statistics messages for the given player. Handles dossier channel
@@ -327,17 +322,17 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         if self.dialect == "mysql":
             session.execute(text("SET SESSION innodb_lock_wait_timeout = 10"))
 
-        if not isinstance(task[1], Player):
-            logger.error(f"Task type 0 (create) received non-Player instance: {type(task[1])}")
+        if task.player_id is None:
+            logger.error(f"Task type 0 (create) received non-Player target: {task.model}")
             return
         requeued = False
-        player = session.query(Player).filter(Player.id == task[1].id).first()
+        player = load_render_graph(session, [task.player_id]).get(task.player_id)
         if not player:
-            logger.error(f"Player with id {task[1].id} not found in database")
+            logger.error(f"Player with id {task.player_id} not found in database")
             return
 
         if self.config.get("dossier_channel_id"):
-            medals = session.query(Medals).filter(Medals.player_id == player.id).all()
+            medals = player.medals
             # identify what medals have known emotes
             known_emotes = set(self.medal_emotes.keys())
             known_medals = {medal.name for medal in medals if medal.name in known_emotes}
@@ -349,68 +344,56 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             unknown_text = "\n".join(unknown_medals_list)
             # convert the rows to a string of emotes, with a space between each emote
             medal_block = "\n".join([" ".join([self.medal_emotes[medal] for medal in row]) for row in rows]) + "\n" + unknown_text
-            mention = await self.fetch_user(int(player.discord_id))
-            mention = mention.mention if mention else ""
+            mention = player.mention
 
             # check for an existing dossier message, if it exists, skip creation
             create_dossier = True
-            existing_dossier = session.query(Dossier).filter(Dossier.player_id == player.id).first()
+            existing_dossier = player.dossier
             if existing_dossier:
-                # check if the message itself actually exists
-                channel = self.get_channel(self.config["dossier_channel_id"])
-                if channel:
-                    message = await channel.fetch_message(int(existing_dossier.message_id))  # type: ignore
-                    if message:
-                        logger.debug(f"Dossier message for player {player.id} already exists, skipping creation")
-                        self.queue.put_nowait((1, player, 0))
-                        create_dossier = False
-                        requeued = True
+                # the update edits the message in place and recreates it if it was deleted,
+                # so there's no need to fetch it here. Forget the hash so the edit isn't skipped
+                logger.debug(f"Dossier message for player {player.id} already exists, skipping creation")
+                existing_dossier.content_hash = None
+                self.queue.put_nowait(QueueTask.for_player(1, player.id))
+                create_dossier = False
+                requeued = True
 
             if not player.id:
                 logger.error(f"missing player id, skipping dossier creation")
                 create_dossier = False
 
             if create_dossier:
-                dossier_message = await self.get_channel(self.config["dossier_channel_id"]).send(  # type: ignore
-                    tmpl.Dossier.format(mention=mention, player=player, medals=medal_block)
-                )
-                dossier = Dossier(player_id=player.id, message_id=dossier_message.id)
+                content = tmpl.Dossier.format(mention=mention, player=player, medals=medal_block)
+                await self.publish_pacer.acquire(self.config["dossier_channel_id"])
+                dossier_message = await self.get_channel(self.config["dossier_channel_id"]).send(content)  # type: ignore
+                dossier = Dossier(player_id=player.id, message_id=dossier_message.id, content_hash=content_hash(content))
                 session.add(dossier)
                 logger.debug(f"Created dossier for player {player.id} with message ID {dossier_message.id}")
 
         if self.config.get("statistics_channel_id"):
             unit_message = await self.generate_unit_message(player)  # type: ignore
             _player = session.merge(player)
-            discord_id = _player.discord_id
-            mention = await self.fetch_user(int(discord_id))
-            mention = mention.mention if mention else ""
+            mention = _player.mention
 
             # check for an existing statistics message, if it exists, skip creation
-            existing_statistics = session.query(Statistic).filter(Statistic.player_id == _player.id).first()
+            existing_statistics = _player.statistic
             if existing_statistics:
-                # check if the message itself actually exists
-                channel = self.get_channel(self.config["statistics_channel_id"])
-                if channel:
-                    message = await channel.fetch_message(existing_statistics.message_id) # type: ignore
-                    if message:
-                        logger.debug(f"Statistics message for player {_player.id} already exists, skipping creation")
-                        if not requeued:
-                            self.queue.put_nowait((1, _player, 0))
-                            requeued = True
-                        return
+                # same as the dossier, the update takes care of a deleted message
+                logger.debug(f"Statistics message for player {_player.id} already exists, skipping creation")
+                existing_statistics.content_hash = None
+                if not requeued:
+                    self.queue.put_nowait(QueueTask.for_player(1, _player.id))
+                    requeued = True
+                return
 
             if not _player.id:
                 logger.error(f"missing player id, skipping statistics creation")
                 return
 
-            statistics_message = await self.get_channel(self.config["statistics_channel_id"]).send( # type: ignore
-                tmpl.Statistics_Player.format(mention=mention, player=_player, units=unit_message)
-            )
-            statistics = Statistic(player_id=_player.id, message_id=statistics_message.id)
-            session.add(statistics)
-            logger.debug(f"Created statistics for player {_player.id} with message ID {statistics_message.id}")
+            content = tmpl.Statistics_Player.format(mention=mention, player=_player, units=unit_message)
+            await self._publish_statistics(self.get_channel(self.config["statistics_channel_id"]), _player, None, content, session) # type: ignore
 
-    async def _handle_update_task(self, task: tuple[int, Player, int], session: Session):
+    async def _handle_update_task(self, task: QueueTask, session: Session):
         """
         Process an update task (type 1): refresh dossier and statistics
         messages for the given player, editing or recreating as needed.
@@ -422,20 +405,19 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             requeued = False
             logger.debug(f"handling update task")
 
-            if not isinstance(task[1], Player):
-                logger.error(f"Task type 1 (update) received non-Player instance: {type(task[1])}")
+            if task.player_id is None:
+                logger.error(f"Task type 1 (update) received non-Player target: {task.model}")
                 return
 
-            player = session.query(Player).filter(Player.id == task[1].id).first()
+            player = load_render_graph(session, [task.player_id]).get(task.player_id)
             if not player:
-                logger.error(f"Player with id {task[1].id} not found in database")
+                logger.error(f"Player with id {task.player_id} not found in database")
                 return
 
             logger.debug(f"Updating player: {player}")
 
             # Handle dossier update
-            logger.debug("fetching dossier")
-            dossier = session.query(Dossier).filter(Dossier.player_id == player.id).first()
+            dossier = player.dossier
             if dossier:
                 logger.debug("dossier found, fetching channel")
                 channel = self.get_channel(self.config["dossier_channel_id"])
@@ -443,91 +425,142 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
                     if not isinstance(channel, TextChannel):
                         logger.error(f"Channel {channel} is not a TextChannel, skipping dossier update")
                         return
-                    logger.debug("channel found, fetching message")
-                    try:
-                        message = await channel.fetch_message(dossier.message_id) # type: ignore
-                        logger.debug("message found, fetching user")
-                        mention = await self.fetch_user(int(player.discord_id))
-                        mention = mention.mention if mention else ""
-                        logger.debug("user found, editing message")
-                        await message.edit(content=tmpl.Dossier.format(mention=mention, player=player, medals=""))
-                        logger.debug(f"Updated dossier for player {player.id} with message ID {dossier.message_id}")
-                    except NotFound:
-                        logger.warning(f"Failed to fetch dossier message {dossier.message_id} for player {player.id}: message not found, sending new message")
-                        mention = await self.fetch_user(int(player.discord_id))
-                        mention = mention.mention if mention else ""
-                        new_message = await channel.send(tmpl.Dossier.format(mention=mention, player=player, medals=""))
-                        dossier.message_id = str(new_message.id)
-                        logger.debug(f"Created new dossier message for player {player.id} with message ID {new_message.id}")
+                    logger.debug("channel found, rendering dossier")
+                    content = tmpl.Dossier.format(mention=player.mention, player=player, medals="")
+                    digest = content_hash(content)
+                    if dossier.content_hash == digest:
+                        skipped_edits.labels("dossier").inc()
+                        logger.debug(f"Dossier for player {player.id} is unchanged, skipping edit")
+                    else:
+                        try:
+                            # edit through a partial message, a deleted message surfaces as NotFound from the edit
+                            await self.publish_pacer.acquire(channel.id)
+                            await channel.get_partial_message(int(dossier.message_id)).edit(content=content)
+                            logger.debug(f"Updated dossier for player {player.id} with message ID {dossier.message_id}")
+                        except NotFound:
+                            logger.warning(f"Failed to edit dossier message {dossier.message_id} for player {player.id}: message not found, sending new message")
+                            await self.publish_pacer.acquire(channel.id)
+                            new_message = await channel.send(content)
+                            dossier.message_id = str(new_message.id)
+                            logger.debug(f"Created new dossier message for player {player.id} with message ID {new_message.id}")
+                        dossier.content_hash = digest
             else:
                 logger.debug("no dossier found, pushing create task")
-                self.queue.put_nowait((0, player, 0))
+                self.queue.put_nowait(QueueTask.for_player(0, player.id))
                 requeued = True
                 logger.debug(f"Queued create task for player {player.id} due to missing dossier message Location 3")
 
             # Handle statistics update
-            statistics = session.query(Statistic).filter(Statistic.player_id == player.id).first()
+            statistics = player.statistic
             if statistics:
                 channel = self.get_channel(self.config["statistics_channel_id"])
                 if channel:
                     if not isinstance(channel, TextChannel):
                         logger.error(f"Channel {channel} is not a TextChannel, skipping statistics update")
                         return
-                    try:
-                        message = await channel.fetch_message(statistics.message_id) # type: ignore
-                        discord_id = player.discord_id
-                        unit_message = await self.generate_unit_message(player)  # type: ignore
-                        _player = session.merge(player)
-                        _statistics = session.merge(statistics)
-                        mention = await self.fetch_user(int(discord_id))
-                        mention = mention.mention if mention else ""
-                        await message.edit(content=tmpl.Statistics_Player.format(mention=mention, player=_player, units=unit_message))
-                        logger.debug(f"Updated statistics for player {_player.id} with message ID {_statistics.message_id}")
-                    except NotFound:
-                        logger.warning(f"Failed to fetch statistics message {statistics.message_id} for player {player.id}: message not found, sending new message")
-                        discord_id = player.discord_id
-                        unit_message = await self.generate_unit_message(player)  # type: ignore
-                        _player = session.merge(player)
-                        _statistics = session.merge(statistics)
-                        mention = await self.fetch_user(int(discord_id))
-                        mention = mention.mention if mention else ""
-                        new_message = await channel.send(tmpl.Statistics_Player.format(mention=mention, player=_player, units=unit_message))
-                        _statistics.message_id = str(new_message.id)
-                        logger.debug(f"Created new statistics message for player {_player.id} with message ID {new_message.id}")
+                    unit_message = await self.generate_unit_message(player)  # type: ignore
+                    _player = session.merge(player)
+                    _statistics = session.merge(statistics)
+                    content = tmpl.Statistics_Player.format(mention=_player.mention, player=_player, units=unit_message)
+                    await self._publish_statistics(channel, _player, _statistics, content, session)
                 else:
                     # there should be a message, but the discord side was probably deleted by a mod
                     logger.error(f"No channel found for statistics message of player {player.id}, skipping")
             else:
                 # user doesn't have a statistics message, push a create task
                 if not requeued:
-                    self.queue.put_nowait((0, player, 0))
+                    self.queue.put_nowait(QueueTask.for_player(0, player.id))
                     requeued = True
                     logger.debug(f"Queued create task for player {player.id} due to missing statistics message Location 4")
                 else:
                     logger.debug(f"Already queued create task for player {player.id} due to missing dossier message, but the statistics message is also missing Location 5")
 
-    async def _handle_delete_task(self, task: tuple[int, Any], session: Session):
+    async def _publish_statistics(self, channel: TextChannel, player: Player, statistic: Statistic | None, content: str, session: Session):
+        """
+        Publish a player's statistics, split over as many messages as the content needs.
+
+        The first page is the Statistic's own message, the rest are StatisticPage rows.
+        Only pages whose content changed are edited, missing pages are sent and pages the
+        content no longer needs are deleted, so the messages grow and shrink with it.
+        Pass `statistic=None` to create the statistics of a player that has none.
+        """
+
+        pages = paginate(content)
+        if statistic is None:
+            await self.publish_pacer.acquire(channel.id)
+            message = await channel.send(pages[0])
+            statistic = Statistic(player_id=player.id, message_id=message.id, content_hash=content_hash(pages[0]))
+            session.add(statistic)
+            logger.debug(f"Created statistics for player {player.id} with message ID {message.id}")
+        else:
+            await self._publish_statistics_page(channel, player, statistic, pages[0])
+
+        stored = {page.page: page for page in statistic.pages}
+        for number, page_content in enumerate(pages[1:], start=1):
+            page = stored.pop(number, None)
+            if page is None:
+                await self.publish_pacer.acquire(channel.id)
+                message = await channel.send(page_content)
+                statistic.pages.append(StatisticPage(page=number, message_id=str(message.id), content_hash=content_hash(page_content)))
+                logger.debug(f"Created statistics page {number} for player {player.id} with message ID {message.id}")
+            else:
+                await self._publish_statistics_page(channel, player, page, page_content)
+        for page in stored.values():
+            try:
+                await self.publish_pacer.acquire(channel.id)
+                await channel.get_partial_message(int(page.message_id)).delete()
+            except NotFound:
+                pass # already gone, only the row is left to remove
+            statistic.pages.remove(page)
+            logger.debug(f"Deleted statistics page {page.page} for player {player.id} with message ID {page.message_id}")
+
+    async def _publish_statistics_page(self, channel: TextChannel, player: Player, page: Statistic | StatisticPage, content: str):
+        """Edit one stored statistics message if its content changed, recreating it if it was deleted."""
+
+        digest = content_hash(content)
+        if page.content_hash == digest:
+            skipped_edits.labels("statistics").inc()
+            logger.debug(f"Statistics message {page.message_id} for player {player.id} is unchanged, skipping edit")
+            return
+        try:
+            await self.publish_pacer.acquire(channel.id)
+            await channel.get_partial_message(int(page.message_id)).edit(content=content)
+            logger.debug(f"Updated statistics for player {player.id} with message ID {page.message_id}")
+        except NotFound:
+            logger.warning(f"Failed to edit statistics message {page.message_id} for player {player.id}: message not found, sending new message")
+            await self.publish_pacer.acquire(channel.id)
+            new_message = await channel.send(content)
+            page.message_id = str(new_message.id)
+            logger.debug(f"Created new statistics message for player {player.id} with message ID {new_message.id}")
+        page.content_hash = digest
+
+    async def _handle_delete_task(self, task: QueueTask, session: Session):
         if self.dialect == "mysql":
             session.execute(text("SET SESSION innodb_lock_wait_timeout = 10"))
         logger.debug(f"requerying instance for delete task")
         with session.no_autoflush: # disable flush on delete, to avoid a reinsert
-            instance = session.query(task[1].__class__).filter(task[1].__class__.id == task[1].id).first()
+            model = DELETABLE_MODELS.get(task.model)
+            instance = session.get(model, task.id) if model else None
         logger.debug(f"instance found for delete task: {instance}") # we can't log the task as it's possibly unbound, but we can log the instance
         requeued = False
         if isinstance(instance, Dossier):
             dossier = instance
             channel = self.get_channel(self.config["dossier_channel_id"])
             if channel:
-                message = await channel.fetch_message(dossier.message_id) # type: ignore
-                await message.delete()
+                await self.publish_pacer.acquire(channel.id)
+                await channel.get_partial_message(int(dossier.message_id)).delete() # type: ignore
                 logger.debug(f"Deleted dossier message ID {dossier.message_id} for player {dossier.player_id}")
         elif isinstance(instance, Statistic):
             statistic = instance
             channel = self.get_channel(self.config["statistics_channel_id"])
             if channel:
-                message = await channel.fetch_message(statistic.message_id) # type: ignore
-                await message.delete()
+                await self.publish_pacer.acquire(channel.id)
+                await channel.get_partial_message(int(statistic.message_id)).delete() # type: ignore
                 logger.debug(f"Deleted statistics message ID {statistic.message_id} for player {statistic.player_id}")
+                for page in statistic.pages:
+                    await self.publish_pacer.acquire(channel.id)
+                    await channel.get_partial_message(int(page.message_id)).delete() # type: ignore
+                    logger.debug(f"Deleted statistics page {page.page} message ID {page.message_id} for player {statistic.player_id}")
         elif isinstance(instance, Unit):
             logger.debug(f"instance is a unit, expunging")
             session.expunge(instance)
@@ -536,7 +569,7 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             player = session.query(Player).filter(Player.id == unit.player_id).first()
             if player:
                 if not requeued:
-                    self.queue.put_nowait((1, player))
+                    self.queue.put_nowait(QueueTask.for_player(1, player.id))
                     logger.debug(f"Queued update task for player {player.id} due to unit {unit.id} Location 7")
                     requeued = True
                 else:
@@ -550,7 +583,7 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             player = session.query(Player).filter(Player.id == unit.player_id).first()
             if player:
                 if not requeued:
-                    self.queue.put_nowait((1, player))
+                    self.queue.put_nowait(QueueTask.for_player(1, player.id))
                     logger.debug(f"Queued update task for player {player.id} due to upgrade {upgrade.id} Location 8")
                     requeued = True
                 else:
@@ -589,10 +622,13 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         logger.debug(f"Generating unit message for player: {player.id}")
         unit_messages = []
 
-        units = session.query(Unit).filter(Unit.player_id == player.id).all()
+        if "units" in inspect(player).unloaded:
+            # not loaded by the caller, load the whole render graph instead of a query per unit
+            player = load_render_graph(session, [player.id]).get(player.id, player)
+        units = player.units
         logger.debug(f"Found {len(units)} units for player: {player.id}")
         for unit in units:
-            upgrades = session.query(PlayerUpgrade).filter(PlayerUpgrade.unit_id == unit.id).all()
+            upgrades = unit.upgrades
             upgrade_list = ", ".join([upgrade.name for upgrade in upgrades])
             logger.debug(f"Unit {unit.name} of type {unit.unit_type} has status {unit.status.name}")
             logger.debug(f"Unit {unit.id} has upgrades: {upgrade_list}")
@@ -665,21 +701,46 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             pass  # File doesn't exist, which is fine
         #await self.set_bot_nick("S.A.M.")
         await self.change_presence(status=Status.online, activity=Activity(name="Meta Campaign", type=ActivityType.playing))
+        self._presence = "Meta Campaign"
         if EnvironHelpers.get_bool("STARTUP_ANIMATION", False):
             try:
                 self.startup_animation.start()
             except Exception as e:
                 logger.error(f"Error starting startup animation: {e}")
 
+    async def get_or_fetch_user(self, user_id: int) -> User:
+        """
+        Return the Discord user with the given ID, from the gateway cache if it's there,
+        then from a bounded cache of previously fetched users, and only then from the API.
+
+        Use this where a real User is needed, e.g. to send a DM. For a mention, format
+        `<@id>` or use `Player.mention` instead, which never needs a user object.
+
+        Raises:
+            discord.NotFound: If no user with the ID exists.
+        """
+
+        user = self.get_user(user_id)
+        if user is not None:
+            return user
+        user = self._fetched_users.get(user_id)
+        if user is not None:
+            self._fetched_users.move_to_end(user_id)
+            return user
+        user = await self.fetch_user(user_id)
+        self._fetched_users[user_id] = user
+        if len(self._fetched_users) > self._fetched_users_limit:
+            self._fetched_users.popitem(last=False) # evict the least recently used user
+        return user
+
     async def shutdown_callback(self):
         try:
             channel = await self.fetch_channel(EnvironHelpers.required_int("COMM_NET_CHANNEL_ID"))
         except Exception as e:
             logger.error(f"Error fetching channel: {e}")
             channel = None
-        owner = await self.fetch_user(EnvironHelpers.required_int("BOT_OWNER_ID"))
         if channel:
-            await channel.send(f"{owner.mention}\n# S.A.M. was terminated by the system") # type: ignore
+            await channel.send(f"<@{EnvironHelpers.required_int('BOT_OWNER_ID')}>\n# S.A.M. was terminated by the system") # type: ignore
         await self.close()  # type: ignore
 
     @tasks.loop(count=1)
@@ -707,8 +768,7 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         channel = await self.fetch_channel(EnvironHelpers.required_int("COMM_NET_CHANNEL_ID"))
         if not channel:
             return
-        owner = await self.fetch_user(EnvironHelpers.required_int("BOT_OWNER_ID"))
-        await channel.send(f"{owner.mention}\n# I have successfully survived 24 Hours!") # type: ignore
+        await channel.send(f"<@{EnvironHelpers.required_int('BOT_OWNER_ID')}>\n# I have successfully survived 24 Hours!") # type: ignore
         logger.debug("24 hour notification loop finished")
         self.notify_on_24_hours.cancel()
 
@@ -734,15 +794,66 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         import prometheus
         prometheus.poll_metrics_slow.stop()
         self.clear_autocomplete_caches.cancel()
-        await self.queue.put((4,))
+        self.update_presence.cancel()
+        await self.queue.put(QueueTask(4))
+        if self.queue.journal is not None:
+            self.persist_queue.cancel()
+            with self.sessionmaker() as journal_session:
+                self.queue.journal.flush(journal_session)
         await self.resync_config(session=session)
         await self.change_presence(status=Status.offline, activity=None)
         await super().close()
 
+    @tasks.loop(seconds=EnvironHelpers.get_float("QUEUE_FLUSH_INTERVAL", 5.0))
+    async def persist_queue(self):
+        """
+        Write the queue journal's changes since the last run to the database, so pending
+        publish tasks survive a restart. Called periodically by a loop when PERSIST_QUEUE is set.
+        """
+
+        if self.queue.journal is None:
+            return
+        try:
+            with self.sessionmaker() as session:
+                flushed = self.queue.journal.flush(session)
+            if flushed:
+                logger.debug(f"Persisted {flushed} queue changes")
+        except Exception as e:
+            logger.error(f"Error persisting the queue, will retry: {e}")
+
+    @tasks.loop(seconds=EnvironHelpers.get_float("PRESENCE_INTERVAL", 30.0))
+    async def update_presence(self):
+        """
+        Show the queue size and when it will be empty in the bot's presence. Runs every
+        PRESENCE_INTERVAL seconds and only sends a presence update when the text changed,
+        since presence updates are rate limited and share the gateway with everything else.
+        The ETA is based on an EWMA of the measured publish throughput, left out while that
+        has decayed below MIN_ETA_THROUGHPUT and capped at MAX_ETA.
+        """
+
+        queue_size = self.queue.qsize() + self.queue.deferred
+        # measured throughput once there is some, the pacer's allowance before that
+        throughput = self.publish_throughput.sample() or self.publish_pacer.rate
+        if queue_size == 0:
+            presence = "Meta Campaign"
+        elif throughput < MIN_ETA_THROUGHPUT:
+            presence = f"Updating {queue_size} dossiers"
+        else:
+            eta = timedelta(seconds=round(min(queue_size / throughput, MAX_ETA.total_seconds())))
+            presence = f"Updating {queue_size} dossiers, Finished in {eta}"
+        logger.debug(f"Queue size: {queue_size}, publishing {throughput:.2f} tasks/s")
+        if presence == self._presence or not self.is_ready():
+            return
+        try:
+            await self.change_presence(status=Status.online, activity=Activity(name=presence, type=ActivityType.playing))
+            self._presence = presence
+        except Exception as e:
+            logger.debug("change_presence skipped (race with reflector or connection): %s", e)
+
     @tasks.loop(minutes=15)
     async def keep_alive(self):
         # emit a keep-alive task into the queue for the consumer to handle
-        self.queue.put_nowait((5,))
+        self.queue.put_nowait(QueueTask(5))
         logger.debug("Keep-alive task queued")
 
     async def setup_hook(self):
@@ -835,18 +946,23 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             self.version = stdout.decode().strip()
 
         # wrap all the consumer methods in uses_db now, since we can access the sessionmaker after init
-        decorator = uses_db(sessionmaker=self.sessionmaker)
-        self.queue_consumer = decorator(self.queue_consumer)
+        # the publish workers run concurrently, so each task gets its own session, removed again when its outermost call returns
+        decorator = uses_db(sessionmaker=self.sessionmaker, scopefunc=asyncio.current_task)
+        self._publish_worker = decorator(self._publish_worker, metrics_scope=False) # never returns, its scope would never close
         self._handle_create_task = decorator(self._handle_create_task)
         self._handle_update_task = decorator(self._handle_update_task)
         self._handle_delete_task = decorator(self._handle_delete_task)
-        # Note: _handle_keep_alive_task is NOT wrapped with uses_db - it uses queue_consumer's session directly
+        # Note: _handle_keep_alive_task is NOT wrapped with uses_db - it uses the publish worker's session directly
         self.generate_unit_message = decorator(self.generate_unit_message)  # type: ignore
         self.close = decorator(self.close)
         self.tree.on_error = on_error_decorator(error_counter)(self.tree.on_error)  # type: ignore
 
         # Set up queue_size_metric to use a callback function instead of manual updates
         queue_size_metric.set_function(self.queue.qsize)
+        for lane in LANES:
+            queue_lane_size.labels(lane).set_function(lambda lane=lane: self.queue.qsize(lane))
+        queue_delayed_size.set_function(lambda: self.queue.delayed)
+        queue_deferred_size.set_function(lambda: self.queue.deferred)
         discord_latency.set_function(lambda: (self.latency if self.is_ready() else float("nan")))
         discord_connection_status.set_function(lambda: bool(self.is_ready()))
 
@@ -860,7 +976,12 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         # Start queue consumer
         if not self.queue_consumer_started:
             self.queue_consumer_started = True
+            if self.queue.journal is not None:
+                with self.sessionmaker() as session:
+                    self.queue.journal.replay(session, self.queue)
+                self.persist_queue.start()
             asyncio.create_task(self.queue_consumer())  # type: ignore
+            self.update_presence.start()
             logger.debug("Queue consumer task started")
 
         # Start shutdown listener
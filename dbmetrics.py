@@ -0,0 +1,184 @@
+"""
+SQL instrumentation through SQLAlchemy engine events.
+
+`install` hooks `before_cursor_execute`/`after_cursor_execute` on an engine. Every statement is
+attributed to the innermost active `scope`, which `uses_db` and `uses_async_db` open around the
+command, view callback or loop they wrap, labelled with its qualified name. When a scope ends,
+the number of statements it issued, the time they took and the rows the driver reported are
+observed in per-scope histograms. Statements slower than the slow query threshold are logged
+with their normalized SQL.
+
+The optional N+1 detector counts identical statements within a scope. Lazy loads walked in a
+loop issue the same SQL text once per object, so a statement repeated `repeat_threshold` times
+is reported once, with the line of bot code that issued it, as a warning or as an
+`NPlusOneError`. Counting is a dict increment per statement; the call site is only looked up
+when a report is made.
+
+Every statement is also counted by whether its compiled form came from the engine's compiled
+cache, and the cache size is exported, so statements that miss the cache on every call show up.
+"""
+
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from typing import Any, Iterator
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, default
+
+logger = getLogger(__name__)
+
+scope_statements = Histogram("armcobot_db_scope_statements", "Number of SQL statements issued per command, callback or loop run", labelnames=["scope"],
+                             buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+scope_seconds = Histogram("armcobot_db_scope_seconds", "Seconds spent executing SQL per command, callback or loop run", labelnames=["scope"],
+                          buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+scope_rows = Histogram("armcobot_db_scope_rows", "Rows reported by the driver per command, callback or loop run", labelnames=["scope"],
+                       buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000))
+statements_total = Counter("armcobot_db_statements_total", "Total number of SQL statements executed", labelnames=["scope"])
+slow_queries = Counter("armcobot_db_slow_queries_total", "Total number of SQL statements slower than the slow query threshold", labelnames=["scope"])
+repeated_queries = Counter("armcobot_db_repeated_queries_total", "Total number of statements the N+1 detector reported", labelnames=["scope"])
+compiled_cache_lookups = Counter("armcobot_db_compiled_cache_total", "Total number of statements by compiled cache outcome", labelnames=["result"])
+compiled_cache_size = Gauge("armcobot_db_compiled_cache_size", "Number of compiled statements held in the engine's compiled cache", labelnames=["driver"])
+
+_cache_results = {
+    default.CACHE_HIT: "hit",
+    default.CACHE_MISS: "miss",
+    default.CACHING_DISABLED: "disabled",
+    default.NO_CACHE_KEY: "no_key",
+    default.NO_DIALECT_SUPPORT: "unsupported",
+}
+
+UNSCOPED = "unscoped"
+
+class QueryStats:
+    """Statements, execution time and rows accumulated by one scope."""
+
+    __slots__ = ("name", "statements", "seconds", "rows", "repeats")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.statements = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.repeats: dict[str, int] | None = None # normalized statement -> times executed, only with the N+1 detector on
+
+class NPlusOneError(RuntimeError):
+    """Raised by the N+1 detector, when configured to raise, for a statement repeated too often in one scope."""
+
+_current: ContextVar[QueryStats | None] = ContextVar("dbmetrics_scope", default=None)
+
+@contextmanager
+def scope(name: str) -> Iterator[QueryStats]:
+    """
+    Attribute the statements executed in this context to `name` and observe the totals in
+    the per-scope histograms on exit. Nested scopes are counted separately.
+    """
+
+    stats = QueryStats(name)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        if stats.statements:
+            scope_statements.labels(scope=name).observe(stats.statements)
+            scope_seconds.labels(scope=name).observe(stats.seconds)
+            scope_rows.labels(scope=name).observe(stats.rows)
+
+_whitespace = re.compile(r"\s+")
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_placeholder_lists = re.compile(r"\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)")
+
+def normalize_sql(statement: str) -> str:
+    """
+    Collapse a statement to its shape for logging: whitespace squeezed, literals replaced by
+    `?` and placeholder lists of any length (as in large IN clauses) shortened to `(?, ...)`.
+    """
+
+    statement = _whitespace.sub(" ", statement).strip()
+    statement = _literals.sub("?", statement)
+    return _placeholder_lists.sub("(?, ...)", statement)
+
+def _before_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    conn.info.setdefault("dbmetrics_started", []).append(time.perf_counter())
+
+_project_root = os.path.dirname(os.path.abspath(__file__))
+
+def _call_site() -> str:
+    """The innermost frame of bot code on the stack, skipping this module and libraries."""
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_project_root) and filename != os.path.abspath(__file__) and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, _project_root)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+def _count_repeat(stats: QueryStats, statement: str, repeat_threshold: int, raise_on_repeat: bool) -> None:
+    if stats.repeats is None:
+        stats.repeats = {}
+    # keyed on the shape, so the same lookup with inlined literals or a different IN list length still counts as a repeat
+    shape = normalize_sql(statement)
+    count = stats.repeats[shape] = stats.repeats.get(shape, 0) + 1
+    if count != repeat_threshold:
+        return # report each statement once per scope
+    repeated_queries.labels(scope=stats.name).inc()
+    message = f"Possible N+1 in {stats.name}: statement executed {count} times, last from {_call_site()}: {shape}"
+    if raise_on_repeat:
+        raise NPlusOneError(message)
+    logger.warning(message)
+
+def _record(conn: Any, cursor: Any, statement: str, context: Any, slow_query_threshold: float) -> None:
+    started = conn.info.get("dbmetrics_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    compiled_cache_lookups.labels(result=_cache_results.get(getattr(context, "cache_hit", None), "no_key")).inc()
+    stats = _current.get()
+    name = stats.name if stats is not None else UNSCOPED
+    statements_total.labels(scope=name).inc()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+        stats.rows += max(getattr(cursor, "rowcount", -1), 0) # -1 when the driver doesn't know
+    if elapsed >= slow_query_threshold:
+        slow_queries.labels(scope=name).inc()
+        logger.warning(f"Slow query in {name}: {elapsed:.3f}s: {normalize_sql(statement)}")
+
+def _handle_error(exception_context: Any) -> None:
+    # a failed statement never reaches after_cursor_execute, drop its start time
+    started = exception_context.connection.info.get("dbmetrics_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+def install(engine: Engine, slow_query_threshold: float = 0.5, repeat_threshold: int = 0, raise_on_repeat: bool = False) -> None:
+    """
+    Instrument an engine. For an AsyncEngine pass its `sync_engine`.
+
+    Args:
+        engine: The engine to instrument.
+        slow_query_threshold: Statements taking at least this many seconds are logged.
+        repeat_threshold: Report a statement executed this many times in one scope as a
+            possible N+1, 0 to turn the detector off.
+        raise_on_repeat: Raise `NPlusOneError` instead of logging a warning.
+    """
+
+    def after_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        _record(conn, cursor, statement, context, slow_query_threshold)
+        if repeat_threshold > 0:
+            stats = _current.get()
+            if stats is not None:
+                _count_repeat(stats, statement, repeat_threshold, raise_on_repeat)
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    if engine._compiled_cache is not None:
+        compiled_cache_size.labels(driver=engine.dialect.driver).set_function(lambda: len(engine._compiled_cache))
+    logger.debug(f"Instrumented {engine.dialect.name} engine, slow query threshold {slow_query_threshold}s")
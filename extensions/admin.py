@@ -10,11 +10,13 @@ from discord.ext.commands import GroupCog
 from discord.ext import tasks
 from discord.ui import Modal, TextInput
 from prometheus_client import Gauge
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
 from customclient import CustomClient
-from models import Player, Unit, UnitStatus, PlayerUpgrade, Medals
+from models import Dossier, Player, Unit, UnitStatus, PlayerUpgrade, Medals, Statistic, StatisticPage, player_by_discord_id
 from prometheus import as_of
+from taskqueue import BULK
 from utils import EnvironHelpers, error_reporting, has_invalid_url, uses_db, filter_df, is_management, RecordingView
 
 logger = getLogger(__name__)
@@ -23,6 +25,24 @@ logger = getLogger(__name__)
 players_remaining = Gauge("armcobot_players_remaining", "The number of players remaining to be backpaid", labelnames=["backpay_type"])
 paid_today = Gauge("armcobot_paid_today", "The number of players paid today", labelnames=["backpay_type"])
 
+def _forget_content_hashes(session: Session, player_id: int | None = None):
+    """
+    Clear the content hashes of the published dossiers, statistics and statistic pages, of one
+    player or of everyone, so a refresh edits every message instead of skipping unchanged content.
+    An edit of a message that was deleted on Discord fails, and the publisher recreates it.
+    """
+
+    dossiers = update(Dossier).values(content_hash=None)
+    statistics = update(Statistic).values(content_hash=None)
+    pages = update(StatisticPage).values(content_hash=None)
+    if player_id is not None:
+        dossiers = dossiers.where(Dossier.player_id == player_id)
+        statistics = statistics.where(Statistic.player_id == player_id)
+        pages = pages.where(StatisticPage.statistic_id.in_(select(Statistic.id).where(Statistic.player_id == player_id)))
+    for statement in (dossiers, statistics, pages):
+        session.execute(statement)
+    session.commit()
+
 class Admin(GroupCog, group_name="admin", name="Admin", description="Admin commands for players, units, points, and medals."):
     """
     Admin commands for managing players, units, points, and medals in the bot.
@@ -105,7 +125,7 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         """
 
         # find the player by discord id
-        player = session.query(Player).filter(Player.discord_id == player.id).first()
+        player = player_by_discord_id(session, player.id)
         if not player:
             await interaction.response.send_message("User doesn't have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
@@ -114,7 +134,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         player.rec_points += points
         cmd_logger.debug(f"User {player.name} now has {player.rec_points} requisition points")
         await interaction.response.send_message(f"{player.name} now has {player.rec_points} requisition points", ephemeral=self.bot.use_ephemeral)
-        self.bot.queue.put_nowait((1, player, 0))
 
     """ @ac.command(name="bonuspay", description="Give or remove a number of bonus pay from a player")
     @ac.describe(player="The player to give or remove bonus pay from")
@@ -131,7 +150,7 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         """
 
         # find the player by discord id
-        player = session.query(Player).filter(Player.discord_id == player.id).first()
+        player = player_by_discord_id(session, player.id)
         if not player:
             await interaction.response.send_message("User doesn't have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
@@ -140,7 +159,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         player.bonus_pay += points
         cmd_logger.debug(f"User {player.name} now has {player.bonus_pay} bonus pay")
         await interaction.response.send_message(f"{player.name} now has {player.bonus_pay} bonus pay", ephemeral=self.bot.use_ephemeral)
-        self.bot.queue.put_nowait((1, player, 0))
 
     #@ac.command(name="activateunits", description="Activate multiple units")
     async def activateunits(self, interaction: Interaction):
@@ -215,7 +233,7 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         """
 
         # find the player by discord id
-        _player: Player = session.query(Player).filter(Player.discord_id == player.id).first()
+        _player: Player = player_by_discord_id(session, player.id)
         if not _player:
             await interaction.response.send_message("User doesn't have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
@@ -255,8 +273,14 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         """
 
         await interaction.response.send_message("Refreshing statistics and dossiers for all players", ephemeral=self.bot.use_ephemeral)
+        _forget_content_hashes(session)
+        deferred = 0
         for player in session.query(Player).all():
-            self.bot.queue.put_nowait((1, player)) # make the bot think the player was edited, using nowait to avoid yielding control
+            if not self.bot.queue.put_nowait((1, player), BULK): # make the bot think the player was edited, using nowait to avoid yielding control
+                deferred += 1
+        if deferred:
+            await interaction.followup.send(f"Refreshed statistics and dossiers for all players, {deferred} were deferred until the queue has room", ephemeral=self.bot.use_ephemeral)
+            return
         await interaction.followup.send("Refreshed statistics and dossiers for all players", ephemeral=self.bot.use_ephemeral)
 
     @ac.command(name="refresh_player", description="Refresh the statistics and dossiers for a player")
@@ -272,10 +296,11 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         """
 
         await interaction.response.send_message(f"Refreshing statistics and dossiers for {player.name}", ephemeral=self.bot.use_ephemeral)
-        _player = session.query(Player).filter(Player.discord_id == player.id).first()
+        _player = player_by_discord_id(session, player.id)
         if not _player:
             await interaction.followup.send("Player does not have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
+        _forget_content_hashes(session, _player.id)
         self.bot.queue.put_nowait((1, _player))
 
     # @ac.command(name="specialupgrade", description="Give a player a one-off or relic item")
@@ -287,7 +312,7 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         Give a unique or relic item to a player's active unit.
         """
 
-        _player = session.query(Player).filter(Player.discord_id == player.id).first()
+        _player = player_by_discord_id(session, player.id)
         if not _player:
             await interaction.response.send_message("Player does not have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
@@ -324,7 +349,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         upgrade = PlayerUpgrade(name=name, type="SPECIAL", unit_id=_unit.id)
         session.add(upgrade)
         await interaction.response.send_message(f"Special upgrade {name} given to {_player.name}'s unit {_unit.name}", ephemeral=self.bot.use_ephemeral)
-        self.bot.queue.put_nowait((1, _player, 0))
 
     async def _show_unit_select(self, interaction: Interaction, _player: Player, active_units: list, name: str, session: Session):
         """
@@ -413,10 +437,9 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
                 session.delete(unit)
                 logger.debug(f"Unit with the id {unit_id} was deleted from player {player.name}")
                 await interaction.response.send_message(f"Unit {unit.name} has been removed", ephemeral=self.bot.use_ephemeral)
-                self.bot.queue.put_nowait((1, company, 0))
 
         # Checks if the Player has a Meta Company and If that company has a name
-        company: Player = session.query(Player).filter(Player.discord_id == player.id).first()
+        company: Player = player_by_discord_id(session, player.id)
         if not company:
             await interaction.response.send_message(f"{player.name} doesn't have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
@@ -444,7 +467,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
             if unit.status == UnitStatus.INACTIVE:
                 unit.status = UnitStatus.LEGACY
             logger.debug(f"Unit {unit.name} has been set to legacy")
-            self.bot.queue.put_nowait((1, unit.player, 0))
 
         await interaction.response.send_message(f"Unit type {name} removed", ephemeral=self.bot.use_ephemeral)
 
@@ -461,7 +483,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         unit.status = UnitStatus.INACTIVE if unit.status == UnitStatus.ACTIVE else unit.status
         unit.callsign = None
         await interaction.response.send_message(f"Unit {unit.name} deactivated", ephemeral=self.bot.use_ephemeral)
-        self.bot.queue.put_nowait((1, unit.player, 0))
 
     # @ac.command(name="change_callsign", description="Change the callsign of a unit")
     @ac.describe(old_callsign="The callsign of the unit to change")
@@ -483,7 +504,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
             return
         unit.callsign = new_callsign
         await interaction.response.send_message(f"Unit {unit.name} callsign changed to {new_callsign}", ephemeral=self.bot.use_ephemeral)
-        self.bot.queue.put_nowait((1, unit.player, 0))
 
     # @ac.command(name="change_status", description="Change the status of a unit")
     @ac.describe(player="The player whose unit you want to change the status of")
@@ -525,7 +545,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
                 else:
                     self.unit.status = new_status
                 await interaction.response.send_message(f"Unit {self.unit.name} status changed to {new_status.name}", ephemeral=self.bot.use_ephemeral)
-                self.bot.queue.put_nowait((1, self.unit.player, 0))
 
             @uses_db(CustomClient().sessionmaker)
             async def change_callsign_callback(self, interaction: Interaction, session: Session):
@@ -535,7 +554,6 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
                 self.unit.active = True
                 self.unit.status = UnitStatus.ACTIVE
                 await interaction.response.send_message(f"Unit {self.unit.name} activated with callsign {new_callsign}", ephemeral=CustomClient().use_ephemeral)
-                self.bot.queue.put_nowait((1, self.unit.player, 0))
 
         view = RecordingView()
         view.add_item(UnitSelect(player))
@@ -575,9 +593,8 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
                 self.player.name = self.children[0].value
                 self.player.lore = self.children[1].value
                 await interaction.response.send_message("Company updated", ephemeral=self.bot.use_ephemeral)
-                self.bot.queue.put_nowait((1, self.player, 0))
 
-        player = session.query(Player).filter(Player.discord_id == player.id).first()
+        player = player_by_discord_id(session, player.id)
         if not player:
             logger.debug(f"User {player.display_name} does not have a Meta Campaign company and an admin is trying to edit it")
             await interaction.response.send_message("The player doesn't have a Meta Campaign company", ephemeral=CustomClient().use_ephemeral)
@@ -595,7 +612,7 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         Manage units for a player.
         """
 
-        player = session.query(Player).filter(Player.discord_id == player.id).first()
+        player = player_by_discord_id(session, player.id)
         if not player:
             await interaction.response.send_message("The player doesn't have a Meta Campaign company", ephemeral=CustomClient().use_ephemeral)
             return
@@ -666,11 +683,10 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
         # for each existing player, edit Player.rec_points by incrementing the value by the "Backpay Owed" column
         for _, row in existing.iterrows():
             player_id = row["Discord ID"]
-            player = session.query(Player).filter(Player.discord_id == player_id).first()
+            player = player_by_discord_id(session, player_id)
             logger.info(f"Backpaying {player.name} with {row['Backpay Owed']} points")
             player.rec_points += row["Backpay Owed"]
             session.commit()
-            self.bot.queue.put_nowait((1, player, 0))
         # write the missing players back to the same file
         missing.to_csv("backpay.csv", index=False)
         logger.info("Backpay complete")
@@ -688,11 +704,10 @@ class Admin(GroupCog, group_name="admin", name="Admin", description="Admin comma
             # for each existing player, edit Player.rec_points by incrementing the value by the "Backpay Owed" column
             for _, row in existing.iterrows():
                 player_id = row["Discord ID"]
-                player = session.query(Player).filter(Player.discord_id == player_id).first()
+                player = player_by_discord_id(session, player_id)
                 logger.info(f"Backbonuspaying {player.name} with {row['Backbonus Owed']} points")
                 player.bonus_pay += row["Backbonus Owed"]
                 session.commit()
-                self.bot.queue.put_nowait((1, player, 0))
 
         if self.single_backpay:
             self.attempt_backpay.stop()
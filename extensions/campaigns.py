@@ -11,7 +11,7 @@ from templates import notify_no_players
 import templates as tmpl
 
 from customclient import CustomClient
-from models import Campaign as CampaignModel, CampaignInvite, Player, Unit, UnitHistory, UnitStatus
+from models import UNIT_LOAD_PROFILES, Campaign as CampaignModel, CampaignInvite, Player, Unit, UnitHistory, UnitStatus
 from utils import EnvironHelpers, RecordingModal, error_reporting, maybe_decorate, uses_db, is_dm, check_notify, fuzzy_autocomplete, chunked_join, RecordingLayoutView
 
 logger = getLogger(__name__)
@@ -323,7 +323,6 @@ class CampaignDeleteConfirmLayoutView(RecordingLayoutView):
             unit.status = UnitStatus.INACTIVE if unit.status == UnitStatus.ACTIVE else unit.status
             unit.battle_group = None
             unit.unit_history.append(UnitHistory(campaign_name=campaign_name))
-            CustomClient().queue.put_nowait((1, unit.player, 0))
         for invite in list(campaign.invites):
             session.delete(invite)
         session.flush()
@@ -381,9 +380,6 @@ class CampaignPayoutModal(RecordingModal):
             player.bonus_pay += survivor_bp
         session.commit()
         await interaction.response.defer(ephemeral=True)
-        for player in all_players:
-            payout_logger.debug(f"Putting {player.name} in update queue for {self.campaign_name}")
-            CustomClient().queue.put_nowait((1, player, 0))
         await interaction.followup.send(f"Campaign {self.campaign_name} payout complete", ephemeral=True)
 
 class CampaignInvitesLayoutView(RecordingLayoutView):
@@ -468,7 +464,7 @@ class CampaignUnitsLayoutView(RecordingLayoutView):
     @uses_db(CustomClient().sessionmaker)
     @error_reporting(verbose=True)
     async def select_callback(self, interaction: Interaction, session: Session):
-        unit = session.query(Unit).filter(Unit.id == interaction.data["values"][0]).first()
+        unit = session.query(Unit).filter(Unit.id == interaction.data["values"][0]).options(*UNIT_LOAD_PROFILES["owner"]).first()
         if unit is None:
             await interaction.response.send_message("Unit not found", ephemeral=True)
             return
@@ -505,7 +501,6 @@ class CampaignUnitInfoLayoutView(RecordingLayoutView):
         unit.status = UnitStatus.INACTIVE if unit.status == UnitStatus.ACTIVE else unit.status
         unit.battle_group = None
         session.commit()
-        CustomClient().queue.put_nowait((1, unit.player, 0))
         await interaction.response.send_message(f"Unit {original_callsign} deactivated", ephemeral=True)
         await interaction.followup.send(view=CampaignUnitsLayoutView(campaign_id=self.campaign_id), ephemeral=True)
 
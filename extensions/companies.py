@@ -8,7 +8,7 @@ from sqlalchemy.orm import Session
 import templates as tmpl
 
 from customclient import CustomClient
-from models import Player, Unit, UnitStatus
+from models import Player, Unit, UnitStatus, player_by_discord_id
 from utils import has_invalid_url, uses_db, EnvironHelpers, error_reporting
 
 logger = getLogger(__name__)
@@ -30,7 +30,7 @@ class Company(GroupCog, description="Meta Campaign company: create, edit, show,
     async def create(self, interaction: Interaction, session: Session):
         logger = getLogger(f"{__name__}.create")
         # check if the user already has a company
-        player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if player:
             logger.debug(f"User {interaction.user.display_name} already has a Meta Campaign company")
             await interaction.response.send_message(tmpl.already_have_company, ephemeral=self.bot.use_ephemeral)
@@ -45,7 +45,6 @@ class Company(GroupCog, description="Meta Campaign company: create, edit, show,
         session.add(stockpile)
         logger.debug(f"User {interaction.user.display_name} created a new Meta Campaign company")
         await interaction.response.send_message(tmpl.joined_meta_campaign, ephemeral=self.bot.use_ephemeral)
-        self.bot.queue.put_nowait((0, player, 0)) # this is the only one that gets a 0, all others are 1
 
     @ac.command(name="edit", description="Edit your Meta Campaign company")
     @uses_db(CustomClient().sessionmaker)
@@ -75,14 +74,12 @@ class Company(GroupCog, description="Meta Campaign company: create, edit, show,
                     await interaction.response.send_message(tmpl.company_lore_urls, ephemeral=CustomClient().use_ephemeral)
                     return
                 _player = session.merge(self.player)
-                session.query(Player).filter(Player.id == _player.id).update({
-                    Player.name: self.children[0].value,
-                    Player.lore: self.children[1].value
-                })
+                # set through the ORM so the change tracker sees the edit
+                _player.name = self.children[0].value
+                _player.lore = self.children[1].value
                 await interaction.response.send_message(tmpl.company_updated, ephemeral=CustomClient().use_ephemeral)
-                CustomClient().queue.put_nowait((1, _player, 0))
 
-        player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if not player:
             logger.debug(f"User {interaction.user.display_name} does not have a Meta Campaign company and is trying to edit it")
             await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=CustomClient().use_ephemeral)
@@ -96,7 +93,7 @@ class Company(GroupCog, description="Meta Campaign company: create, edit, show,
     @uses_db(CustomClient().sessionmaker)
     async def show(self, interaction: Interaction, session: Session, member: Member|User|None=None):
         member = member or interaction.user
-        player = session.query(Player).filter(Player.discord_id == member.id).first()
+        player = player_by_discord_id(session, member.id)
         if not player:
             await interaction.response.send_message(tmpl.member_no_company.format(member=member), ephemeral=CustomClient().use_ephemeral)
             return
@@ -111,7 +108,7 @@ class Company(GroupCog, description="Meta Campaign company: create, edit, show,
     @ac.command(name="refresh", description="Refresh your Meta Campaign company")
     @uses_db(CustomClient().sessionmaker)
     async def refresh(self, interaction: Interaction, session: Session):
-        player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if not player:
             await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=CustomClient().use_ephemeral)
             return
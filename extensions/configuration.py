@@ -9,6 +9,7 @@ import templates as tmpl
 
 from customclient import CustomClient
 from models import Config as Config_model, Dossier, Player, Statistic
+from taskqueue import BULK
 from utils import EnvironHelpers, uses_db
 
 logger = getLogger(__name__)
@@ -69,8 +70,14 @@ class Config(GroupCog, description="Configuration: set nickname, channels, list
         for dossier in old_dossiers:
             session.delete(dossier)
         session.commit()
+        deferred = 0
         for player in session.query(Player).all():
-            self.bot.queue.put_nowait((0, player))
+            if not self.bot.queue.put_nowait((0, player), BULK):
+                deferred += 1
+        if deferred:
+            logger.info(f"{deferred} dossier creations were deferred until the queue has room")
+            await interaction.response.send_message(f"Dossier channel set to {interaction.channel.mention}, {deferred} players were deferred until the queue has room", ephemeral=self.bot.use_ephemeral)
+            return
         await interaction.response.send_message(f"Dossier channel set to {interaction.channel.mention}", ephemeral=self.bot.use_ephemeral)
 
     @ac.command(name="setstatistics", description="Set the statistics channel to the current channel")
@@ -87,8 +94,14 @@ class Config(GroupCog, description="Configuration: set nickname, channels, list
         for statistic in old_statistics:
             session.delete(statistic)
         session.commit()
+        deferred = 0
         for player in session.query(Player).all():
-            self.bot.queue.put_nowait((0, player))
+            if not self.bot.queue.put_nowait((0, player), BULK):
+                deferred += 1
+        if deferred:
+            logger.info(f"{deferred} statistics creations were deferred until the queue has room")
+            await interaction.response.send_message(f"Statistics channel set to {interaction.channel.mention}, {deferred} players were deferred until the queue has room", ephemeral=self.bot.use_ephemeral)
+            return
         await interaction.response.send_message(f"Statistics channel set to {interaction.channel.mention}", ephemeral=self.bot.use_ephemeral)
 
     @ac.command(name="list_configs", description="List all configurations")
@@ -1,7 +1,6 @@
 import asyncio
 import os
 import random
-from asyncio import QueueEmpty
 from datetime import datetime, timedelta
 from io import BytesIO
 from logging import getLogger
@@ -24,7 +23,8 @@ import templates as tmpl
 from coloredformatter import stats
 from customclient import CustomClient
 from MessageManager import MessageManager
-from models import Player, Statistic, Dossier, Campaign, CampaignInvite, Unit, UnitStatus
+from models import Player, Statistic, Dossier, Campaign, CampaignInvite, DeadLetter, Unit, UnitStatus, player_by_discord_id
+from taskqueue import QueueTask
 from utils import EnvironHelpers, chunked_send, error_reporting, uses_db, toggle_command_ban, is_server, RecordingView
 
 logger = getLogger(__name__)
@@ -39,6 +39,11 @@ class LogLevel(Enum):
     ERROR = "ERROR"
     CRITICAL = "CRITICAL"
 
+class DeadLetterAction(Enum):
+    INSPECT = "inspect"
+    REPLAY = "replay"
+    PURGE = "purge"
+
 class Debug(GroupCog, description="Debug: reload extensions/strings, clear messages, query, and more. Mods only."):
     """
     Cog for debug slash commands: reload extensions, reload strings,
@@ -321,7 +326,7 @@ class Debug(GroupCog, description="Debug: reload extensions/strings, clear messa
 
     @uses_db(CustomClient().sessionmaker)
     async def botcompany(self, interaction: Interaction, _: MessageManager, session: Session):
-        existing = session.query(Player).filter(Player.discord_id == self.bot.user.id).first()
+        existing = player_by_discord_id(session, self.bot.user.id)
         if existing:
             await interaction.response.send_message(tmpl.bot_company_exists, ephemeral=self.bot.use_ephemeral)
             return
@@ -346,11 +351,7 @@ class Debug(GroupCog, description="Debug: reload extensions/strings, clear messa
 
     async def dump_queue(self, interaction: Interaction, _: MessageManager):
         await interaction.response.defer()
-        while not self.bot.queue.empty():
-            try:
-                self.bot.queue.get_nowait()
-            except QueueEmpty:
-                break # handle race condition gracefully
+        self.bot.queue.clear()
         await interaction.followup.send(tmpl.queue_emptied, ephemeral=self.bot.use_ephemeral)
 
     #@ac.command(name="clear_deletable", description="Deletes all deletable messages in the channel.")
@@ -425,6 +426,30 @@ class Debug(GroupCog, description="Debug: reload extensions/strings, clear messa
         await toggle_command_ban(is_banned, interaction.user.mention)
         await interaction.response.send_message(tmpl.debug_command_ban_toggle.format(action='disabled' if is_banned else 'enabled'), ephemeral=self.bot.use_ephemeral)
 
+    @ac.command(name="deadletters", description="Inspect, replay or purge publish tasks that failed too many times")
+    @ac.describe(action="What to do with the dead letters", letter_id="Only act on this dead letter (leave empty for all)")
+    @uses_db(CustomClient().sessionmaker)
+    async def deadletters(self, interaction: Interaction, action: DeadLetterAction, letter_id: int = 0, session: Session = None):
+        query = session.query(DeadLetter)
+        if letter_id:
+            query = query.filter(DeadLetter.id == letter_id)
+        letters = query.order_by(DeadLetter.failed_at).all()
+        if not letters:
+            await interaction.response.send_message(tmpl.debug_dead_letters_empty, ephemeral=self.bot.use_ephemeral)
+            return
+        if action == DeadLetterAction.INSPECT:
+            lines = [tmpl.debug_dead_letter.format(letter=letter, failed_at=int(letter.failed_at.timestamp())) for letter in letters]
+            await chunked_send(interaction, "\n".join(lines), self.bot.use_ephemeral)
+            return
+        if action == DeadLetterAction.REPLAY:
+            for letter in letters:
+                self.bot.queue.put_nowait(QueueTask(letter.task_type, letter.model, letter.target_id))
+        for letter in letters:
+            session.delete(letter)
+        logger.info(f"{action.value} {len(letters)} dead letters")
+        message = tmpl.debug_dead_letters_replayed if action == DeadLetterAction.REPLAY else tmpl.debug_dead_letters_purged
+        await interaction.response.send_message(message.format(count=len(letters)), ephemeral=self.bot.use_ephemeral)
+
     #@ac.command(name="fkcheck", description="Validate External Foreign Keys")
     async def fkcheck(self, interaction: Interaction):
         if not await is_server(interaction):
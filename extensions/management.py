@@ -10,7 +10,7 @@ import sqlalchemy
 import templates as tmpl
 
 from customclient import CustomClient
-from models import Campaign, Player, ShopUpgrade, Unit, UnitStatus, PlayerUpgrade, UnitType, UpgradeType
+from models import UNIT_LOAD_PROFILES, Campaign, Player, ShopUpgrade, Unit, UnitStatus, PlayerUpgrade, UnitType, UpgradeType, player_by_discord_id, unit_by_name
 from utils import RecordingModal, error_reporting, is_management, uses_db, RecordingLayoutView
 
 logger = getLogger(__name__)
@@ -112,7 +112,6 @@ class CompanyEditNameModal(RecordingModal):
         player.name = self.children[0].value
         session.commit()
         await interaction.response.send_message("Player name updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, player, 0))
 
 class CompanyEditLoreModal(RecordingModal):
     def __init__(self, player_id: int, old_lore: str):
@@ -130,7 +129,6 @@ class CompanyEditLoreModal(RecordingModal):
         player.lore = self.children[0].value
         session.commit()
         await interaction.response.send_message("Player lore updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, player, 0))
 
 class CompanyEditRecPointsModal(RecordingModal):
     def __init__(self, player_id: int, old_rec_points: int):
@@ -164,7 +162,6 @@ class CompanyEditRecPointsModal(RecordingModal):
             player.rec_points += change_points
         session.commit()
         await interaction.response.send_message("Player requisition points updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, player, 0))
 
 class CompanyEditBonusPayModal(RecordingModal):
     def __init__(self, player_id: int, old_bonus_pay: int):
@@ -234,7 +231,7 @@ class CompanyUnitSelectLayoutView(RecordingLayoutView):
     @error_reporting(True)
     @uses_db(CustomClient().sessionmaker)
     async def unit_select_callback(self, interaction: Interaction, session: Session):
-        unit = session.query(Unit).filter(Unit.id == interaction.data["values"][0]).first()
+        unit = session.query(Unit).filter(Unit.id == interaction.data["values"][0]).options(*UNIT_LOAD_PROFILES["info"]).first()
         if unit is None:
             await interaction.response.send_message("Unit not found", ephemeral=True)
             return
@@ -366,14 +363,12 @@ class CompanyUnitEditNameModal(RecordingModal):
         unit.name = self.children[0].value
         session.commit()
         await interaction.response.send_message("Unit name updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class CompanyUnitEditUnitTypeLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, unit_id: int, old_unit_type: str, session: Session):
+    def __init__(self, unit_id: int, old_unit_type: str):
         super().__init__(timeout=None)
         self.unit_id = unit_id
-        options = [SelectOption(label=unit_type.unit_type, value=unit_type.unit_type, default=(unit_type.unit_type == old_unit_type)) for unit_type in session.query(UnitType).all()]
+        options = [SelectOption(label=unit_type.unit_type, value=unit_type.unit_type, default=(unit_type.unit_type == old_unit_type)) for unit_type in CustomClient().catalog.get().unit_types.values()]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
             select = ui.Select(placeholder="No unit types", options=[SelectOption(label="No unit types", value="no_unit_types", default=True)], disabled=True)
@@ -405,7 +400,6 @@ class CompanyUnitEditUnitTypeLayoutView(RecordingLayoutView):
         unit.unit_type = unit_type.unit_type
         session.commit()
         await interaction.response.send_message("Unit type updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class CompanyUnitEditStatusLayoutView(RecordingLayoutView):
     def __init__(self, unit_id: int, old_status: str):
@@ -431,7 +425,6 @@ class CompanyUnitEditStatusLayoutView(RecordingLayoutView):
         unit.status = status
         session.commit()
         await interaction.response.send_message("Unit status updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class CompanyUnitEditCampaignLayoutView(RecordingLayoutView):
     @uses_db(CustomClient().sessionmaker)
@@ -459,7 +452,6 @@ class CompanyUnitEditCampaignLayoutView(RecordingLayoutView):
         unit.campaign = campaign
         session.commit()
         await interaction.response.send_message("Unit campaign updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class CompanyUnitEditCallsignModal(RecordingModal):
     def __init__(self, unit_id: int, old_callsign: str):
@@ -481,7 +473,6 @@ class CompanyUnitEditCallsignModal(RecordingModal):
             await interaction.response.send_message("Callsign is already taken", ephemeral=True)
             return
         await interaction.response.send_message("Unit callsign updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class CompanyUnitEditBattleGroupModal(RecordingModal):
     def __init__(self, unit_id: int, old_battle_group: str):
@@ -499,7 +490,6 @@ class CompanyUnitEditBattleGroupModal(RecordingModal):
         unit.battle_group = self.children[0].value
         session.commit()
         await interaction.response.send_message("Unit battle group updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class CompanyUnitEditUnitReqModal(RecordingModal):
     def __init__(self, unit_id: int, old_unit_req: int):
@@ -533,7 +523,6 @@ class CompanyUnitEditUnitReqModal(RecordingModal):
             unit.unit_req += change_points
         session.commit()
         await interaction.response.send_message("Unit requisition points updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class CompanyUnitUpgradesSelectLayoutView(RecordingLayoutView):
     @uses_db(CustomClient().sessionmaker)
@@ -649,7 +638,6 @@ class CompanyPlayerUpgradeInfoLayoutView(RecordingLayoutView):
         session.delete(upgrade)
         session.commit()
         await interaction.response.send_message("Upgrade deleted", ephemeral=True)
-        CustomClient().queue.put_nowait((1, upgrade.unit.player, 0))
 
 class CompanyPlayerUpgradeEditNameModal(RecordingModal):
     def __init__(self, upgrade_id: int, old_name: str):
@@ -666,7 +654,6 @@ class CompanyPlayerUpgradeEditNameModal(RecordingModal):
         upgrade.name = self.children[0].value
         session.commit()
         await interaction.response.send_message("Upgrade name updated", ephemeral=True)
-        CustomClient().queue.put_nowait((1, upgrade.unit.player, 0))
 
 class CompanyAddSpecialUpgradeModal(RecordingModal):
     def __init__(self, unit_id: int):
@@ -689,18 +676,11 @@ class CompanyAddSpecialUpgradeModal(RecordingModal):
         await interaction.response.send_message("Special upgrade added", ephemeral=True)
         logger.debug("Sent ephemeral response 'Special upgrade added' to user.")
 
-        try:
-            CustomClient().queue.put_nowait((1, upgrade.unit.player, 0))
-            logger.debug(f"Queue updated for player={upgrade.unit.player}")
-        except Exception as e:
-            logger.exception("Failed to update queue for player after adding special upgrade.")
-
 class CompanyAddUnitLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, player_id: int, session: Session):
+    def __init__(self, player_id: int):
         super().__init__(timeout=None)
         self.player_id = player_id
-        unit_types = session.query(UnitType).all()
+        unit_types = CustomClient().catalog.get().unit_types.values()
         options = [SelectOption(label=unit_type.unit_type, value=unit_type.unit_type) for unit_type in unit_types]
         if not options:
             select = ui.Select(placeholder="No unit types", options=[SelectOption(label="No unit types", value="no_unit_types", default=True)], disabled=True)
@@ -735,7 +715,7 @@ class CompanyAddUnitModal(RecordingModal):
     @error_reporting(True)
     @uses_db(CustomClient().sessionmaker)
     async def on_submit(self, interaction: Interaction, session: Session):
-        if session.query(Unit).filter(Unit.name == self.children[0].value, Unit.player_id == self.player_id).first():
+        if unit_by_name(session, self.player_id, self.children[0].value):
             await interaction.response.send_message("Unit name already exists", ephemeral=True)
             return
         if len(self.children[0].value) > 30:
@@ -744,7 +724,6 @@ class CompanyAddUnitModal(RecordingModal):
         session.add(unit)
         session.commit()
         await interaction.response.send_message("Unit added", ephemeral=True)
-        CustomClient().queue.put_nowait((1, unit.player, 0))
 
 class ShopLayoutView(RecordingLayoutView):
     def __init__(self):
@@ -771,10 +750,9 @@ class ShopLayoutView(RecordingLayoutView):
         await interaction.response.send_message(view=layout_view, ephemeral=True)
 
 class ShopUnitTypeSelectLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, session: Session):
+    def __init__(self):
         super().__init__(timeout=None)
-        unit_types = session.query(UnitType).all()
+        unit_types = CustomClient().catalog.get().unit_types.values()
         options = [SelectOption(label=unit_type.unit_type, value=unit_type.unit_type) for unit_type in unit_types]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
@@ -919,24 +897,22 @@ class ShopUnitTypeInfoLayoutView(RecordingLayoutView):
         await interaction.response.send_message(view=layout_view, ephemeral=True)
 
 class ShopCompatibleUpgradesLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, unit_type: str, edit_callback: Callable, parent_class: type, session: Session):
+    def __init__(self, unit_type: str, edit_callback: Callable, parent_class: type):
         super().__init__(timeout=None)
         self.unit_type = unit_type
         self.edit_callback = edit_callback
         self.parent_class = parent_class
-        unit_type_obj = session.query(UnitType).filter(UnitType.unit_type == unit_type).first()
-        if unit_type_obj is None:
+        catalog = CustomClient().catalog.get()
+        if unit_type not in catalog.unit_types:
             raise ValueError("Unit type not found")
-        upgrades = session.query(ShopUpgrade).all()
         # Select upgrades where this unit_type is compatible
         options = [
             SelectOption(
                 label=upgrade.name,
                 value=str(upgrade.id),
-                default=(unit_type_obj in upgrade.compatible_unit_types)
+                default=(unit_type in catalog.unit_types_by_upgrade[upgrade.id])
             )
-            for upgrade in upgrades
+            for upgrade in catalog.upgrades.values()
         ]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
@@ -1026,12 +1002,11 @@ class ShopUnitTypeEditIsBaseModal(RecordingModal):
         await interaction.response.send_message("Is Base updated", ephemeral=True)
 
 class ShopUnitTypeEditFreeUpgrade1LayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, unit_type: str, old_free_upgrade_1: int, session: Session):
+    def __init__(self, unit_type: str, old_free_upgrade_1: int):
         super().__init__(timeout=None)
         self.unit_type = unit_type
-        unit_type_info = session.query(UnitType).filter(UnitType.unit_type == unit_type).first()
-        options = [SelectOption(label=upgrade.name, value=upgrade.id, default=(upgrade.id == old_free_upgrade_1)) for upgrade in unit_type_info.compatible_upgrades]
+        compatible_upgrades = CustomClient().catalog.get().upgrades_by_unit_type.get(unit_type, ())
+        options = [SelectOption(label=upgrade.name, value=upgrade.id, default=(upgrade.id == old_free_upgrade_1)) for upgrade in compatible_upgrades]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
             select = ui.Select(placeholder="No free upgrades", options=[SelectOption(label="No free upgrades", value="no_free_upgrades", default=True)], disabled=True)
@@ -1062,12 +1037,11 @@ class ShopUnitTypeEditFreeUpgrade1LayoutView(RecordingLayoutView):
         await interaction.response.send_message("Free upgrade 1 updated", ephemeral=True)
 
 class ShopUnitTypeEditFreeUpgrade2LayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, unit_type: str, old_free_upgrade_2: int, session: Session):
+    def __init__(self, unit_type: str, old_free_upgrade_2: int):
         super().__init__(timeout=None)
         self.unit_type = unit_type
-        unit_type_info = session.query(UnitType).filter(UnitType.unit_type == unit_type).first()
-        options = [SelectOption(label=upgrade.name, value=upgrade.id, default=(upgrade.id == old_free_upgrade_2)) for upgrade in unit_type_info.compatible_upgrades]
+        compatible_upgrades = CustomClient().catalog.get().upgrades_by_unit_type.get(unit_type, ())
+        options = [SelectOption(label=upgrade.name, value=upgrade.id, default=(upgrade.id == old_free_upgrade_2)) for upgrade in compatible_upgrades]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
             select = ui.Select(placeholder="No free upgrades", options=[SelectOption(label="No free upgrades", value="no_free_upgrades", default=True)], disabled=True)
@@ -1098,10 +1072,9 @@ class ShopUnitTypeEditFreeUpgrade2LayoutView(RecordingLayoutView):
         await interaction.response.send_message("Free upgrade 2 updated", ephemeral=True)
 
 class ShopUpgradeTypeSelectLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, session: Session):
+    def __init__(self):
         super().__init__(timeout=None)
-        upgrade_types = session.query(UpgradeType).all()
+        upgrade_types = CustomClient().catalog.get().upgrade_types.values()
         options = [SelectOption(label=upgrade_type.name, value=upgrade_type.name) for upgrade_type in upgrade_types]
         select = ui.Select(placeholder="Select a upgrade type", options=options)
         select.callback = self.upgrade_type_select_callback
@@ -1360,10 +1333,9 @@ class ShopUpgradeTypeEditSortOrderModal(RecordingModal):
         await interaction.response.send_message("Sort Order updated", ephemeral=True)
 
 class ShopUpgradeSelectLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, session: Session):
+    def __init__(self):
         super().__init__(timeout=None)
-        upgrades = session.query(ShopUpgrade).order_by(ShopUpgrade.sort_key).all()
+        upgrades = CustomClient().catalog.get().upgrades.values()
         options = [SelectOption(label=upgrade.name, value=upgrade.id) for upgrade in upgrades]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
@@ -1541,14 +1513,13 @@ class ShopUpgradeEditNameModal(RecordingModal):
         await interaction.followup.send("Name updated", ephemeral=True)
 
 class ShopUpgradeEditTypeLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, upgrade_id: int, old_type: str, edit_callback: Callable, parent_class: type, session: Session):
+    def __init__(self, upgrade_id: int, old_type: str, edit_callback: Callable, parent_class: type):
         super().__init__(timeout=None)
         self.upgrade_id = upgrade_id
         self.old_type = old_type
         self.edit_callback = edit_callback
         self.parent_class = parent_class
-        upgrade_types = session.query(UpgradeType).all()
+        upgrade_types = CustomClient().catalog.get().upgrade_types.values()
         type_options = [SelectOption(label=upgrade_type.name, value=upgrade_type.name, default=(upgrade_type.name == old_type)) for upgrade_type in upgrade_types]
         type_chunks = [type_options[i:i+25] for i in range(0, len(type_options), 25)]
         if len(type_chunks) >= 21:
@@ -1646,14 +1617,13 @@ class ShopUpgradeEditRepeatableModal(RecordingModal):
         await interaction.followup.send("Repeatable updated", ephemeral=True)
 
 class ShopUpgradeEditRefitTargetLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, upgrade_id: int, old_refit_target: str, edit_callback: Callable, parent_class: type, session: Session):
+    def __init__(self, upgrade_id: int, old_refit_target: str, edit_callback: Callable, parent_class: type):
         super().__init__(timeout=None)
         self.upgrade_id = upgrade_id
         self.old_refit_target = old_refit_target
         self.edit_callback = edit_callback
         self.parent_class = parent_class
-        unit_types = session.query(UnitType).filter(UnitType.is_base == False).all()
+        unit_types = [unit_type for unit_type in CustomClient().catalog.get().unit_types.values() if not unit_type.is_base]
         refit_options = [SelectOption(label="None", value="none", default=(old_refit_target is None))] + [SelectOption(label=unit_type.unit_type, value=unit_type.unit_type, default=(unit_type.unit_type == old_refit_target)) for unit_type in unit_types]
         refit_chunks = [refit_options[i:i+25] for i in range(0, len(refit_options), 25)]
         if not refit_chunks:
@@ -1687,14 +1657,13 @@ class ShopUpgradeEditRefitTargetLayoutView(RecordingLayoutView):
         await self.edit_callback(view=self.parent_class(self.upgrade_id))
 
 class ShopUpgradeEditRequiredUpgradeIdLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, upgrade_id: int, old_required_upgrade_id: int, edit_callback: Callable, parent_class: type, session: Session):
+    def __init__(self, upgrade_id: int, old_required_upgrade_id: int, edit_callback: Callable, parent_class: type):
         super().__init__(timeout=None)
         self.upgrade_id = upgrade_id
         self.old_required_upgrade_id = old_required_upgrade_id
         self.edit_callback = edit_callback
         self.parent_class = parent_class
-        shop_upgrades = session.query(ShopUpgrade).all()
+        shop_upgrades = CustomClient().catalog.get().upgrades.values()
         required_upgrade_options = [SelectOption(label="None", value="none", default=(old_required_upgrade_id is None))] + [SelectOption(label=shop_upgrade.name, value=shop_upgrade.id, default=(shop_upgrade.id == old_required_upgrade_id)) for shop_upgrade in shop_upgrades]
         required_upgrade_chunks = [required_upgrade_options[i:i+25] for i in range(0, len(required_upgrade_options), 25)]
         if not required_upgrade_chunks:
@@ -1738,8 +1707,9 @@ class ShopUpgradeEditUnitTypesLayoutView(RecordingLayoutView):
         upgrade = session.query(ShopUpgrade).filter(ShopUpgrade.id == upgrade_id).first()
         if upgrade is None:
             raise ValueError("Upgrade not found")
-        unit_types = session.query(UnitType).all()
-        options = [SelectOption(label=unit_type.unit_type, value=unit_type.unit_type, default=(unit_type in upgrade.compatible_unit_types)) for unit_type in unit_types]
+        catalog = CustomClient().catalog.get()
+        compatible_unit_types = catalog.unit_types_by_upgrade.get(upgrade.id, frozenset())
+        options = [SelectOption(label=unit_type.unit_type, value=unit_type.unit_type, default=(unit_type.unit_type in compatible_unit_types)) for unit_type in catalog.unit_types.values()]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         logger.debug([len(chunk) for chunk in chunks])
         logger.debug(len(chunks))
@@ -1792,11 +1762,10 @@ class ShopAddUpgradeModal(RecordingModal):
         await interaction.response.send_message(view=ShopAddUpgradeTypeSelectLayoutView(name), ephemeral=True)
 
 class ShopAddUpgradeTypeSelectLayoutView(RecordingLayoutView):
-    @uses_db(CustomClient().sessionmaker)
-    def __init__(self, name: str, session: Session):
+    def __init__(self, name: str):
         super().__init__(timeout=None)
         self.name = name
-        upgrade_types = session.query(UpgradeType).all()
+        upgrade_types = CustomClient().catalog.get().upgrade_types.values()
         options = [SelectOption(label=upgrade_type.name, value=upgrade_type.name) for upgrade_type in upgrade_types]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
@@ -1869,7 +1838,7 @@ class Manage(GroupCog, description="Management commands: company, units, and rel
     @error_reporting(True)
     @uses_db(CustomClient().sessionmaker)
     async def player_select_callback(self, interaction: Interaction, session: Session):
-        player = session.query(Player).filter(Player.discord_id == interaction.data["values"][0]).first()
+        player = player_by_discord_id(session, interaction.data["values"][0])
         if player is None:
             await interaction.response.send_message(tmpl.player_not_found, ephemeral=True)
             return
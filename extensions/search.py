@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 import templates as tmpl
 
 from customclient import CustomClient
-from models import Campaign, Player, PlayerUpgrade, Unit, UnitType, ShopUpgrade
+from models import UNIT_LOAD_PROFILES, Campaign, Player, PlayerUpgrade, Unit, UnitType, ShopUpgrade
 from utils import error_reporting, uses_db, fuzzy_autocomplete
 
 logger = getLogger(__name__)
@@ -37,10 +37,20 @@ class Search(GroupCog, description="Search units by name, player, callsign, type
                      unit_type=fuzzy_autocomplete(UnitType.unit_type),
                      upgrade=fuzzy_autocomplete(ShopUpgrade.name),
                      campaign=fuzzy_autocomplete(Campaign.name)) # we don't need to autocomplete Player, because Member gets client side autocomplete anyway
-    @uses_db(CustomClient().sessionmaker)
     @error_reporting(False)
-    async def unit(self, interaction: Interaction, session: Session, name: Optional[str] = None, player: Optional[Member] = None, callsign: Optional[str] = None, unit_type: Optional[str] = None, upgrade: Optional[str] = None, campaign: Optional[str] = None) -> None:
-        query = session.query(Unit)
+    async def unit(self, interaction: Interaction, name: Optional[str] = None, player: Optional[Member] = None, callsign: Optional[str] = None, unit_type: Optional[str] = None, upgrade: Optional[str] = None, campaign: Optional[str] = None) -> None:
+        output = await self._search_units(name, player, callsign, unit_type, upgrade, campaign)
+        await interaction.response.send_message(output or tmpl.search_no_units_found, ephemeral=CustomClient().use_ephemeral)
+
+    @staticmethod
+    @uses_db(CustomClient().sessionmaker, offload=True)
+    def _search_units(name: Optional[str], player: Optional[Member], callsign: Optional[str], unit_type: Optional[str], upgrade: Optional[str], campaign: Optional[str], session: Session) -> str:
+        """
+        Query the matching units and render the search output, on the database thread pool.
+        Returns an empty string if no unit matches.
+        """
+
+        query = session.query(Unit).options(*UNIT_LOAD_PROFILES["render"])
         if name:
             query = query.filter(Unit.name.ilike(f"%{name}%"))
         if player:
@@ -54,9 +64,6 @@ class Search(GroupCog, description="Search units by name, player, callsign, type
         if campaign:
             query = query.filter(Unit.campaign.has(Campaign.name == campaign))
         units = query.all()
-        if not units:
-            await interaction.response.send_message(tmpl.search_no_units_found, ephemeral=CustomClient().use_ephemeral)
-            return
         #we need to build the output line by line, ensuring the output doesn't exceed 2000 characters
         output = ""
         for unit in units:
@@ -65,7 +72,7 @@ class Search(GroupCog, description="Search units by name, player, callsign, type
                 output += "\n..."
                 break
             output += "\n" + line
-        await interaction.response.send_message(output, ephemeral=CustomClient().use_ephemeral)
+        return output
 
 async def setup(_bot: CustomClient):
     """
@@ -1,12 +1,14 @@
 from logging import getLogger
+from typing import Iterable
 
 from discord import ButtonStyle, Interaction, app_commands as ac, ui
 import discord
 from discord.ext.commands import GroupCog
 from sqlalchemy.orm import Session
 
+from catalog import Catalog, ShopUpgradeEntry
 from customclient import CustomClient
-from models import Player, PlayerUpgrade, ShopUpgrade, Unit, UnitStatus
+from models import UNIT_LOAD_PROFILES, PlayerUpgrade, ShopUpgrade, Unit, UnitStatus, UnitType, player_by_discord_id
 from utils import RecordingLayoutView, error_reporting, uses_db
 import templates as tmpl
 
@@ -44,11 +46,12 @@ class ShopUnitSelectLayoutView(AuthorizedUserLayoutView):
     def __init__(self, discord_id: int, session: Session):
         super().__init__(timeout=None)
         self.discord_id = discord_id
-        user = session.query(Player).filter(Player.discord_id == discord_id).first()
+        user = player_by_discord_id(session, discord_id)
         if user is None:
             self.add_item(ui.TextDisplay(content=tmpl.player_not_found))
             return
-        options = [discord.SelectOption(label=unit.name, value=str(unit.id)) for unit in user.units]
+        units = session.query(Unit).filter(Unit.player_id == user.id).options(*UNIT_LOAD_PROFILES["option_list"])
+        options = [discord.SelectOption(label=unit.name, value=str(unit.id)) for unit in units]
         chunks = [options[i:i+25] for i in range(0, len(options), 25)]
         if not chunks:
             self.add_item(ui.TextDisplay(content=tmpl.no_units))
@@ -70,7 +73,7 @@ class ShopUnitSelectLayoutView(AuthorizedUserLayoutView):
     @error_reporting(True)
     @uses_db(CustomClient().sessionmaker)
     async def convert_button_callback(self, interaction: Interaction, session: Session):
-        player = session.query(Player).filter(Player.discord_id == self.discord_id).first()
+        player = player_by_discord_id(session, self.discord_id)
         if player is None:
             await interaction.response.send_message(tmpl.player_not_found, ephemeral=True)
             return
@@ -108,7 +111,7 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
         super().__init__(timeout=None)
         self.discord_id = discord_id
         self.unit_id = unit_id
-        unit = session.query(Unit).filter(Unit.id == unit_id).first()
+        unit = session.query(Unit).filter(Unit.id == unit_id).options(*UNIT_LOAD_PROFILES["shop"]).first()
         if unit is None:
             self.add_item(ui.TextDisplay(content=tmpl.unit_not_found))
             return
@@ -117,7 +120,8 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
             ui.TextDisplay(content=f"Player {tmpl.MAIN_CURRENCY_SHORT}: {unit.player.rec_points}"),
             ui.TextDisplay(content=f"{tmpl.UNIT_CURRENCY}: {unit.unit_req}" + (" Which must be spent first" if bool(unit.unit_req) else "")))
         self.add_item(container)
-        upgrades, currency = self.populate_select_options(unit.available_upgrades, unit)
+        catalog = CustomClient().catalog.get()
+        upgrades, currency = self.populate_select_options(catalog.upgrades_by_unit_type.get(unit.unit_type, ()), unit, catalog)
         if not upgrades:
             self.add_item(ui.TextDisplay(content=tmpl.no_upgrades_available))
             return
@@ -132,10 +136,11 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
             action_row = ui.ActionRow(select)
             self.add_item(action_row)
 
-    def populate_select_options(self, upgrades: list[ShopUpgrade], unit: Unit):
+    def populate_select_options(self, upgrades: Iterable[ShopUpgradeEntry], unit: Unit, catalog: Catalog):
         """
         Fill the select menu options with available upgrades, respecting
         currency availability, upgrade disabled state, type filtering, and per-unit limits.
+        The upgrades and their types come from the catalog snapshot.
         Returns: currency (int)
         """
         current_unit_req = unit.unit_req
@@ -146,9 +151,10 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
         for upgrade in upgrades:
             if upgrade.disabled:
                 continue
-            if not upgrade.upgrade_type:
+            upgrade_type = catalog.upgrade_type_of(upgrade)
+            if not upgrade_type:
                 continue
-            if not upgrade.upgrade_type.can_use_unit_req and current_unit_req > 0:
+            if not upgrade_type.can_use_unit_req and current_unit_req > 0:
                 continue
             if upgrade.repeatable != 0: # 0 = unlimited, else max count
                 owned_count = sum(1 for _upgrade in unit.upgrades if _upgrade.shop_upgrade_id == upgrade.id)
@@ -156,7 +162,7 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
                     continue
 
             insufficient = "(❌)" if upgrade.cost > currency else ""
-            utype = upgrade.upgrade_type.emoji if hasattr(upgrade.upgrade_type, "emoji") else ""
+            utype = upgrade_type.emoji
             label = f"{utype} {insufficient}{upgrade.name} ({upgrade.cost})"
             select.append({"label": label, "value": str(upgrade.id)})
         return select, currency
@@ -165,16 +171,18 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
     @uses_db(CustomClient().sessionmaker)
     async def upgrade_select_callback(self, interaction: Interaction, session: Session):
         upgrade_id = int(interaction.data['values'][0])
-        unit = session.query(Unit).filter(Unit.id == self.unit_id).first()
-        currency = unit.unit_req if unit.unit_req > 0 else unit.player.rec_points
+        unit = session.query(Unit).filter(Unit.id == self.unit_id).options(*UNIT_LOAD_PROFILES["shop"]).first()
         if unit is None:
             await interaction.response.send_message(tmpl.unit_not_found, ephemeral=True)
             return
-        upgrade = session.query(ShopUpgrade).filter(ShopUpgrade.id == upgrade_id).first()
-        if upgrade is None:
+        currency = unit.unit_req if unit.unit_req > 0 else unit.player.rec_points
+        # the catalog snapshot only builds the menu, the purchase is checked against the current rows
+        upgrade = session.get(ShopUpgrade, upgrade_id)
+        if upgrade is None or unit.unit_type not in {unit_type.unit_type for unit_type in upgrade.compatible_unit_types}:
             await interaction.response.send_message(tmpl.upgrade_not_found, ephemeral=True)
             return
-        if upgrade.upgrade_type.non_purchaseable:
+        upgrade_type = upgrade.upgrade_type
+        if upgrade_type is None or upgrade_type.non_purchaseable:
             await interaction.response.send_message(tmpl.upgrade_non_purchaseable, ephemeral=True)
             return
         if upgrade.disabled:
@@ -193,7 +201,7 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
             if required_upgrade is None:
                 await interaction.response.send_message(tmpl.dont_have_required_upgrade, ephemeral=True)
                 return
-        if not upgrade.upgrade_type.is_refit:
+        if not upgrade_type.is_refit:
             new_upgrade = PlayerUpgrade(
                 unit_id=unit.id,
                 shop_upgrade_id=upgrade.id,
@@ -208,50 +216,54 @@ class ShopInactiveUnitLayoutView(AuthorizedUserLayoutView):
             else:
                 unit.player.rec_points -= upgrade.cost
             session.commit()
-            CustomClient().queue.put_nowait((1, unit.player, 0))
             await interaction.response.send_message(tmpl.you_have_bought_upgrade.format(upgrade_name=upgrade.name, upgrade_cost=upgrade.cost), ephemeral=True)
         else:
             refit_target = upgrade.refit_target
             refit_cost = upgrade.cost
+            target_type = session.get(UnitType, refit_target) if refit_target else None
+            if target_type is None:
+                await interaction.response.send_message(tmpl.upgrade_not_found, ephemeral=True)
+                return
             current_upgrades = unit.upgrades
-            current_upgrade_set = {upgrade.shop_upgrade for upgrade in current_upgrades}
-            compatible_upgrades = set(upgrade.target_type_info.compatible_upgrades) | {None,}
+            current_upgrade_set = {upgrade.shop_upgrade_id for upgrade in current_upgrades}
+            compatible_upgrades = {compatible.id for compatible in target_type.compatible_upgrades} | {None,}
             incompatible_upgrades = current_upgrade_set - compatible_upgrades
             stockpile = unit.player.stockpile
             if not stockpile:
                 await interaction.response.send_message(tmpl.dont_have_stockpile, ephemeral=True)
                 return
             for _upgrade in current_upgrades:
-                if _upgrade.shop_upgrade in incompatible_upgrades:
+                if _upgrade.shop_upgrade_id in incompatible_upgrades:
                     _upgrade.unit_id = stockpile.id
             if unit.original_type is None:
                 unit.original_type = unit.unit_type
             unit.unit_type = refit_target
-            unit.unit_req = upgrade.target_type_info.unit_req
+            unit.unit_req = target_type.unit_req
             unit.player.rec_points -= refit_cost
 
-            if upgrade.target_type_info.free_upgrade_1:
+            free_upgrade_1_info = target_type.free_upgrade_1_info
+            if free_upgrade_1_info is not None:
                 free_upgrade_1 = PlayerUpgrade(
                     unit_id=unit.id,
-                    shop_upgrade_id=upgrade.target_type_info.free_upgrade_1,
-                    type=upgrade.target_type_info.free_upgrade_1_info.type,
-                    name=upgrade.target_type_info.free_upgrade_1_info.name,
+                    shop_upgrade_id=free_upgrade_1_info.id,
+                    type=free_upgrade_1_info.type,
+                    name=free_upgrade_1_info.name,
                     original_price=0,
                     non_transferable=True
                 )
                 session.add(free_upgrade_1)
-            if upgrade.target_type_info.free_upgrade_2:
+            free_upgrade_2_info = target_type.free_upgrade_2_info
+            if free_upgrade_2_info is not None:
                 free_upgrade_2 = PlayerUpgrade(
                     unit_id=unit.id,
-                    shop_upgrade_id=upgrade.target_type_info.free_upgrade_2,
-                    type=upgrade.target_type_info.free_upgrade_2_info.type,
-                    name=upgrade.target_type_info.free_upgrade_2_info.name,
+                    shop_upgrade_id=free_upgrade_2_info.id,
+                    type=free_upgrade_2_info.type,
+                    name=free_upgrade_2_info.name,
                     original_price=0,
                     non_transferable=True
                 )
                 session.add(free_upgrade_2)
             session.commit()
-            CustomClient().queue.put_nowait((1, unit.player, 0))
             await interaction.response.send_message(tmpl.you_have_bought_refit.format(refit_target=refit_target, refit_cost=refit_cost), ephemeral=True)
             layout_view = ShopInactiveUnitLayoutView(unit.player.discord_id, unit.id)
             await interaction.message.edit(view=layout_view)
@@ -265,7 +277,7 @@ class ShopProposedUnitLayoutView(AuthorizedUserLayoutView):
         super().__init__(timeout=None)
         self.discord_id = discord_id
         self.unit_id = unit_id
-        unit = session.query(Unit).filter(Unit.id == unit_id).first()
+        unit = session.query(Unit).filter(Unit.id == unit_id).options(*UNIT_LOAD_PROFILES["owner"]).first()
         if unit is None:
             self.add_item(ui.TextDisplay(content=tmpl.unit_not_found))
             return
@@ -281,7 +293,7 @@ class ShopProposedUnitLayoutView(AuthorizedUserLayoutView):
     @error_reporting(True)
     @uses_db(CustomClient().sessionmaker)
     async def buy_button_callback(self, interaction: Interaction, session: Session):
-        unit = session.query(Unit).filter(Unit.id == self.unit_id).first()
+        unit = session.query(Unit).filter(Unit.id == self.unit_id).options(*UNIT_LOAD_PROFILES["owner"]).first()
         if unit is None:
             await interaction.response.send_message(tmpl.unit_not_found, ephemeral=True)
             return
@@ -302,7 +314,7 @@ class ShopDeadUnitLayoutView(AuthorizedUserLayoutView):
         super().__init__(timeout=None)
         self.discord_id = discord_id
         self.unit_id = unit_id
-        unit = session.query(Unit).filter(Unit.id == unit_id).first()
+        unit = session.query(Unit).filter(Unit.id == unit_id).options(*UNIT_LOAD_PROFILES["owner"]).first()
         if unit is None:
             self.add_item(ui.TextDisplay(content=tmpl.unit_not_found))
             return
@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 
 from customclient import CustomClient
 from MessageManager import MessageManager
-from models import Player, Unit, PlayerUpgrade
+from models import Player, Unit, PlayerUpgrade, player_by_discord_id
 from utils import uses_db, RecordingView
 
 logger = getLogger(__name__)
@@ -32,7 +32,7 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
         message_manager = MessageManager(interaction)
         unit_select = Select(placeholder="Select a unit")
         view = RecordingView()
-        _player: Player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
+        _player: Player = player_by_discord_id(session, interaction.user.id)
         logger.debug(f"Player: {_player}")
         if _player is None:
             await message_manager.send_message(view=view, content="You don't have a company yet, please create one with `/company create`", ephemeral=self.bot.use_ephemeral)
@@ -48,7 +48,7 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
         await message_manager.send_message(view=view, ephemeral=self.bot.use_ephemeral)
         @uses_db(CustomClient().sessionmaker) # we need a second session to get the upgrades, because the first session has already left scope
         async def unit_select_callback(interaction: Interaction, session: Session):
-            _player: Player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
+            _player: Player = player_by_discord_id(session, interaction.user.id)
             if _player is None:
                 await message_manager.update_message(content="Something went wrong, please try again or contact Cheese")
                 await interaction.response.defer(thinking=False)
@@ -83,7 +83,7 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
             await interaction.response.defer(thinking=False) # suppress the "This interaction failed" error message
             @uses_db(CustomClient().sessionmaker)
             async def upgrade_select_callback(interaction: Interaction, session: Session):
-                _player: Player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
+                _player: Player = player_by_discord_id(session, interaction.user.id)
                 if _player is None:
                     await message_manager.update_message(content="Something went wrong, please try again or contact Cheese")
                     await interaction.response.defer(thinking=False)
@@ -117,7 +117,6 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
                 session.commit()
                 await message_manager.update_message(content="Upgrade stored in stockpile")
                 await interaction.response.defer(thinking=False)
-                self.bot.queue.put_nowait((1, _player, 0))
             upgrade_select.callback = upgrade_select_callback
         unit_select.callback = unit_select_callback
 
@@ -128,7 +127,7 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
         logger.info(f"{interaction.user.name} is retrieving an upgrade")
         message_manager = MessageManager(interaction)
         view = RecordingView()
-        _player: Player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
+        _player: Player = player_by_discord_id(session, interaction.user.id)
         if _player is None:
             await message_manager.send_message(view=view, content="You don't have a company yet, please create one with `/company create`", ephemeral=self.bot.use_ephemeral)
             return
@@ -139,7 +138,7 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
         await message_manager.send_message(view=view, content="Select a unit to give the upgrade to", ephemeral=self.bot.use_ephemeral)
         @uses_db(CustomClient().sessionmaker)
         async def unit_select_callback(interaction: Interaction, session: Session):
-            _player: Player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
+            _player: Player = player_by_discord_id(session, interaction.user.id)
             if _player is None:
                 await message_manager.update_message(content="Something went wrong, please try again or contact Cheese")
                 await interaction.response.defer(thinking=False)
@@ -166,8 +165,9 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
                 await interaction.response.defer(thinking=False)
                 return
             upgrade_select = Select(placeholder="Select an upgrade")
+            compatible = {upgrade.id for upgrade in self.bot.catalog.get().upgrades_by_unit_type.get(_unit.unit_type, ())}
             for upgrade in _stockpile.upgrades:
-                if upgrade.shop_upgrade in _unit.available_upgrades:
+                if upgrade.shop_upgrade_id in compatible:
                     upgrade_select.add_option(label=upgrade.name, value=upgrade.id)
             if len(upgrade_select.options) == 0:
                 upgrade_select.add_option(label="This unit has no upgrades", value="None", default=True)
@@ -180,7 +180,7 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
             unit_id = _unit.id
             @uses_db(CustomClient().sessionmaker)
             async def upgrade_select_callback(interaction: Interaction, session: Session):
-                _player: Player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
+                _player: Player = player_by_discord_id(session, interaction.user.id)
                 if _player is None:
                     await message_manager.update_message(content="Something went wrong, please try again or contact Cheese")
                     await interaction.response.defer(thinking=False)
@@ -206,7 +206,6 @@ class Stockpile(GroupCog, description="Store and retrieve upgrades in your stock
                 session.commit()
                 await message_manager.update_message(content="Upgrade retrieved")
                 await interaction.response.defer(thinking=False)
-                self.bot.queue.put_nowait((1, _player, 0))
 
             upgrade_select.callback = upgrade_select_callback
 
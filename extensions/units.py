@@ -12,7 +12,7 @@ from sqlalchemy.orm import Session
 import templates as tmpl
 
 from customclient import CustomClient
-from models import Player, Unit as Unit_model, UnitStatus, Campaign, CampaignInvite, UnitType
+from models import Player, Unit as Unit_model, UnitStatus, Campaign, CampaignInvite, UnitType, campaign_by_name, player_by_discord_id, units_by_status
 from utils import EnvironHelpers, fuzzy_autocomplete, hide_arg, maybe_decorate, uses_db, is_management, error_reporting, with_log_level, RecordingView
 
 logger = getLogger(__name__)
@@ -168,10 +168,6 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
                 await interaction.followup.send(tmpl.unit_created.format(unit=unit), ephemeral=True)
                 logger.triage("Sent success message to user")
 
-                player = session.query(Player).filter(Player.id == player_id).first()
-                CustomClient().queue.put_nowait((1, player, 0))
-                logger.triage("Added player update to queue")
-
                 button.disabled = True
                 logger.triage("Disabled create button")
 
@@ -222,7 +218,7 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
             return
 
         logger.triage(f"Querying player for {interaction.user.global_name}")
-        player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if not player:
             logger.triage(f"No player found for {interaction.user.global_name}")
             await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=True)
@@ -263,7 +259,7 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
                 return
 
             logger.triage(f"Re-querying player for {interaction.user.global_name}")
-            _player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+            _player = player_by_discord_id(session, interaction.user.id)
             if not _player:
                 logger.warning(f"Player {interaction.user.global_name} does not have a Company")
                 await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=True)
@@ -335,8 +331,6 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
                 session.commit()
                 logger.info(f"Unit {unit.name} selected for campaign {campaign_name} by {interaction.user.global_name}")
                 await interaction.response.send_message(tmpl.unit_selected_for_campaign.format(unit=unit, campaign_name=campaign_name), ephemeral=True)
-                logger.triage("Adding player update to queue")
-                CustomClient().queue.put_nowait((1, player, 0))
 
             unit_select.callback = on_unit_select
             await interaction.response.send_message(tmpl.unit_select_unit, view=unit_view, ephemeral=True)
@@ -348,11 +342,11 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
     @uses_db(CustomClient().sessionmaker)
     async def remove_unit(self, interaction: Interaction, session: Session):
         logger = getLogger(f"{__name__}.remove_unit")
-        player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if not player:
             await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=CustomClient().use_ephemeral)
             return
-        units = session.query(Unit_model).filter(Unit_model.player_id == player.id, Unit_model.status == UnitStatus.PROPOSED).all()
+        units = units_by_status(session, player.id, UnitStatus.PROPOSED)
         if not units:
             await interaction.response.send_message(tmpl.unit_no_proposed_units, ephemeral=CustomClient().use_ephemeral)
             return
@@ -377,7 +371,6 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
                 logger.debug(f"Removing unit {unit.name}")
                 session.delete(unit)
                 session.commit()
-                CustomClient().queue.put_nowait((1, player, 0)) # this is a nested class, so we have to invoke the singleton instead of using self.bot.queue
                 await interaction.followup.send(tmpl.unit_removed.format(unit=unit), ephemeral=CustomClient().use_ephemeral)
 
         view = RecordingView()
@@ -397,7 +390,7 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
         logger.debug(f"Deactivate unit request: user_id={interaction.user.id}, user_name={interaction.user.global_name}")
 
         # Find the player and their active units
-        player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if not player:
             logger.warning(f"Player not found: user_id={interaction.user.id}")
             await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=CustomClient().use_ephemeral)
@@ -418,10 +411,6 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
 
             original_callsign = self._deactivate_unit_by_id(unit.id, session, cmd_log=logger)
             await interaction.response.send_message(tmpl.unit_deactivated.format(original_callsign=original_callsign), ephemeral=CustomClient().use_ephemeral)
-
-            # Queue notification
-            self.bot.queue.put_nowait((1, player, 0))
-            logger.debug(f"Queued notification for deactivated unit: player_id={player.discord_id}, unit_callsign={original_callsign}")
         else:
             # Multiple active units - show dropdown
             logger.debug(f"Multiple active units found, showing dropdown: count={len(active_units)}")
@@ -448,12 +437,6 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
                     original_callsign = cog._deactivate_unit_by_id(unit_id, session, cmd_log=logger)
                     await interaction.response.send_message(tmpl.unit_deactivated.format(original_callsign=original_callsign), ephemeral=CustomClient().use_ephemeral)
 
-                    # Queue notification
-                    player = session.query(Player).filter(Player.discord_id == str(interaction.user.id)).first()
-                    if player:
-                        cog.bot.queue.put_nowait((1, player, 0))
-                        logger.debug(f"Queued notification for deactivated unit: player_id={player.discord_id}, unit_callsign={original_callsign}")
-
             class DeactivateUnitView(RecordingView):
                 def __init__(self, units: list[Unit_model]):
                     super().__init__()
@@ -471,7 +454,7 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
     @ac.describe(player="The player to deliver results for")
     @uses_db(CustomClient().sessionmaker)
     async def units(self, interaction: Interaction, player: User, session: Session):
-        player = session.query(Player).filter(Player.discord_id == player.id).first()
+        player = player_by_discord_id(session, player.id)
         if not player:
             await interaction.response.send_message(tmpl.unit_user_no_company, ephemeral=CustomClient().use_ephemeral)
             return
@@ -499,7 +482,7 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
     async def rename(self, interaction: Interaction, session: Session):
         logger = getLogger(f"{__name__}.rename")
         logger.info("rename command invoked")
-        player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if not player:
             logger.error("Player not found for rename command")
             await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=CustomClient().use_ephemeral)
@@ -552,7 +535,6 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
                         return
                     _unit.name = new_name
                     session.commit()
-                    CustomClient().queue.put_nowait((1, player, 0))
 
                     logger.info(f"Unit renamed to {new_name}")
                     await interaction.response.send_message(tmpl.unit_renamed.format(new_name=new_name), ephemeral=CustomClient().use_ephemeral)
@@ -574,15 +556,15 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
     @uses_db(CustomClient().sessionmaker)
     async def transfer_unit(self, interaction: Interaction, campaign: str, session: Session):
         logger = getLogger(f"{__name__}.transfer_unit")
-        _campaign = session.query(Campaign).filter(Campaign.name == campaign).first()
+        _campaign = campaign_by_name(session, campaign)
         if _campaign is None:
             await interaction.response.send_message(tmpl.campaign_not_found, ephemeral=True)
             return
-        player = session.query(Player).filter(Player.discord_id == interaction.user.id).first()
+        player = player_by_discord_id(session, interaction.user.id)
         if not player:
             await interaction.response.send_message(tmpl.no_meta_campaign_company, ephemeral=CustomClient().use_ephemeral)
             return
-        units = session.query(Unit_model).filter(Unit_model.player_id == player.id, Unit_model.status == UnitStatus.PROPOSED).all()
+        units = units_by_status(session, player.id, UnitStatus.PROPOSED)
         if not units:
             await interaction.response.send_message(tmpl.unit_no_proposed_units, ephemeral=CustomClient().use_ephemeral)
             return
@@ -608,7 +590,7 @@ class Unit(GroupCog, description="Unit commands: create, activate, deactivate, r
                     return m.author == interaction.user and m.mentions
 
                 msg = await self.bot.wait_for('message', check=check, timeout=60.0)
-                target_player = session.query(Player).filter(Player.discord_id == msg.mentions[0].id).first()
+                target_player = player_by_discord_id(session, msg.mentions[0].id)
                 if not target_player:
                     await interaction.followup.send(tmpl.unit_transfer_target_no_company, ephemeral=CustomClient().use_ephemeral)
                     return
@@ -33,7 +33,7 @@ class Updater(GroupCog, description="Daily git update check; notifies owner when
             logger.error(f"Error fetching updates: {stderr.decode() if stderr else 'Unknown error'}")
             return
         if stdout.strip() != b"":
-            owner = await self.bot.fetch_user(EnvironHelpers.required_int("BOT_OWNER_ID"))
+            owner = await self.bot.get_or_fetch_user(EnvironHelpers.required_int("BOT_OWNER_ID"))
             await owner.send("An Update is available")
 
 async def setup(_bot: CustomClient):
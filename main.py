@@ -7,7 +7,7 @@ import os
 import re
 import stat
 import sys
-from utils import EnvironHelpers
+from utils import EnvironHelpers, async_database_url
 
 # Environ setup
 if not os.path.exists("global.env"):
@@ -68,6 +68,7 @@ logging.basicConfig(level=EnvironHelpers.get_log_level("LOG_LEVEL", "INFO"),
                     force=True) # needed to delete the default stderr handler
 # rest of the imports
 import asyncio
+import dbmetrics
 from customclient import CustomClient
 from models import BaseModel
 from sqlalchemy import create_engine, text
@@ -101,6 +102,12 @@ engine = create_engine(
     max_overflow=20)
 
 logger.debug("Database engine created with URL: %s", database_url)
+# N+1 detection is meant for development and staging, it's off unless NPLUSONE_THRESHOLD is set
+db_instrumentation = {"slow_query_threshold": EnvironHelpers.get_float("SLOW_QUERY_THRESHOLD", 0.5),
+                      "repeat_threshold": EnvironHelpers.get_int("NPLUSONE_THRESHOLD", 0),
+                      "raise_on_repeat": EnvironHelpers.get_bool("NPLUSONE_RAISE")}
+dbmetrics.install(engine, **db_instrumentation)
+
 
 # logging.getLogger("sqlalchemy.engine").setLevel(logging.DEBUG)
 # logging.getLogger("sqlalchemy.pool").setLevel(logging.DEBUG)
@@ -113,6 +120,21 @@ logger.info("Database tables created successfully.")
 
 # create a session
 Session = sessionmaker(bind=engine)
+
+# the async engine is optional, code moves to it incrementally through utils.uses_async_db.
+# Its sessions share the sync session class, so session event listeners apply to both
+AsyncSession = None
+if EnvironHelpers.get_bool("ASYNC_DATABASE"):
+    async_url = async_database_url(database_url)
+    if async_url:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        pool_options = {} if engine.dialect.name == "sqlite" else {"pool_size": 10, "max_overflow": 20}
+        async_engine = create_async_engine(url=async_url, pool_pre_ping=True, **pool_options)
+        AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False, sync_session_class=Session.class_)
+        dbmetrics.install(async_engine.sync_engine, **db_instrumentation)
+        logger.debug("Async database engine created with driver %s", async_engine.dialect.driver)
+    else:
+        logger.warning("ASYNC_DATABASE is set but no async driver for %s is installed, using the sync engine only", engine.dialect.name)
 session = Session()
 
 session.commit()
@@ -123,7 +145,7 @@ if engine.dialect.name == "mysql":
 logger.debug("Session created successfully.")
 
 # create the bot
-bot = CustomClient(session, sessionmaker=Session, dialect=engine.dialect.name)
+bot = CustomClient(session, sessionmaker=Session, dialect=engine.dialect.name, async_sessionmaker=AsyncSession)
 logger.info("Bot created successfully.")
 
 # start the bot
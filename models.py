@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+import ast
+import json
 import logging
+import pickle
 from enum import Enum as PyEnum
+from datetime import datetime
 from typing import Any, Callable, Iterable, Iterator, MutableMapping, Optional
 
 import discord
-from sqlalchemy import ColumnElement, Integer, String, Enum, ForeignKey, PickleType, Boolean, BigInteger, func, literal, select, Index, UniqueConstraint, CheckConstraint, text, DDL, event, MetaData
+from sqlalchemy import ColumnElement, Integer, LargeBinary, String, Text, Enum, ForeignKey, Boolean, BigInteger, DateTime, bindparam, column, func, inspect, literal, select, update, Index, UniqueConstraint, CheckConstraint, text, DDL, event, MetaData
 from sqlalchemy.ext.hybrid import Comparator, hybrid_property
-from sqlalchemy.orm import Session, relationship, DeclarativeBase, Mapped, mapped_column, column_property, validates
+from sqlalchemy.orm import Session, relationship, DeclarativeBase, Mapped, mapped_column, column_property, validates, joinedload, lazyload, load_only, selectinload
 from sqlalchemy.sql.operators import OperatorType
 from sqlalchemy.types import TypeDecorator
 
@@ -58,6 +62,51 @@ class UnitStatusCoercingEnum(TypeDecorator):
     def process_result_value(self, value, dialect):
         return value
 
+# tagged types for TypedJSON, tag -> (python type, to a JSON value, from a JSON value).
+# Register a type here before storing it in a TypedJSON column
+JSON_CODECS: dict[str, tuple[type, Callable[[Any], Any], Callable[[Any], Any]]] = {
+    "set": (set, list, set),
+    "frozenset": (frozenset, list, frozenset),
+    "datetime": (datetime, datetime.isoformat, datetime.fromisoformat),
+}
+
+def _json_default(value: Any) -> Any:
+    for tag, (cls, encode, _) in JSON_CODECS.items():
+        if type(value) is cls:
+            return {"__type__": tag, "value": encode(value)}
+    raise TypeError(f"Cannot store {type(value).__name__} as JSON, add a codec to JSON_CODECS")
+
+def _json_object_hook(obj: dict) -> Any:
+    if len(obj) == 2 and "__type__" in obj and "value" in obj and obj["__type__"] in JSON_CODECS:
+        return JSON_CODECS[obj["__type__"]][2](obj["value"])
+    return obj
+
+def dump_json(value: Any) -> str:
+    """Encode a value the way TypedJSON stores it."""
+    return json.dumps(value, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
+def load_json(data: str | bytes) -> Any:
+    """Decode a value stored by TypedJSON."""
+    return json.loads(data, object_hook=_json_object_hook)
+
+class TypedJSON(TypeDecorator):
+    """Stores values as JSON text, with the types in JSON_CODECS tagged so they decode to the same type.
+    Tuples come back as lists and dict keys as strings, as with plain JSON.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return dump_json(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return load_json(value)
+
 class DiscordUserComparator(Comparator):
     """
     SQLAlchemy hybrid comparator for comparing Discord user IDs (stored as
@@ -91,6 +140,10 @@ class BaseModel(DeclarativeBase):
     """
     Abstract base for all SQLAlchemy models. Provides naming conventions for
     indexes and constraints, and default __repr__, __hash__, and __eq__.
+
+    Equality and hashing follow the identity key: two instances are equal when they
+    are the same class and primary key. Transient and pending instances have no
+    identity key yet and are only equal to themselves.
     """
 
     __abstract__ = True
@@ -114,12 +167,19 @@ class BaseModel(DeclarativeBase):
     __str__ = __repr__
 
     def __hash__(self):
-        return hash(repr(self))
+        # the identity key is set on flush and never loads anything, unlike the primary key attributes
+        key = self._sa_instance_state.key
+        if key is None:
+            return object.__hash__(self)
+        return hash(key)
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, self.__class__):
             return False
-        return repr(self) == repr(other)
+        key = self._sa_instance_state.key
+        return key is not None and key == other._sa_instance_state.key
 
 
 # Models
@@ -350,6 +410,11 @@ class PlayerUpgrade(BaseModel):
     upgrade_type: Mapped[UpgradeType] = relationship("UpgradeType", foreign_keys=[type], back_populates="player_upgrades", lazy="joined", passive_deletes=True)
 
 class Dossier(BaseModel):
+    """
+    Links a player to their dossier message ID in the dossier channel.
+    content_hash is the hash of the last published content, used to skip no-op edits.
+    """
+
     __tablename__ = "dossiers"
 
     # Table options
@@ -361,6 +426,7 @@ class Dossier(BaseModel):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     player_id: Mapped[int] = mapped_column(ForeignKey("players.id", ondelete="CASCADE"), unique=True, nullable=False)
     message_id: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     # relationships
     player: Mapped[Player] = relationship("Player", back_populates="dossier", lazy="joined", passive_deletes=True)
 
@@ -368,6 +434,8 @@ class Statistic(BaseModel):
     """
     Links a player to their statistics message ID in the statistics channel.
     One row per player; used to update or recreate the stats embed.
+    content_hash is the hash of the last published content, used to skip no-op edits.
+    message_id is the first page; statistics too long for one message continue in pages.
     """
 
     __tablename__ = "statistics"
@@ -380,8 +448,33 @@ class Statistic(BaseModel):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     player_id: Mapped[int] = mapped_column(ForeignKey("players.id", ondelete="CASCADE"), unique=True, nullable=False)
     message_id: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     # relationships
     player: Mapped[Player] = relationship("Player", back_populates="statistic", lazy="joined", passive_deletes=True)
+    pages: Mapped[list[StatisticPage]] = relationship("StatisticPage", back_populates="statistic", order_by="StatisticPage.page", cascade="all, delete-orphan", lazy="select", passive_deletes=True)
+
+class StatisticPage(BaseModel):
+    """
+    A continuation message of a player's statistics, for statistics longer than one
+    Discord message. Pages are numbered from 1, page 0 being the Statistic's own message.
+    content_hash is the hash of the last published content of the page.
+    """
+
+    __tablename__ = "statistic_pages"
+
+    # Table options
+    __table_args__ = (
+        UniqueConstraint('statistic_id', 'page', name='uq_statistic_pages_statistic_id_page'),
+        {'mysql_engine': 'InnoDB', 'mysql_charset': 'utf8mb4', 'mysql_collate': 'utf8mb4_unicode_ci'},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    statistic_id: Mapped[int] = mapped_column(ForeignKey("statistics.id", ondelete="CASCADE"), nullable=False)
+    page: Mapped[int] = mapped_column(Integer, nullable=False)
+    message_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    # relationships
+    statistic: Mapped[Statistic] = relationship("Statistic", back_populates="pages", lazy="select")
 
 class Config(BaseModel):
     __tablename__ = "configs"
@@ -393,7 +486,7 @@ class Config(BaseModel):
 
     # columns
     key: Mapped[str] = mapped_column(String(255), primary_key=True, nullable=False)
-    value: Mapped[PickleType] = mapped_column(PickleType, nullable=False)
+    value: Mapped[Any] = mapped_column(TypedJSON, nullable=False)
 
 class Medals(BaseModel):
     """
@@ -511,11 +604,12 @@ class Unit(BaseModel):
     unit_req: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0", index=True)
 
     # relationships
-    player: Mapped[Player] = relationship("Player", back_populates="units", overlaps="live_players,players", passive_deletes=True, lazy="joined")
+    # loaded on access; queries that need them up front pick a profile from UNIT_LOAD_PROFILES
+    player: Mapped[Player] = relationship("Player", back_populates="units", overlaps="live_players,players", passive_deletes=True, lazy="select")
     upgrades: Mapped[list[PlayerUpgrade]] = relationship("PlayerUpgrade", back_populates="unit", cascade="delete, delete-orphan", lazy="select", passive_deletes=True)
-    campaign: Mapped[Optional[Campaign]] = relationship("Campaign", back_populates="units", overlaps="live_players,players", passive_deletes=True, lazy="joined")
-    type_info: Mapped[UnitType] = relationship("UnitType", foreign_keys=[unit_type], lazy="joined", back_populates="units", cascade="save-update", passive_deletes=True)
-    original_type_info: Mapped[Optional[UnitType]] = relationship("UnitType", foreign_keys=[original_type], lazy="joined", back_populates="original_units", passive_deletes=True)
+    campaign: Mapped[Optional[Campaign]] = relationship("Campaign", back_populates="units", overlaps="live_players,players", passive_deletes=True, lazy="select")
+    type_info: Mapped[UnitType] = relationship("UnitType", foreign_keys=[unit_type], lazy="select", back_populates="units", cascade="save-update", passive_deletes=True)
+    original_type_info: Mapped[Optional[UnitType]] = relationship("UnitType", foreign_keys=[original_type], lazy="select", back_populates="original_units", passive_deletes=True)
     available_upgrades: Mapped[list[ShopUpgrade]] = relationship(
         "ShopUpgrade",
         order_by=(ShopUpgrade.sort_key, ShopUpgrade.type, ShopUpgrade.id),
@@ -641,73 +735,211 @@ class UnitHistory(BaseModel):
     # we don't have a relationship to the campaign, because campaigns get deleted when they end
     # but we populate this table before that happens
 
+class PendingTask(BaseModel):
+    """
+    A publish task that was still queued when it was last persisted. One row per
+    player, written in batches by taskqueue.QueueJournal and replayed on startup
+    so queued dossier and statistics updates survive a restart.
+    """
+
+    __tablename__ = "pending_tasks"
+
+    __table_args__ = (
+        {'mysql_engine': 'InnoDB', 'mysql_charset': 'utf8mb4', 'mysql_collate': 'utf8mb4_unicode_ci'},
+    )
+
+    player_id: Mapped[int] = mapped_column(ForeignKey("players.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    task_type: Mapped[int] = mapped_column(Integer, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    enqueued_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+class DeadLetter(BaseModel):
+    """
+    A publish task that failed too many times and was given up on, kept with its last
+    error so it can be inspected, replayed or purged through /debug deadletters.
+    """
+
+    __tablename__ = "dead_letters"
+
+    __table_args__ = (
+        {'mysql_engine': 'InnoDB', 'mysql_charset': 'utf8mb4', 'mysql_collate': 'utf8mb4_unicode_ci'},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_type: Mapped[int] = mapped_column(Integer, nullable=False)
+    model: Mapped[str] = mapped_column(String(30), nullable=False)
+    target_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    error: Mapped[str] = mapped_column(String(1000), nullable=False, server_default="")
+    enqueued_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    failed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+# everything needed to render a player's dossier and statistics messages. Related objects
+# that are only back references, or not rendered at all, are not loaded: a back reference
+# to an object already in the session is resolved from the identity map without a query
+RENDER_GRAPH_OPTIONS = (
+    joinedload(Player.dossier).lazyload(Dossier.player),
+    joinedload(Player.statistic).options(lazyload(Statistic.player), joinedload(Statistic.pages)),
+    selectinload(Player.medals).lazyload(Medals.player),
+    selectinload(Player.units).options(
+        lazyload(Unit.player),
+        joinedload(Unit.campaign),
+        lazyload(Unit.type_info),
+        lazyload(Unit.original_type_info),
+        selectinload(Unit.upgrades).options(
+            lazyload(PlayerUpgrade.unit),
+            lazyload(PlayerUpgrade.shop_upgrade),
+            lazyload(PlayerUpgrade.upgrade_type),
+        ),
+    ),
+)
+
+# upgrades of a unit without their joined relationships, the unit is resolved from the identity map
+_UNIT_UPGRADES = selectinload(Unit.upgrades).options(
+    lazyload(PlayerUpgrade.unit),
+    lazyload(PlayerUpgrade.shop_upgrade),
+    lazyload(PlayerUpgrade.upgrade_type),
+)
+
+# named loader profiles for Unit queries, applied with `.options(*UNIT_LOAD_PROFILES[name])`.
+# Unit's relationships load lazily, so a query only joins what its profile asks for
+UNIT_LOAD_PROFILES = {
+    # select menus and other lists that only show the unit's name
+    "option_list": (load_only(Unit.id, Unit.name),),
+    # views that only need the unit's owner
+    "owner": (joinedload(Unit.player),),
+    # unit lines of the statistics and search output
+    "render": (joinedload(Unit.campaign), _UNIT_UPGRADES),
+    # management's unit info view
+    "info": (joinedload(Unit.player), joinedload(Unit.campaign)),
+    # shop views: the owner's points and the owned upgrades, the upgrades for sale come from the catalog cache
+    "shop": (joinedload(Unit.player), _UNIT_UPGRADES),
+}
+
+def load_render_graph(session: Session, player_ids: Iterable[int]) -> dict[int, Player]:
+    """
+    Load players together with their render graph: dossier and statistics rows with the
+    statistics pages, medals, units with their campaign, and the units' upgrades.
+
+    Uses four queries however many players are requested, so bulk refreshes can load a
+    whole batch at once. Players already in the session get their unloaded relationships
+    filled in.
+
+    Args:
+        session: The session to load into.
+        player_ids: IDs of the players to load.
+
+    Returns:
+        The loaded players by ID. IDs without a player are left out.
+    """
+
+    player_ids = set(player_ids)
+    if not player_ids:
+        return {}
+    players = session.scalars(select(Player).where(Player.id.in_(player_ids)).options(*RENDER_GRAPH_OPTIONS)).unique().all()
+    return {player.id: player for player in players}
+
+# The lookups run on almost every interaction, built once with bound parameters. A call only
+# binds its values, so the statement isn't rebuilt and its compiled form comes from the engine's
+# compiled cache every time (see armcobot_db_compiled_cache_total)
+_PLAYER_BY_DISCORD_ID = select(Player).where(Player.discord_id == bindparam("discord_id")).limit(1)
+_UNIT_BY_NAME = select(Unit).where(Unit.player_id == bindparam("player_id"), Unit.name == bindparam("name")).limit(1)
+_CAMPAIGN_BY_NAME = select(Campaign).where(Campaign.name == bindparam("name")).limit(1)
+_UNITS_BY_STATUS = select(Unit).where(Unit.player_id == bindparam("player_id"), Unit.status == bindparam("status"))
+
+def player_by_discord_id(session: Session, discord_id: int | str) -> Player | None:
+    """The player with this Discord user id, or None."""
+    return session.scalars(_PLAYER_BY_DISCORD_ID, {"discord_id": str(discord_id)}).unique().first()
+
+def unit_by_name(session: Session, player_id: int, name: str) -> Unit | None:
+    """The player's unit with this name, or None."""
+    return session.scalars(_UNIT_BY_NAME, {"player_id": player_id, "name": name}).unique().first()
+
+def campaign_by_name(session: Session, name: str) -> Campaign | None:
+    """The campaign with this name, or None."""
+    return session.scalars(_CAMPAIGN_BY_NAME, {"name": name}).unique().first()
+
+def units_by_status(session: Session, player_id: int, status: UnitStatus | str) -> list[Unit]:
+    """The player's units with this status."""
+    return list(session.scalars(_UNITS_BY_STATUS, {"player_id": player_id, "status": status}).unique())
+
 create_all = BaseModel.metadata.create_all
 Base = BaseModel # alias just for external tooling convenience
 
 def ConfigDict(sessionmaker: Callable):
+    """
+    A mutable mapping over the `configs` table.
+
+    All rows are loaded once and reads are served from memory. Assignments and deletions are
+    committed to the database before the cache is updated, so the table never lags behind.
+    Values changed in place (a set or dict read from the mapping) are not seen, write them
+    back with `sync(key)`. `reload()` reloads every row, for changes made outside the mapping.
+
+    The legacy `BOT_CONFIG` row, which held the whole bot config as one dict, is split into
+    one row per key the first time the mapping is created.
+    """
+
     class _ConfigDict(MutableMapping[str, Any]):
         def __init__(self):
-            old = self.get("BOT_CONFIG")
-            if old:
-                self["dossier_channel_id"] = old.value["dossier_channel_id"]
-                self["statistics_channel_id"] = old.value["statistics_channel_id"]
+            self._cache: dict[str, Any] = {}
+            self.reload()
+            if "BOT_CONFIG" in self:
+                old = self["BOT_CONFIG"]
+                if isinstance(old, str): # stored as its repr by old versions
+                    old = ast.literal_eval(old)
+                for key, value in (old or {}).items():
+                    self[key] = value
                 del self["BOT_CONFIG"]
+                logger.info(f"Split BOT_CONFIG into {len(old or {})} config rows")
 
         @utils.uses_db(sessionmaker)
-        def __getitem__(self, key: str, session: Session, /) -> Any:
-            try:
-                return session.get(Config, key).value
-            except AttributeError:
-                raise KeyError(key)
+        def reload(self, session: Session) -> None:
+            # built aside and swapped in, readers never see a half loaded cache
+            cache = {}
+            for key, raw in session.execute(select(Config.key, column("value")).select_from(Config)):
+                try:
+                    cache[key] = load_json(raw)
+                except ValueError as e: # includes undecodable bytes, like a pickle left by the migration
+                    logger.error(f"Skipping config {key!r}, its value can't be decoded and is replaced if the key is assigned: {e!r}")
+            self._cache = cache
+
+        def __getitem__(self, key: str, /) -> Any:
+            return self._cache[key]
 
         @utils.uses_db(sessionmaker)
-        def __setitem__(self, key: str, value: Any, session: Session, /) -> None:
+        def __setitem__(self, key: str, value: Any, session: Session) -> None:
             config = session.get(Config, key)
             if config:
                 config.value = value
             else:
                 config = Config(key=key, value=value)
                 session.add(config)
+            session.commit()
+            self._cache[key] = value
 
         @utils.uses_db(sessionmaker)
-        def __delitem__(self, key: str, session: Session, /) -> None:
+        def __delitem__(self, key: str, session: Session) -> None:
             s = session.query(Config).filter(Config.key == key).delete()
-            if s == 0:
+            if s == 0 and key not in self._cache:
                 raise KeyError(key)
+            session.commit()
+            self._cache.pop(key, None)
 
-        @utils.uses_db(sessionmaker)
-        def __iter__(self, session: Session, /) -> Iterator[str]:
-            for k in session.execute(select(Config.key)).scalars().all():
-                yield k
+        def __iter__(self) -> Iterator[str]:
+            return iter(list(self._cache))
 
-        @utils.uses_db(sessionmaker)
-        def __len__(self, session: Session, /) -> int:
-            return session.query(Config).count()
+        def __len__(self) -> int:
+            return len(self._cache)
 
-        @utils.uses_db(sessionmaker)
-        def __contains__(self, key: str, session: Session, /) -> bool:
-            return session.get(Config, key) is not None
+        def __contains__(self, key: object, /) -> bool:
+            return key in self._cache
 
         def get(self, key: str, default: Any = None, /) -> Any:
-            try:
-                return self[key]
-            except KeyError:
-                return default
+            return self._cache.get(key, default)
 
-        @utils.uses_db(sessionmaker)
-        def items(self, session: Session, /) -> Iterator[tuple[str, Any]]:
-            for k, v in session.execute(select(Config.key, Config.value)).tuples().all():
-                yield k, v
-
-        @utils.uses_db(sessionmaker)
-        def keys(self, session: Session, /) -> Iterator[str]:
-            for k in session.execute(select(Config.key)).scalars().all():
-                yield k
-
-        @utils.uses_db(sessionmaker)
-        def values(self, session: Session, /) -> Iterator[Any]:
-            for v in session.execute(select(Config.value)).scalars().all():
-                yield v
+        def sync(self, key: str, /) -> None:
+            """Write back a value that was changed in place."""
+            self[key] = self._cache[key]
 
         def clear(self, /) -> None:
             raise NotImplementedError("clear is not implemented for ConfigDict for safety reasons")
@@ -727,6 +959,65 @@ event.listen(
     DDL("DROP TRIGGER IF EXISTS bi_shop_upgrades_cost_default").execute_if(dialect="mysql")
 )
 
+# create_all doesn't add columns to existing tables, so add the ones introduced since
+# (table, column, DDL type) - additive and idempotent, a column that already exists is skipped
+_added_columns = (
+    ("dossiers", "content_hash", "VARCHAR(64) NULL"),
+    ("statistics", "content_hash", "VARCHAR(64) NULL"),
+)
+
+@event.listens_for(BaseModel.metadata, "after_create")
+def _add_missing_columns(metadata, connection, **kw):
+    inspector = inspect(connection)
+    for table, column_name, ddl in _added_columns:
+        if column_name not in {existing["name"] for existing in inspector.get_columns(table)}:
+            logger.info(f"Adding column {table}.{column_name}")
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_name} {ddl}"))
+
+# DDL turning the old PickleType column of configs.value into text, by dialect. The migrated rows
+# hold UTF-8 JSON bytes by then, which these reinterpret as text as is
+_configs_value_to_text = {
+    "mysql": "ALTER TABLE configs MODIFY COLUMN value TEXT NOT NULL",
+    "mariadb": "ALTER TABLE configs MODIFY COLUMN value TEXT NOT NULL",
+    "postgresql": "ALTER TABLE configs ALTER COLUMN value TYPE TEXT USING convert_from(value, 'UTF8')",
+}
+
+@event.listens_for(BaseModel.metadata, "after_create")
+def _migrate_pickled_configs(metadata, connection, **kw):
+    # configs.value used to be a PickleType BLOB. Pickles are decoded here once and rewritten as
+    # TypedJSON, so reads never unpickle, then the column is converted to text where the dialect
+    # can. SQLite can't change a column's type, but its BLOB column stores the text TypedJSON
+    # binds as text, and the migrated rows come back as bytes, which load_json decodes the same.
+    # A row that can't be migrated is logged and left as is for manual repair, startup goes on
+    configs = metadata.tables["configs"]
+    raw_value = column("value") # untyped, so the driver's bytes or str come back unprocessed
+    rows = connection.execute(select(configs.c.key, raw_value).select_from(configs)).all()
+    pickled = [(key, raw) for key, raw in rows if isinstance(raw, (bytes, bytearray)) and raw[:1] == b"\x80"]
+    failed = []
+    for key, raw in pickled:
+        try:
+            data = dump_json(pickle.loads(raw)).encode() # bytes, which any binary column accepts
+        except Exception as e:
+            logger.error(f"Could not migrate pickled config {key!r} to JSON, leaving it for manual repair: {e!r}")
+            failed.append(key)
+            continue
+        connection.execute(update(configs).where(configs.c.key == key).values(value=literal(data, LargeBinary)))
+    if len(pickled) > len(failed):
+        logger.info(f"Migrated {len(pickled) - len(failed)} pickled config values to JSON")
+    value_type = str(next(existing["type"] for existing in inspect(connection).get_columns("configs") if existing["name"] == "value")).upper()
+    if "BLOB" not in value_type and "BYTEA" not in value_type:
+        return
+    ddl = _configs_value_to_text.get(connection.dialect.name)
+    if ddl is None:
+        if connection.dialect.name != "sqlite":
+            logger.warning(f"Don't know how to convert configs.value from {value_type} to TEXT on {connection.dialect.name}, leaving it")
+    elif failed:
+        # converting would mangle the pickles that are left, the next startup retries
+        logger.error(f"Keeping configs.value as {value_type} until the configs {failed} are repaired")
+    else:
+        logger.info(f"Converting configs.value from {value_type} to TEXT")
+        connection.execute(text(ddl))
+
 @event.listens_for(BaseModel.metadata, "after_create")
 def _conditionally_create_triggers(metadata, connection, **kw):
     if connection.dialect.name == "mysql":
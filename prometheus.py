@@ -13,10 +13,11 @@ import psutil
 from discord.ext.tasks import loop
 from prometheus_client import Gauge
 from sqlalchemy import func
+from sqlalchemy.orm import Session
 
 from customclient import CustomClient  # just needed so we can get a bunch of the stats, and a sessionmaker for the db stats
 from models import Player, Unit, PlayerUpgrade
-from utils import EnvironHelpers
+from utils import EnvironHelpers, uses_async_db, uses_db
 
 logger = getLogger(__name__)
 
@@ -52,6 +53,33 @@ info.labels(commit=commit, ahead=ahead, behind=behind).set(1)
 
 last_alerted_version = None
 
+def _collect_db_stats(session: Session) -> dict:
+    """Query the database statistics the slow loop exports."""
+
+    return {
+        "players": session.query(Player).count(),
+        "rec_points": session.query(func.sum(Player.rec_points)).scalar() or 0,
+        "bonus_pay": session.query(func.sum(Player.bonus_pay)).scalar() or 0,
+        "units": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").count(),
+        "purchased": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").filter(Unit.status != "PROPOSED").count(),
+        "active": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").filter(Unit.status == "ACTIVE").count(),
+        "dead": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").filter(Unit.status.in_(["KIA", "MIA"])).count(),
+        "upgrades": session.query(PlayerUpgrade).filter(PlayerUpgrade.original_price > 0).count(),
+        "units_by_type": session.query(Unit.unit_type, func.count()).filter(Unit.unit_type != "STOCKPILE").group_by(Unit.unit_type).all(),
+        "purchased_by_type": session.query(Unit.unit_type, func.count()).filter(Unit.unit_type != "STOCKPILE", Unit.status != "PROPOSED").group_by(Unit.unit_type).all(),
+        "live_by_type": session.query(Unit.unit_type, func.count()).filter(Unit.unit_type != "STOCKPILE", ~Unit.status.in_(["PROPOSED", "KIA", "MIA"])).group_by(Unit.unit_type).all(),
+        "units_by_type_and_campaign": session.query(Unit.unit_type, Unit.campaign_id, func.count()).filter(Unit.unit_type != "STOCKPILE").group_by(Unit.unit_type, Unit.campaign_id).all()
+    }
+
+# the queries run on the async engine, or the database thread pool without one, not on the event loop
+if CustomClient().async_sessionmaker is not None:
+    @uses_async_db(CustomClient().async_sessionmaker)
+    async def _query_db_stats(session) -> dict:
+        return await session.run_sync(_collect_db_stats)
+else:
+    @uses_db(CustomClient().sessionmaker, offload=True)
+    def _query_db_stats(session: Session) -> dict:
+        return _collect_db_stats(session)
 
 @loop(seconds=60)
 async def poll_metrics_slow():
@@ -74,7 +102,7 @@ async def poll_metrics_slow():
         # Only send alert if we haven't sent one in the last hour
         if last_disk_alert_time is None or (current_time - last_disk_alert_time).total_seconds() > 3600:
             try:
-                user = await bot.fetch_user(DISK_ALERT_USER_ID)
+                user = await bot.get_or_fetch_user(DISK_ALERT_USER_ID)
                 await user.send(f"🚨 **Disk Usage Alert** 🚨\n\nRoot disk usage is at **{usage.percent:.1f}%**\n\n"
                               f"Free space: {usage.free / (1024**3):.1f} GB\n"
                               f"Total space: {usage.total / (1024**3):.1f} GB\n\n"
@@ -84,21 +112,7 @@ async def poll_metrics_slow():
             except Exception as e:
                 print(f"Failed to send disk alert: {e}")
 
-    with bot.sessionmaker() as session:
-        db_stats_dict = {
-                    "players": session.query(Player).count(),
-                    "rec_points": session.query(func.sum(Player.rec_points)).scalar() or 0,
-                    "bonus_pay": session.query(func.sum(Player.bonus_pay)).scalar() or 0,
-                    "units": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").count(),
-                    "purchased": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").filter(Unit.status != "PROPOSED").count(),
-                    "active": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").filter(Unit.status == "ACTIVE").count(),
-                    "dead": session.query(Unit).filter(Unit.unit_type != "STOCKPILE").filter(Unit.status.in_(["KIA", "MIA"])).count(),
-                    "upgrades": session.query(PlayerUpgrade).filter(PlayerUpgrade.original_price > 0).count(),
-                    "units_by_type": session.query(Unit.unit_type, func.count()).filter(Unit.unit_type != "STOCKPILE").group_by(Unit.unit_type).all(),
-                    "purchased_by_type": session.query(Unit.unit_type, func.count()).filter(Unit.unit_type != "STOCKPILE", Unit.status != "PROPOSED").group_by(Unit.unit_type).all(),
-                    "live_by_type": session.query(Unit.unit_type, func.count()).filter(Unit.unit_type != "STOCKPILE", ~Unit.status.in_(["PROPOSED", "KIA", "MIA"])).group_by(Unit.unit_type).all(),
-                    "units_by_type_and_campaign": session.query(Unit.unit_type, Unit.campaign_id, func.count()).filter(Unit.unit_type != "STOCKPILE").group_by(Unit.unit_type, Unit.campaign_id).all()
-                }
+    db_stats_dict = await _query_db_stats()
     player_count.set(db_stats_dict["players"])
     rec_points.set(db_stats_dict["rec_points"])
     bonus_pay.set(db_stats_dict["bonus_pay"])
@@ -140,7 +154,7 @@ async def poll_metrics_slow():
             logger.error(f"Error fetching latest: {stderr.decode().strip()}")
         latest = stdout.decode().strip()
         if latest != last_alerted_version:
-            user = await bot.fetch_user(DISK_ALERT_USER_ID)
+            user = await bot.get_or_fetch_user(DISK_ALERT_USER_ID)
             await user.send(f"🚨 **New Version Available** 🚨\n\nA new version of the bot is available, please update to the latest version.\n\n"
                             f"You are {behind} commits behind the latest version.\n"
                             f"Your commit is {commit}, the latest commit is {latest}.\n"
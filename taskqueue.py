@@ -0,0 +1,911 @@
+"""
+Coalescing task queue used by CustomClient to publish dossier and statistics messages.
+
+Tasks are `QueueTask` records holding the task kind, the model name and id of its target,
+the attempt count and the enqueue time; the worker loads the target fresh from the database.
+The `(type, instance, fail_count)` tuples the rest of the bot enqueues are converted on the
+way in, so no ORM instance is kept alive by the queue. Player tasks (kinds 0 and 1) are keyed
+by player id, so while a task for a player is still pending any further task for that player
+is merged into it instead of being queued again. A pending update is upgraded to a create if
+a create is requested for the same player.
+
+Pending tasks are held back for a short debounce window after they were first enqueued,
+which lets a burst of edits to the same player collapse into a single publish. Players are
+served in the order they were first enqueued, so a busy player cannot starve the others.
+
+Tasks are queued in one of two lanes. The interactive lane holds changes a user is waiting
+on, the bulk lane holds mass refreshes. While both lanes have ready work, workers take
+`interactive_weight` interactive tasks for every bulk task, so a single change publishes
+within seconds even behind thousands of refreshes. A pending bulk task is promoted to the
+interactive lane when an interactive task for the same player is merged into it.
+
+Admission control keeps the pending lanes bounded without losing work. Each lane can have a
+quota of pending tasks, and once the queue reaches its high watermark it sheds load until it
+has drained to its low watermark by deferring new bulk tasks. Deferred tasks wait, in order,
+outside the lanes (and in the journal) and are admitted as soon as their lane has room again.
+Only true duplicates are ever dropped: a task for a key that is already pending or deferred
+is merged into it. Interactive and control tasks are never deferred by the watermarks.
+
+Failed tasks are not put back at the tail of their lane. `schedule` holds them in a retry
+heap until their backoff delay has passed (see `backoff_delay`), and only then are they
+enqueued again, so a failing player never holds up healthy work.
+
+The queue is shared by several publisher workers. A key that has been handed to a worker
+stays checked out until that worker calls `task_done(task)`, so two workers never publish
+the same player at once. `AdaptivePacer` paces the Discord calls the workers make with one
+`RateBudget` token bucket per channel, whose rate follows the rate limit feedback Discord
+sends back (429s, `X-RateLimit-*` headers and request latency). `ThroughputMeter` measures
+how fast tasks are actually completed, for the queue ETA.
+
+When a `QueueJournal` is attached, pending player tasks are also recorded in memory and
+written to the `pending_tasks` table in batches, so they can be replayed after a restart.
+
+`ChangeTracker` feeds the queue from the ORM: it collects the players whose rendered data a
+transaction changed and enqueues one task per player when the transaction commits, so code
+that edits players, units or upgrades does not have to enqueue anything itself.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from logging import getLogger
+from types import SimpleNamespace
+from typing import Any, Hashable
+
+import aiohttp
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import Campaign, Medals, PendingTask, Player, PlayerUpgrade, Unit
+
+logger = getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+merged_tasks = Counter("armcobot_queue_merged_total", "Total number of tasks merged into an already pending task")
+publish_rate = Gauge("armcobot_publish_rate", "Discord calls per second the publisher currently allows itself", labelnames=["channel_id"])
+queue_deferred_tasks = Counter("armcobot_queue_deferred_total", "Total number of tasks deferred by admission control", labelnames=["lane", "reason"])
+queue_deferred_size = Gauge("armcobot_queue_deferred_size", "The number of tasks deferred by admission control, waiting for room in their lane")
+queue_shedding = Gauge("armcobot_queue_shedding", "Whether the queue is above its high watermark and deferring bulk work")
+queue_delayed_size = Gauge("armcobot_queue_delayed", "The number of failed tasks waiting in the retry heap")
+queue_lane_size = Gauge("armcobot_queue_lane_size", "The number of pending tasks in each queue lane", labelnames=["lane"])
+queue_wait_time = Histogram("armcobot_queue_wait_seconds", "Seconds a task was queued before a worker took it", labelnames=["lane"],
+                            buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600))
+publish_ratelimited = Counter("armcobot_publish_ratelimited_total", "Total number of 429 responses to publisher calls", labelnames=["channel_id"])
+
+class QueueTask:
+    """
+    A queued publish task.
+
+    Attributes:
+        kind: 0 create, 1 update, 2 delete, 4 terminate, 5 keep-alive.
+        model: Class name of the target, "Player" for creates and updates, None for control tasks.
+        id: Primary key of the target, None for control tasks.
+        attempts: How many times the task has failed so far.
+        enqueued_at: Unix time the task was first enqueued.
+    """
+
+    __slots__ = ("kind", "model", "id", "attempts", "enqueued_at")
+
+    def __init__(self, kind: int, model: str | None = None, id: int | None = None, attempts: int = 0, enqueued_at: float | None = None):
+        self.kind = kind
+        self.model = model
+        self.id = id
+        self.attempts = attempts
+        self.enqueued_at = time.time() if enqueued_at is None else enqueued_at
+
+    @classmethod
+    def for_player(cls, kind: int, player_id: int, attempts: int = 0) -> "QueueTask":
+        return cls(kind, "Player", player_id, attempts)
+
+    @classmethod
+    def from_tuple(cls, task: tuple) -> "QueueTask":
+        """
+        Convert a legacy `(type, instance, fail_count)` tuple, keeping only the instance's
+        class name and id. Creates and updates always target the player.
+        """
+
+        if len(task) < 2 or task[1] is None:
+            return cls(task[0])
+        model = "Player" if task[0] in (0, 1) else type(task[1]).__name__
+        return cls(task[0], model, getattr(task[1], "id", None), task[2] if len(task) > 2 else 0)
+
+    @property
+    def player_id(self) -> int | None:
+        return self.id if self.model == "Player" else None
+
+    @property
+    def key(self) -> Hashable | None:
+        """
+        The coalescing key, or None if the task must never be merged.
+
+        Creation and update tasks (0, 1) are keyed by the player id, deletion tasks (2) by
+        the model and id. Control tasks (4, 5) and tasks without an id have no key.
+        """
+
+        if self.id is None or self.kind not in (0, 1, 2):
+            return None
+        return (self.model, self.id)
+
+    def retry(self) -> "QueueTask":
+        """Return a copy of this task with one more failed attempt."""
+
+        return QueueTask(self.kind, self.model, self.id, self.attempts + 1, self.enqueued_at)
+
+    def __repr__(self) -> str:
+        return f"QueueTask(kind={self.kind}, model={self.model}, id={self.id}, attempts={self.attempts})"
+
+def merge_tasks(pending: QueueTask, new: QueueTask) -> QueueTask:
+    """
+    Merge a newly enqueued task into a pending task with the same key.
+
+    A create (0) beats an update (1), the earliest enqueue time is kept, and so is the
+    lower attempt count, since a fresh request for the player is new work rather than a retry.
+    """
+
+    kind = min(pending.kind, new.kind) if pending.kind in (0, 1) and new.kind in (0, 1) else pending.kind
+    return QueueTask(kind, pending.model, pending.id, min(pending.attempts, new.attempts), min(pending.enqueued_at, new.enqueued_at))
+
+def backoff_delay(attempts: int, base: float = 5.0, cap: float = 600.0) -> float:
+    """
+    Return the delay before retrying a task that has failed `attempts` times: exponential
+    in the attempt count and capped, with "equal jitter" (a random value between half and
+    all of the delay) so tasks that failed together don't retry together.
+    """
+
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class _Entry:
+    """A pending task, the monotonic time it was enqueued and the time it becomes eligible for dequeue."""
+
+    __slots__ = ("task", "enqueued_at", "ready_at")
+
+    def __init__(self, task: QueueTask, enqueued_at: float, ready_at: float):
+        self.task = task
+        self.enqueued_at = enqueued_at
+        self.ready_at = ready_at
+
+class CoalescingQueue:
+    """
+    An asyncio queue that deduplicates pending tasks per key within a debounce window.
+
+    Exposes the subset of the `asyncio.Queue` API the bot uses (`put`, `put_nowait`, `get`,
+    `get_nowait`, `qsize`, `empty`, `task_done`, `join`), plus `clear` and the `merged` count.
+    `put`, `put_nowait` and `qsize` take an optional lane.
+    """
+
+    def __init__(self, debounce: float = 0.0, interactive_weight: int = 4, high_watermark: int = 0, low_watermark: int = 0,
+                 quotas: dict[str, int] | None = None):
+        """
+        Args:
+            debounce: Seconds a task is held after it was first enqueued, so later tasks
+                for the same key can be merged into it. 0 disables the hold.
+            interactive_weight: Interactive tasks handed out for every bulk task while
+                both lanes have ready work.
+            high_watermark: Pending tasks at which the queue starts deferring bulk work.
+                0 disables the watermarks.
+            low_watermark: Pending tasks at which the queue stops deferring. Defaults to
+                three quarters of the high watermark.
+            quotas: Maximum pending tasks per lane, tasks over quota are deferred. Lanes
+                without a quota, or with a quota of 0, are unbounded.
+        """
+
+        if debounce < 0:
+            raise ValueError("Debounce must be greater than or equal to 0")
+        if interactive_weight < 1:
+            raise ValueError("Interactive weight must be at least 1")
+        if high_watermark < 0 or low_watermark < 0:
+            raise ValueError("Watermarks must be greater than or equal to 0")
+        if high_watermark and low_watermark >= high_watermark:
+            raise ValueError("Low watermark must be below the high watermark")
+        self.debounce = debounce
+        self.interactive_weight = interactive_weight
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark or high_watermark * 3 // 4
+        self.quotas = {lane: (quotas or {}).get(lane, 0) for lane in LANES}
+        self.shedding = False
+        self.merged = 0
+        self.promoted = 0
+        self.deferrals = 0
+        self._lanes: dict[str, OrderedDict[Hashable, _Entry]] = {lane: OrderedDict() for lane in LANES}
+        self._lane_of: dict[Hashable, str] = {} # pending key -> lane
+        self._inflight: dict[Hashable, str] = {} # checked out key -> lane it was taken from
+        self._interactive_streak = 0
+        self._delayed: list[tuple[float, int, QueueTask, str]] = [] # heap of (ready_at, sequence, task, lane)
+        self._delayed_keys: dict[Hashable, int] = {} # key -> number of its tasks in the retry heap
+        self._deferred: dict[str, OrderedDict[Hashable, QueueTask]] = {lane: OrderedDict() for lane in LANES}
+        self._deferred_lane_of: dict[Hashable, str] = {} # deferred key -> lane it waits to be admitted to
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self.journal: QueueJournal | None = None
+
+    def put_nowait(self, task: QueueTask | tuple, lane: str | None = None) -> bool:
+        """
+        Enqueue a task, merging it into a pending task for the same key if there is one.
+
+        Args:
+            task: The task, legacy tuples are converted to a QueueTask.
+            lane: `INTERACTIVE` or `BULK`. Defaults to the lane of the key's checked out
+                task, so retries and follow-ups stay in their lane, and to `INTERACTIVE`
+                for everything else.
+
+        Returns:
+            True if the task is pending, False if admission control deferred it. A deferred
+            task is not lost: it still counts as unfinished and is admitted, in order, once
+            its lane has room again.
+        """
+
+        if isinstance(task, tuple):
+            task = QueueTask.from_tuple(task)
+        key = task.key
+        if lane is None:
+            lane = self._inflight.get(key, INTERACTIVE) if key is not None else INTERACTIVE
+        elif lane not in self._lanes:
+            raise ValueError(f"Unknown queue lane: {lane}")
+        if key is not None and key in self._lane_of:
+            current = self._lane_of[key]
+            entry = self._lanes[current][key]
+            entry.task = merge_tasks(entry.task, task)
+            self.merged += 1
+            merged_tasks.inc()
+            logger.debug(f"Merged task for {key} into pending task, {self.merged} merged so far")
+            if lane == INTERACTIVE and current == BULK:
+                del self._lanes[BULK][key]
+                self._lanes[INTERACTIVE][key] = entry
+                self._lane_of[key] = INTERACTIVE
+                self.promoted += 1
+                self._wakeup.set()
+            self._journal_record(entry.task)
+            return True
+        if key is not None and key in self._deferred_lane_of:
+            return self._merge_deferred(key, task, lane)
+        if key is not None: # control tasks are always admitted
+            reason = self._refusal(lane)
+            if reason is not None:
+                self._defer(key, task, lane, reason)
+                return False
+        self._unfinished += 1
+        self._finished.clear()
+        self._admit(key, task, lane)
+        return True
+
+    def _admit(self, key: Hashable | None, task: QueueTask, lane: str) -> None:
+        """Add an unfinished task to the end of its lane."""
+
+        now = time.monotonic()
+        if key is None:
+            key = object() # unique key, so this task never coalesces
+            ready_at = now
+        else:
+            ready_at = now + self.debounce
+        self._lanes[lane][key] = _Entry(task, now, ready_at)
+        self._lane_of[key] = lane
+        self._wakeup.set()
+        self._journal_record(task)
+
+    def _refusal(self, lane: str) -> str | None:
+        """Why a new task for the lane can't be admitted right now, or None if it can."""
+
+        if self.quotas[lane] and len(self._lanes[lane]) >= self.quotas[lane]:
+            return "quota"
+        self._update_shedding()
+        if self.shedding and lane == BULK:
+            return "watermark"
+        return None
+
+    def _defer(self, key: Hashable, task: QueueTask, lane: str, reason: str) -> None:
+        self._deferred[lane][key] = task
+        self._deferred_lane_of[key] = lane
+        self._unfinished += 1
+        self._finished.clear()
+        self._journal_record(task)
+        self.deferrals += 1
+        queue_deferred_tasks.labels(lane, reason).inc()
+
+    def _merge_deferred(self, key: Hashable, task: QueueTask, lane: str) -> bool:
+        current = self._deferred_lane_of[key]
+        merged = merge_tasks(self._deferred[current][key], task)
+        self.merged += 1
+        merged_tasks.inc()
+        if lane == INTERACTIVE and current == BULK:
+            del self._deferred[BULK][key]
+            self._deferred[INTERACTIVE][key] = merged
+            self._deferred_lane_of[key] = INTERACTIVE
+            self.promoted += 1
+            self._journal_record(merged)
+            self._drain_deferred()
+        else:
+            self._deferred[current][key] = merged
+            self._journal_record(merged)
+        return key in self._lane_of
+
+    def _drain_deferred(self) -> None:
+        """Admit deferred tasks, oldest first, while their lane has room."""
+
+        for lane in LANES:
+            deferred = self._deferred[lane]
+            while deferred and self._refusal(lane) is None:
+                key, task = deferred.popitem(last=False)
+                del self._deferred_lane_of[key]
+                self._admit(key, task, lane)
+
+    @property
+    def deferred(self) -> int:
+        """The number of tasks deferred by admission control."""
+
+        return len(self._deferred_lane_of)
+
+    def _update_shedding(self) -> None:
+        if not self.high_watermark:
+            return
+        size = len(self._lane_of)
+        if not self.shedding and size >= self.high_watermark:
+            self.shedding = True
+            queue_shedding.set(1)
+            logger.warning(f"Queue size {size} reached the high watermark of {self.high_watermark}, deferring bulk work until it is below {self.low_watermark}")
+        elif self.shedding and size <= self.low_watermark:
+            self.shedding = False
+            queue_shedding.set(0)
+            logger.info(f"Queue size {size} is below the low watermark of {self.low_watermark}, admitting {len(self._deferred[BULK])} deferred bulk tasks")
+
+    def _journal_record(self, task: QueueTask) -> None:
+        if self.journal is not None and task.player_id is not None:
+            self.journal.record(task.player_id, task.kind, task.attempts, task.enqueued_at)
+
+    async def put(self, task: QueueTask | tuple, lane: str | None = None) -> bool:
+        """Enqueue a task. Never blocks, tasks over the limits are deferred instead."""
+
+        return self.put_nowait(task, lane)
+
+    def schedule(self, task: QueueTask | tuple, delay: float, lane: str | None = None) -> None:
+        """
+        Hold a task in the retry heap and enqueue it once `delay` seconds have passed.
+        The task counts as unfinished meanwhile, but not towards `qsize`.
+
+        Args:
+            task: The task, legacy tuples are converted to a QueueTask.
+            delay: Seconds to wait before the task is enqueued.
+            lane: The lane to enqueue it in, defaults as for `put_nowait`.
+        """
+
+        if isinstance(task, tuple):
+            task = QueueTask.from_tuple(task)
+        key = task.key
+        if lane is None:
+            lane = self._inflight.get(key, INTERACTIVE) if key is not None else INTERACTIVE
+        elif lane not in self._lanes:
+            raise ValueError(f"Unknown queue lane: {lane}")
+        heapq.heappush(self._delayed, (time.monotonic() + max(0.0, delay), next(self._sequence), task, lane))
+        if key is not None:
+            self._delayed_keys[key] = self._delayed_keys.get(key, 0) + 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup.set()
+        self._journal_record(task)
+
+    @property
+    def delayed(self) -> int:
+        """The number of tasks waiting in the retry heap."""
+
+        return len(self._delayed)
+
+    def _release_delayed(self, now: float) -> None:
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, task, lane = heapq.heappop(self._delayed)
+            key = task.key
+            if key is not None:
+                self._delayed_keys[key] -= 1
+                if not self._delayed_keys[key]:
+                    del self._delayed_keys[key]
+            self._unfinished -= 1 # put_nowait counts it again, unless it's merged
+            self.put_nowait(task, lane)
+            if self._unfinished == 0:
+                self._finished.set()
+
+    def _ready_key(self, lane: str, now: float) -> Hashable | None:
+        for key, entry in self._lanes[lane].items():
+            if key in self._inflight:
+                continue # another worker is publishing this key, leave it pending
+            if entry.ready_at > now:
+                return None # entries are in enqueue order, nothing after this one is ready either
+            return key
+        return None
+
+    def _pop_ready(self) -> QueueTask | None:
+        now = time.monotonic()
+        self._release_delayed(now)
+        interactive = self._ready_key(INTERACTIVE, now)
+        bulk = self._ready_key(BULK, now)
+        if interactive is not None and (bulk is None or self._interactive_streak < self.interactive_weight):
+            lane, key = INTERACTIVE, interactive
+            self._interactive_streak += 1
+        elif bulk is not None:
+            lane, key = BULK, bulk
+            self._interactive_streak = 0
+        else:
+            return None
+        entry = self._lanes[lane].pop(key)
+        del self._lane_of[key]
+        if isinstance(key, tuple): # control tasks have a unique object() key and are never checked out
+            self._inflight[key] = lane
+        queue_wait_time.labels(lane).observe(now - entry.enqueued_at)
+        if self.shedding:
+            self._update_shedding()
+        if self._deferred_lane_of:
+            self._drain_deferred()
+        return entry.task
+
+    def _next_ready_at(self) -> float | None:
+        ready_at = self._delayed[0][0] if self._delayed else None
+        for pending in self._lanes.values():
+            for key, entry in pending.items():
+                if key not in self._inflight:
+                    if ready_at is None or entry.ready_at < ready_at:
+                        ready_at = entry.ready_at
+                    break
+        return ready_at
+
+    def get_nowait(self) -> QueueTask:
+        """
+        Remove and return the oldest ready task that is not checked out by another worker,
+        taking it from the lane whose turn it is.
+
+        Raises:
+            asyncio.QueueEmpty: If there is no task ready to be processed.
+        """
+
+        task = self._pop_ready()
+        if task is None:
+            raise asyncio.QueueEmpty
+        return task
+
+    async def get(self) -> QueueTask:
+        """Wait for a task to become ready, then remove, check out and return it."""
+
+        while True:
+            task = self._pop_ready()
+            if task is not None:
+                return task
+            # clearing and waiting with no await in between means a put can't be missed
+            self._wakeup.clear()
+            ready_at = self._next_ready_at()
+            timeout = None if ready_at is None else max(0.0, ready_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def clear(self) -> int:
+        """Drop every pending task, including deferred ones and those waiting to be retried, and return how many were dropped."""
+
+        tasks = [entry.task for pending in self._lanes.values() for entry in pending.values()]
+        tasks += [task for deferred in self._deferred.values() for task in deferred.values()]
+        tasks += [task for _, _, task, _ in self._delayed]
+        for task in tasks:
+            if self.journal is not None and task.player_id is not None:
+                self.journal.discard(task.player_id)
+        self._unfinished = max(0, self._unfinished - len(tasks))
+        for pending in (*self._lanes.values(), *self._deferred.values()):
+            pending.clear()
+        self._lane_of.clear()
+        self._deferred_lane_of.clear()
+        self._delayed.clear()
+        self._delayed_keys.clear()
+        if self._unfinished == 0:
+            self._finished.set()
+        if self.shedding:
+            self._update_shedding()
+        return len(tasks)
+
+    def task_done(self, task: QueueTask | None = None) -> None:
+        """
+        Mark a task returned by get as processed, and check its key back in so the next
+        task for the same key can be handed out.
+        """
+
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if task is not None:
+            key = task.key
+            if key in self._inflight:
+                del self._inflight[key]
+                self._wakeup.set()
+            # a task requeued or scheduled for the same player while this one ran keeps its journal row
+            if self.journal is not None and key is not None and key[0] == "Player" and key not in self._lane_of and key not in self._deferred_lane_of and key not in self._delayed_keys:
+                self.journal.discard(key[1])
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        """Wait until every enqueued task has been processed."""
+
+        await self._finished.wait()
+
+    def qsize(self, lane: str | None = None) -> int:
+        """Return the number of pending tasks, in one lane or in all of them. Deferred tasks are counted by `deferred`."""
+
+        if lane is None:
+            return len(self._lane_of)
+        return len(self._lanes[lane])
+
+    def empty(self) -> bool:
+        return not self._lane_of
+
+    def __len__(self) -> int:
+        return len(self._lane_of)
+
+class QueueJournal:
+    """
+    Write-behind journal of the pending player tasks in a CoalescingQueue.
+
+    Recording a change is a dict assignment, so enqueueing stays cheap; `flush` writes
+    everything recorded since the previous flush to the `pending_tasks` table in a few
+    batched statements, and `replay` re-enqueues the persisted tasks on startup.
+    """
+
+    def __init__(self):
+        self._changes: dict[int, tuple[int, int, datetime] | None] = {} # player id -> row to write, None to delete
+
+    def record(self, player_id: int, task_type: int, attempts: int, enqueued_at: float) -> None:
+        """Record that a task for the player is pending."""
+
+        self._changes[player_id] = (task_type, attempts, datetime.fromtimestamp(enqueued_at))
+
+    def discard(self, player_id: int) -> None:
+        """Record that the player no longer has a pending task."""
+
+        self._changes[player_id] = None
+
+    def __len__(self) -> int:
+        return len(self._changes)
+
+    def flush(self, session: Session) -> int:
+        """
+        Write the recorded changes and commit. On failure the changes are kept for the
+        next flush, unless a newer change for the same player was recorded meanwhile.
+
+        Returns:
+            The number of players whose row was written or deleted.
+        """
+
+        changes, self._changes = self._changes, {}
+        if not changes:
+            return 0
+        try:
+            removed = [player_id for player_id, row in changes.items() if row is None]
+            if removed:
+                session.execute(delete(PendingTask).where(PendingTask.player_id.in_(removed)))
+            rows = {player_id: row for player_id, row in changes.items() if row is not None}
+            if rows:
+                # players deleted since their task was queued would violate the foreign key
+                existing = set(session.scalars(select(Player.id).where(Player.id.in_(rows))))
+                persisted = set(session.scalars(select(PendingTask.player_id).where(PendingTask.player_id.in_(rows))))
+                values = [{"player_id": player_id, "task_type": task_type, "attempts": attempts, "enqueued_at": enqueued_at}
+                          for player_id, (task_type, attempts, enqueued_at) in rows.items() if player_id in existing]
+                inserts = [value for value in values if value["player_id"] not in persisted]
+                updates = [value for value in values if value["player_id"] in persisted]
+                if inserts:
+                    session.execute(insert(PendingTask), inserts)
+                if updates:
+                    session.execute(update(PendingTask), updates)
+            session.commit()
+        except Exception:
+            session.rollback()
+            for player_id, row in changes.items():
+                self._changes.setdefault(player_id, row)
+            raise
+        logger.debug(f"Flushed {len(changes)} queue journal changes")
+        return len(changes)
+
+    def replay(self, session: Session, queue: "CoalescingQueue") -> int:
+        """
+        Enqueue every persisted task in its original order, in the bulk lane.
+
+        Returns:
+            The number of tasks enqueued.
+        """
+
+        # tasks of players deleted in the meantime are skipped by the worker that takes them
+        replayed = 0
+        for row in session.query(PendingTask).order_by(PendingTask.enqueued_at):
+            queue.put_nowait(QueueTask(row.task_type, "Player", row.player_id, row.attempts, row.enqueued_at.timestamp()), BULK)
+            self._changes.pop(row.player_id, None) # the row is already persisted as is
+            replayed += 1
+        logger.info(f"Replayed {replayed} persisted queue tasks")
+        return replayed
+
+def _attribute_values(obj: Any, attribute: str) -> set:
+    """The current and, if it changed in this flush, the previous value of an attribute."""
+
+    history = inspect(obj).attrs[attribute].history
+    return {value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None}
+
+class ChangeTracker:
+    """
+    Marks players dirty from ORM flushes and publishes them when the transaction commits.
+
+    `after_flush` collects the ids of the players whose rendered data changed: the player
+    itself, its units, their upgrades and its medals, and renaming a campaign marks the owners
+    of its units. Moving a unit or an upgrade marks both the old and the new owner. The ids are
+    kept in `session.info` until `after_commit`, which enqueues one task per player no matter
+    how many rows of it changed; a rollback discards them. A transaction touching more than
+    `bulk_threshold` players is a mass edit and goes to the bulk lane.
+
+    The queue belongs to the event loop the tracker was installed on. Commits on any other
+    thread, such as the database thread pool, hand their players to it with
+    `call_soon_threadsafe`.
+
+    Sessions with `session.info[ChangeTracker.SUPPRESS]` set are not tracked, which keeps the
+    publisher's own writes (message ids and content hashes) from enqueueing more work.
+    """
+
+    SUPPRESS = "suppress_publish"
+    _DIRTY = "dirty_players"
+
+    def __init__(self, queue: "CoalescingQueue", bulk_threshold: int = 25, loop: asyncio.AbstractEventLoop | None = None):
+        self.queue = queue
+        self.bulk_threshold = bulk_threshold
+        self._loop = loop
+
+    def install(self, target: Any) -> None:
+        """
+        Listen for the session events of a sessionmaker, Session class or session. Must be
+        called on the thread of the event loop that consumes the queue, unless the loop was
+        passed to the constructor.
+        """
+
+        if self._loop is None:
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._loop = asyncio.get_event_loop_policy().get_event_loop() # not started yet
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "after_commit", self._after_commit)
+        event.listen(target, "after_rollback", self._after_rollback)
+
+    def _after_flush(self, session: Session, flush_context: Any) -> None:
+        if session.info.get(self.SUPPRESS):
+            return
+        dirty: dict[int, int] = session.info.setdefault(self._DIRTY, {}) # player id -> task kind
+        deleted_players = set()
+        unit_ids = set()
+        campaign_ids = set()
+
+        def mark(player_id: int, kind: int = 1) -> None:
+            dirty[player_id] = min(kind, dirty.get(player_id, kind))
+
+        for obj in itertools.chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, Player):
+                if obj in session.deleted:
+                    deleted_players.add(obj.id)
+                elif obj in session.new:
+                    mark(obj.id, 0)
+                elif session.is_modified(obj, include_collections=False):
+                    mark(obj.id)
+            elif isinstance(obj, (Unit, Medals)):
+                for player_id in _attribute_values(obj, "player_id"):
+                    mark(player_id)
+                for player in _attribute_values(obj, "player"):
+                    mark(player.id)
+            elif isinstance(obj, PlayerUpgrade):
+                unit_ids |= _attribute_values(obj, "unit_id")
+                unit_ids |= {unit.id for unit in _attribute_values(obj, "unit") if unit.id is not None}
+            elif isinstance(obj, Campaign) and obj in session.dirty and inspect(obj).attrs["name"].history.has_changes():
+                campaign_ids.add(obj.id) # the campaign name is rendered with its units
+        if unit_ids:
+            for player_id in session.scalars(select(Unit.player_id).where(Unit.id.in_(unit_ids))):
+                mark(player_id)
+        if campaign_ids:
+            for player_id in session.scalars(select(Unit.player_id).where(Unit.campaign_id.in_(campaign_ids)).distinct()):
+                mark(player_id)
+        for player_id in deleted_players:
+            dirty.pop(player_id, None) # deleting a player is published by its own delete tasks
+
+    def _after_commit(self, session: Session) -> None:
+        dirty = session.info.pop(self._DIRTY, None)
+        if not dirty:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop or self._loop is None or self._loop.is_closed():
+            self._enqueue(dirty)
+        else:
+            # committed off the event loop, on a database worker thread, the queue belongs to the loop
+            self._loop.call_soon_threadsafe(self._enqueue, dirty)
+
+    def _enqueue(self, dirty: dict[int, int]) -> None:
+        lane = BULK if len(dirty) > self.bulk_threshold else INTERACTIVE
+        for player_id, kind in dirty.items():
+            self.queue.put_nowait(QueueTask.for_player(kind, player_id), lane)
+        logger.debug(f"Marked {len(dirty)} players dirty in the {lane} lane")
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop(self._DIRTY, None)
+
+class RateBudget:
+    """
+    A token bucket shared by the publisher workers. Tokens refill at `rate` per second
+    up to `burst`, and `acquire` waits until enough tokens are available. Waiters are
+    served in order.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        if rate <= 0: raise ValueError("Rate must be greater than 0")
+        if burst < 1: raise ValueError("Burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Withhold tokens so the next single-token acquire waits at least `seconds`."""
+
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until `tokens` tokens are available and take them."""
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class AdaptivePacer:
+    """
+    Paces publisher calls per Discord channel with an AIMD controller.
+
+    Every channel gets its own `RateBudget`. Successful calls with rate limit headroom
+    raise the channel's rate additively, 429s and slow calls (discord.py sleeping on an
+    exhausted bucket shows up as latency) cut it multiplicatively, and an exhausted
+    bucket or a 429 pauses the channel until Discord says it resets.
+
+    The feedback comes from the aiohttp `TraceConfig` returned by `trace_config`, which
+    has to be passed to the bot as `http_trace`.
+    """
+
+    _channel_pattern = re.compile(r"/channels/(\d+)/messages")
+
+    def __init__(self, rate: float, burst: float = 1.0, min_rate: float = 0.1, max_rate: float = 5.0,
+                 increase: float = 0.05, decrease: float = 0.5, slow_latency: float = 2.0):
+        """
+        Args:
+            rate: Initial calls per second for a channel.
+            burst: Bucket size for each channel.
+            min_rate: Lower bound for a channel's rate.
+            max_rate: Upper bound for a channel's rate.
+            increase: Calls per second added after each call with headroom.
+            decrease: Factor a channel's rate is multiplied by on a 429 or slow call.
+            slow_latency: Seconds after which a call counts as slowed down by Discord.
+        """
+
+        if not 0 < min_rate <= rate <= max_rate:
+            raise ValueError("Rates must satisfy 0 < min_rate <= rate <= max_rate")
+        if not 0 < decrease < 1:
+            raise ValueError("Decrease must be between 0 and 1")
+        self.initial_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_latency = slow_latency
+        self._budgets: dict[int, RateBudget] = {}
+
+    def _budget(self, channel_id: int) -> RateBudget:
+        if channel_id not in self._budgets:
+            self._budgets[channel_id] = RateBudget(self.initial_rate, self.burst)
+            publish_rate.labels(channel_id=str(channel_id)).set(self.initial_rate)
+        return self._budgets[channel_id]
+
+    async def acquire(self, channel_id: int) -> None:
+        """Wait for the channel's budget to allow another call."""
+
+        await self._budget(channel_id).acquire()
+
+    @property
+    def rate(self) -> float:
+        """Combined rate of all channels, or the initial rate if no channel has been used yet."""
+
+        return sum(budget.rate for budget in self._budgets.values()) or self.initial_rate
+
+    def observe(self, channel_id: int, status: int, remaining: int | None, reset_after: float | None, latency: float) -> None:
+        """
+        Feed the outcome of a call into the channel's controller. Channels the publisher
+        has never acquired are ignored, so unrelated bot traffic doesn't create budgets.
+        """
+
+        budget = self._budgets.get(channel_id)
+        if budget is None:
+            return
+        if status == 429:
+            publish_ratelimited.labels(channel_id=str(channel_id)).inc()
+            budget.rate = max(self.min_rate, budget.rate * self.decrease)
+            budget.pause(reset_after if reset_after is not None else 1 / budget.rate)
+            logger.warning(f"Publisher hit a 429 in channel {channel_id}, rate lowered to {budget.rate:.2f}/s")
+        elif latency >= self.slow_latency:
+            budget.rate = max(self.min_rate, budget.rate * self.decrease)
+            logger.debug(f"Slow call ({latency:.2f}s) in channel {channel_id}, rate lowered to {budget.rate:.2f}/s")
+        elif remaining == 0:
+            if reset_after:
+                budget.pause(reset_after)
+        elif 200 <= status < 300:
+            budget.rate = min(self.max_rate, budget.rate + self.increase)
+        publish_rate.labels(channel_id=str(channel_id)).set(budget.rate)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Build an aiohttp TraceConfig that feeds message endpoint responses into `observe`."""
+
+        async def on_request_start(session, ctx: SimpleNamespace, params: aiohttp.TraceRequestStartParams):
+            ctx.start = time.monotonic()
+
+        async def on_request_end(session, ctx: SimpleNamespace, params: aiohttp.TraceRequestEndParams):
+            match = self._channel_pattern.search(params.url.path)
+            if not match:
+                return
+            headers = params.response.headers
+            try:
+                remaining = int(headers["X-RateLimit-Remaining"]) if "X-RateLimit-Remaining" in headers else None
+                reset_after = float(headers.get("X-RateLimit-Reset-After") or headers.get("Retry-After") or 0) or None
+            except ValueError:
+                remaining, reset_after = None, None
+            self.observe(int(match.group(1)), params.response.status, remaining, reset_after, time.monotonic() - getattr(ctx, "start", time.monotonic()))
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+class ThroughputMeter:
+    """
+    Exponentially weighted moving average of completed tasks per second.
+
+    `record` is called for every completed task and `sample` periodically, each sample
+    folding the completions since the previous one into the average.
+    """
+
+    def __init__(self, alpha: float = 0.3):
+        if not 0 < alpha <= 1: raise ValueError("Alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.rate = 0.0
+        self._count = 0
+        self._sampled_at = time.monotonic()
+
+    def record(self, count: int = 1) -> None:
+        self._count += count
+
+    def sample(self) -> float:
+        """Fold the completions since the last sample into the average and return it."""
+
+        now = time.monotonic()
+        elapsed = now - self._sampled_at
+        if elapsed <= 0:
+            return self.rate
+        self.rate = self.alpha * (self._count / elapsed) + (1 - self.alpha) * self.rate
+        self._count = 0
+        self._sampled_at = now
+        return self.rate
@@ -221,6 +221,10 @@ debug_query_error = "Error: {e}"
 debug_command_ban_status = "Command ban is {status}"
 debug_command_ban_toggle = "Command ban {action}"
 debug_log_level = "Log level set to {level}"
+debug_dead_letters_empty = "No dead letters"
+debug_dead_letter = "`{letter.id}` type {letter.task_type} for {letter.model} {letter.target_id}, {letter.attempts} attempts, failed <t:{failed_at}:R>: {letter.error}"
+debug_dead_letters_replayed = "Replayed {count} dead letters"
+debug_dead_letters_purged = "Purged {count} dead letters"
 
 # Ping related messages
 ping_recent_user = "You've already pinged me recently, wait a bit before pinging again"
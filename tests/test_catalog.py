@@ -0,0 +1,91 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from catalog import CatalogCache
+from models import BaseModel, Player, ShopUpgrade, ShopUpgradeUnitTypes, UnitType, UpgradeType
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add_all([UnitType(unit_type="INF"), UpgradeType(name="Weapon")])
+        session.flush()
+        session.add(ShopUpgrade(name="Rifle", type="Weapon", cost=2))
+        session.commit()
+    yield Session
+    engine.dispose()
+
+@pytest.fixture
+def cache(Session):
+    cache = CatalogCache(Session)
+    cache.install(Session)
+    return cache
+
+def test_snapshot_is_reused_while_fresh(cache):
+    catalog = cache.get()
+    assert [upgrade.name for upgrade in catalog.upgrades.values()] == ["Rifle"]
+    assert cache.get() is catalog
+
+def test_committed_catalog_edit_rebuilds_the_snapshot(Session, cache):
+    catalog = cache.get()
+    with Session() as session:
+        upgrade = session.get(ShopUpgrade, 1)
+        upgrade.cost = 5
+        session.add(ShopUpgradeUnitTypes(shop_upgrade_id=upgrade.id, unit_type="INF"))
+        session.commit()
+    rebuilt = cache.get()
+    assert rebuilt is not catalog
+    assert rebuilt.generation > catalog.generation
+    assert rebuilt.upgrades[1].cost == 5
+    assert [upgrade.id for upgrade in rebuilt.upgrades_by_unit_type["INF"]] == [1]
+    assert rebuilt.unit_types_by_upgrade[1] == {"INF"}
+
+def test_rolled_back_catalog_edit_keeps_the_snapshot(Session, cache):
+    catalog = cache.get()
+    with Session() as session:
+        session.get(ShopUpgrade, 1).cost = 5
+        session.flush()
+        session.rollback()
+        session.commit() # the flag from the rolled back flush must not leak into the next commit
+    assert cache.get() is catalog
+
+def test_other_edits_keep_the_snapshot(Session, cache):
+    catalog = cache.get()
+    with Session() as session:
+        session.add(Player(discord_id=1, name="player"))
+        session.commit()
+    assert cache.get() is catalog
+
+def test_invalidate_forces_a_rebuild(Session, cache):
+    catalog = cache.get()
+    with Session() as session:
+        session.get(ShopUpgrade, 1).name = "Carbine"
+        session.commit()
+    cache.invalidate()
+    rebuilt = cache.get()
+    assert rebuilt.generation == cache._generation
+    assert list(rebuilt.upgrades_by_name) == ["Carbine"]
+    assert catalog.upgrades[1].name == "Rifle" # old snapshots are never mutated
+
+def test_bulk_statements_are_not_seen_without_invalidate(Session, cache):
+    catalog = cache.get()
+    with Session() as session:
+        session.query(ShopUpgrade).update({ShopUpgrade.cost: 9})
+        session.commit()
+    assert cache.get() is catalog
+    cache.invalidate()
+    assert cache.get().upgrades[1].cost == 9
+
+def test_ttl_expires_the_snapshot(Session):
+    cache = CatalogCache(Session, ttl=0.05)
+    catalog = cache.get()
+    assert cache.get() is catalog
+    time.sleep(0.06)
+    rebuilt = cache.get()
+    assert rebuilt is not catalog
+    assert rebuilt.generation == catalog.generation
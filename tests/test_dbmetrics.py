@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+import dbmetrics
+from dbmetrics import normalize_sql
+
+@pytest.mark.parametrize("statement, shape", [
+    ("SELECT *\n  FROM  players\tWHERE id = 5", "SELECT * FROM players WHERE id = ?"),
+    ("SELECT * FROM players WHERE name = 'O''Brien' AND rp > 2.5", "SELECT * FROM players WHERE name = ? AND rp > ?"),
+    ("SELECT * FROM units WHERE id IN (?, ?, ?)", "SELECT * FROM units WHERE id IN (?, ...)"),
+    ("SELECT * FROM units WHERE id IN (%s,%s)", "SELECT * FROM units WHERE id IN (?, ...)"),
+    ("SELECT * FROM units WHERE id IN (:id_1, :id_2, :id_3)", "SELECT * FROM units WHERE id IN (?, ...)"),
+    ("SELECT * FROM units WHERE id IN (1, 2, 3, 4)", "SELECT * FROM units WHERE id IN (?, ...)"),
+    ("SELECT * FROM units WHERE id IN (?)", "SELECT * FROM units WHERE id IN (?)"),
+])
+def test_normalize_sql(statement, shape):
+    assert normalize_sql(statement) == shape
+
+def test_normalize_sql_keeps_identifiers_with_digits():
+    assert normalize_sql("SELECT free_upgrade_1 FROM unit_types") == "SELECT free_upgrade_1 FROM unit_types"
+
+def test_in_lists_of_any_length_share_a_shape():
+    assert normalize_sql("id IN (?, ?)") == normalize_sql("id IN (?, ?, ?, ?, ?)")
+
+def test_scope_counts_statements_and_rows():
+    engine = create_engine("sqlite://")
+    dbmetrics.install(engine)
+    with engine.connect() as connection:
+        with dbmetrics.scope("test") as stats:
+            connection.execute(text("SELECT 1")).all()
+            connection.execute(text("SELECT 2")).all()
+        connection.execute(text("SELECT 3")).all()
+    engine.dispose()
+    assert stats.statements == 2
+    assert stats.seconds > 0
+
+def repeat_engine(raise_on_repeat: bool):
+    engine = create_engine("sqlite://")
+    dbmetrics.install(engine, repeat_threshold=3, raise_on_repeat=raise_on_repeat)
+    return engine
+
+def test_repeats_with_different_literals_are_reported():
+    engine = repeat_engine(raise_on_repeat=True)
+    with engine.connect() as connection, dbmetrics.scope("test"):
+        connection.execute(text("SELECT 1")).all()
+        connection.execute(text("SELECT 2")).all()
+        with pytest.raises(dbmetrics.NPlusOneError, match="executed 3 times"):
+            connection.execute(text("SELECT 3")).all()
+    engine.dispose()
+
+def test_repeats_are_counted_per_scope(caplog):
+    engine = repeat_engine(raise_on_repeat=False)
+    with engine.connect() as connection:
+        for _ in range(2):
+            with dbmetrics.scope("test") as stats:
+                for _ in range(2):
+                    connection.execute(text("SELECT 1")).all()
+        with dbmetrics.scope("test"):
+            for _ in range(5):
+                connection.execute(text("SELECT 1")).all()
+    engine.dispose()
+    assert stats.repeats == {"SELECT ?": 2}
+    warnings = [record.getMessage() for record in caplog.records if record.name == "dbmetrics"]
+    assert len(warnings) == 1 and warnings[0].startswith("Possible N+1 in test") # once per scope
@@ -0,0 +1,72 @@
+import pickle
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from models import BaseModel, Config, dump_json, load_json
+
+VALUES = [
+    None,
+    0,
+    -3.5,
+    "text with ünïcode",
+    [1, "two", None],
+    {"nested": {"list": [1, 2], "flag": True}},
+    {"Infantry", "Armor"},
+    frozenset({1, 2, 3}),
+    datetime(2024, 5, 17, 12, 30, 15, 250),
+    {"unit_types": {"Infantry"}, "EXTENSIONS": ["extensions.shop"], "seen": [datetime(2020, 1, 1)]},
+]
+
+@pytest.mark.parametrize("value", VALUES)
+def test_json_round_trip_keeps_value_and_type(value):
+    decoded = load_json(dump_json(value))
+    assert decoded == value
+    assert type(decoded) is type(value)
+
+def test_json_follows_plain_json_for_tuples_and_keys():
+    assert load_json(dump_json((1, 2))) == [1, 2]
+    assert load_json(dump_json({1: "a"})) == {"1": "a"}
+
+def test_json_refuses_unregistered_types():
+    with pytest.raises(TypeError, match="JSON_CODECS"):
+        dump_json(complex(1, 2))
+
+def test_json_leaves_lookalike_dicts_alone():
+    value = {"__type__": "unknown", "value": [1]}
+    assert load_json(dump_json(value)) == value
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+@pytest.mark.parametrize("value", VALUES[1:]) # configs.value is not nullable
+def test_config_value_round_trips_through_the_database(session, value):
+    session.add(Config(key="key", value=value))
+    session.commit()
+    session.expunge_all()
+    stored = session.get(Config, "key").value
+    assert stored == value
+    assert type(stored) is type(value)
+
+def test_pickled_configs_are_migrated_and_broken_ones_left_alone():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for key, raw in (("good", pickle.dumps({"unit_types": {"Infantry"}})), ("truncated", b"\x80\x04garbage"), ("complex", pickle.dumps(complex(1, 2)))):
+            connection.execute(text("INSERT INTO configs (key, value) VALUES (:key, :value)"), {"key": key, "value": raw})
+    BaseModel.metadata.create_all(engine) # runs the after_create migrations again
+    with engine.connect() as connection:
+        rows = dict(connection.execute(text("SELECT key, value FROM configs")).all())
+    with sessionmaker(bind=engine)() as session:
+        assert session.get(Config, "good").value == {"unit_types": {"Infantry"}} # SQLite keeps the BLOB column, TypedJSON reads it all the same
+    engine.dispose()
+    assert load_json(rows["good"]) == {"unit_types": {"Infantry"}}
+    assert rows["truncated"] == b"\x80\x04garbage"
+    assert pickle.loads(rows["complex"]) == complex(1, 2)
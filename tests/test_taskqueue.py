@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from taskqueue import BULK, INTERACTIVE, CoalescingQueue, QueueTask
+
+def test_tasks_for_the_same_player_are_merged():
+    queue = CoalescingQueue()
+    assert queue.put_nowait(QueueTask.for_player(1, 7))
+    assert queue.put_nowait(QueueTask.for_player(0, 7))
+    assert queue.put_nowait(QueueTask.for_player(1, 7))
+    assert queue.qsize() == 1
+    assert queue.merged == 2
+    assert queue.get_nowait().kind == 0 # a create beats an update
+
+def test_merged_task_keeps_the_earliest_enqueue_time():
+    queue = CoalescingQueue()
+    queue.put_nowait(QueueTask(1, "Player", 7, enqueued_at=100.0))
+    queue.put_nowait(QueueTask(1, "Player", 7, enqueued_at=50.0))
+    assert queue.get_nowait().enqueued_at == 50.0
+
+def test_control_tasks_never_merge():
+    queue = CoalescingQueue()
+    queue.put_nowait(QueueTask(4))
+    queue.put_nowait(QueueTask(4))
+    assert queue.qsize() == 2
+    assert queue.merged == 0
+
+def test_debounce_holds_a_task_until_it_is_ready():
+    queue = CoalescingQueue(debounce=0.05)
+    queue.put_nowait(QueueTask.for_player(1, 7))
+    with pytest.raises(asyncio.QueueEmpty):
+        queue.get_nowait()
+    time.sleep(0.06)
+    assert queue.get_nowait().id == 7
+
+def test_checked_out_key_is_not_handed_out_twice():
+    queue = CoalescingQueue()
+    queue.put_nowait(QueueTask.for_player(1, 7))
+    task = queue.get_nowait()
+    queue.put_nowait(QueueTask.for_player(1, 7))
+    with pytest.raises(asyncio.QueueEmpty):
+        queue.get_nowait() # another worker is still publishing player 7
+    queue.task_done(task)
+    assert queue.get_nowait().id == 7
+
+def test_join_waits_for_task_done():
+    async def scenario():
+        queue = CoalescingQueue()
+        for player_id in range(3):
+            queue.put_nowait(QueueTask.for_player(1, player_id))
+        queue.put_nowait(QueueTask.for_player(1, 0)) # merged, must not need its own task_done
+        join = asyncio.create_task(queue.join())
+        tasks = [await queue.get() for _ in range(3)]
+        await asyncio.sleep(0)
+        assert not join.done()
+        for task in tasks:
+            queue.task_done(task)
+        await asyncio.wait_for(join, 1)
+
+    asyncio.run(scenario())
+
+def test_task_done_too_many_times_raises():
+    queue = CoalescingQueue()
+    queue.put_nowait(QueueTask.for_player(1, 7))
+    queue.task_done(queue.get_nowait())
+    with pytest.raises(ValueError):
+        queue.task_done()
+
+def test_clear_drops_pending_and_delayed_tasks():
+    async def scenario():
+        queue = CoalescingQueue()
+        queue.put_nowait(QueueTask.for_player(1, 1))
+        queue.put_nowait(QueueTask.for_player(1, 2))
+        queue.schedule(QueueTask.for_player(1, 3), 60)
+        assert queue.clear() == 3
+        assert queue.empty() and queue.delayed == 0
+        await asyncio.wait_for(queue.join(), 1)
+
+    asyncio.run(scenario())
+
+def drain(queue: CoalescingQueue) -> list[QueueTask]:
+    """Take and finish every task the queue hands out, including deferred ones."""
+
+    tasks = []
+    while True:
+        try:
+            task = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return tasks
+        tasks.append(task)
+        queue.task_done(task)
+
+def test_tasks_over_the_quota_are_deferred_not_dropped():
+    queue = CoalescingQueue(quotas={BULK: 2})
+    results = [queue.put_nowait(QueueTask.for_player(0, player_id), BULK) for player_id in range(5)]
+    assert results == [True, True, False, False, False]
+    assert queue.qsize() == 2
+    assert queue.deferred == 3
+    tasks = drain(queue)
+    assert [task.id for task in tasks] == [0, 1, 2, 3, 4] # deferred tasks keep their order
+    assert all(task.kind == 0 for task in tasks)
+    assert queue.deferred == 0
+
+def test_watermark_defers_bulk_work_but_not_interactive():
+    queue = CoalescingQueue(high_watermark=4, low_watermark=2)
+    for player_id in range(8):
+        queue.put_nowait(QueueTask.for_player(0, player_id), BULK)
+    assert queue.shedding
+    assert queue.deferred == 4
+    assert queue.put_nowait(QueueTask.for_player(1, 100), INTERACTIVE)
+    assert queue.put_nowait(QueueTask(2, "Unit", 5), BULK) is False # deletes are deferred like everything else
+    assert sorted((task.kind, task.id) for task in drain(queue)) == [(0, player_id) for player_id in range(8)] + [(1, 100), (2, 5)]
+    assert not queue.shedding
+
+def test_duplicates_merge_into_deferred_tasks():
+    queue = CoalescingQueue(quotas={BULK: 1})
+    queue.put_nowait(QueueTask.for_player(1, 1), BULK)
+    queue.put_nowait(QueueTask.for_player(0, 2), BULK)
+    assert queue.put_nowait(QueueTask.for_player(1, 2), BULK) is False # merged, still deferred
+    assert queue.deferred == 1
+    assert queue.merged == 1
+    assert queue.put_nowait(QueueTask.for_player(1, 2), INTERACTIVE) # promoted and admitted
+    assert queue.deferred == 0
+    tasks = drain(queue)
+    assert [(task.kind, task.id) for task in tasks] == [(0, 2), (1, 1)]
+
+def test_join_waits_for_deferred_tasks():
+    async def scenario():
+        queue = CoalescingQueue(quotas={BULK: 1})
+        for player_id in range(3):
+            queue.put_nowait(QueueTask.for_player(1, player_id), BULK)
+        join = asyncio.create_task(queue.join())
+        queue.task_done(queue.get_nowait())
+        await asyncio.sleep(0)
+        assert not join.done()
+        drain(queue)
+        await asyncio.wait_for(join, 1)
+
+    asyncio.run(scenario())
+
+def test_clear_drops_deferred_tasks():
+    async def scenario():
+        queue = CoalescingQueue(quotas={BULK: 1})
+        for player_id in range(3):
+            queue.put_nowait(QueueTask.for_player(1, player_id), BULK)
+        assert queue.clear() == 3
+        assert queue.deferred == 0
+        await asyncio.wait_for(queue.join(), 1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+import asyncio
+import gc
+import weakref
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import dbmetrics
+from utils import uses_db
+
+def test_task_scoped_sessions_are_removed_when_the_task_ends():
+    engine = create_engine("sqlite://")
+    decorator = uses_db(sessionmaker(bind=engine), scopefunc=asyncio.current_task)
+    sessions = weakref.WeakSet()
+
+    @decorator
+    async def inner(session):
+        sessions.add(session)
+        return session
+
+    @decorator
+    async def outer(session):
+        session.execute(text("SELECT 1"))
+        assert await inner() is session # nested calls share the task's session
+        await asyncio.sleep(0) # let the other tasks run in between
+        assert await inner() is session # the nested call didn't remove it, nor did the other tasks replace it
+
+    async def scenario():
+        await asyncio.gather(*(asyncio.create_task(outer()) for _ in range(100)))
+
+    asyncio.run(scenario())
+    gc.collect()
+    assert len(sessions) == 0 # nothing left in the registry
+    engine.dispose()
+
+def test_metrics_scope_can_be_left_to_the_function():
+    engine = create_engine("sqlite://")
+    decorator = uses_db(sessionmaker(bind=engine))
+
+    @decorator
+    def scoped(session):
+        return dbmetrics._current.get()
+
+    def unscoped(session):
+        return dbmetrics._current.get()
+
+    assert scoped().name.endswith("scoped")
+    assert decorator(unscoped, metrics_scope=False)() is None
+    engine.dispose()
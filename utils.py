@@ -1,8 +1,11 @@
 import asyncio
 from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from dataclasses import InitVar, dataclass, field
 from datetime import datetime
 from functools import lru_cache, wraps
+import hashlib
 import inspect
 from inspect import Parameter, Signature
 from io import BytesIO
@@ -10,15 +13,18 @@ import logging
 from logging import Logger, getLogger
 import os
 import re
+import threading
+import time
 import traceback
 from types import FunctionType
 from typing import TYPE_CHECKING, Any, Callable, Coroutine, Generator, Iterable, Iterator, ParamSpec, TypeVar, cast
 
+import dbmetrics
 import discord
 from discord import Interaction, abc, app_commands as ac
 from discord.ui import Item
 import pandas as pd
-from prometheus_client import Counter, Gauge
+from prometheus_client import Counter, Gauge, Histogram
 from sqlalchemy import ColumnElement, true
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import scoped_session
@@ -102,7 +108,7 @@ async def _notify_owner_mysql_error_4031():
             from customclient import CustomClient
         bot = CustomClient()
         owner_id = EnvironHelpers.required_int("BOT_OWNER_ID")
-        owner = await bot.fetch_user(owner_id)
+        owner = await bot.get_or_fetch_user(owner_id)
         if owner:
             await owner.send("⚠️ **MySQL Error 4031 Detected**\n\nThe bot encountered MySQL error 4031 (client disconnected by server). Please restart the bot.")
             logger.info(f"Notified owner {owner_id} about MySQL error 4031")
@@ -112,6 +118,57 @@ async def _notify_owner_mysql_error_4031():
 created_sessions = Counter("armcobot_created_sessions_total", "Total number of sessions created", labelnames=["scope"])
 inflight_sessions = Gauge("armcobot_inflight_sessions", "Number of sessions currently in use", labelnames=["scope"])
 error_counter = Counter("armcobot_errors_total", "Total number of errors", labelnames=["guild_name", "error"])
+db_offload_queue_depth = Gauge("armcobot_db_offload_queue_depth", "Number of offloaded database calls waiting for a worker thread")
+db_offload_wait_time = Histogram("armcobot_db_offload_wait_seconds", "Seconds an offloaded database call waited for a worker thread", labelnames=["scope"],
+                                 buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+_db_executor: ThreadPoolExecutor | None = None
+_db_loop: asyncio.AbstractEventLoop | None = None # the event loop offloaded calls were submitted from
+
+def _get_db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        # one thread per connection the engine pool can hand out (pool_size + max_overflow in main.py)
+        _db_executor = ThreadPoolExecutor(max_workers=max(1, EnvironHelpers.get_int("DB_OFFLOAD_WORKERS", 30)), thread_name_prefix="db-offload")
+    return _db_executor
+
+async def run_offloaded(func: Callable[..., R], /, *args: Any, scope: str | None = None, **kwargs: Any) -> R:
+    """
+    Run a blocking database call on the bounded database thread pool and await its result,
+    so the event loop keeps serving heartbeats and interactions meanwhile.
+
+    Args:
+        func: The blocking callable, usually a `uses_db` function, which then gets a session
+            confined to the worker thread.
+        scope: Label for the wait time metric, the callable's qualified name by default.
+
+    Returns:
+        Whatever `func` returns; its exceptions are raised here.
+    """
+
+    global _db_loop
+    _db_loop = asyncio.get_running_loop()
+    scope = scope or fqn(func)
+    submitted = time.monotonic()
+    lock = threading.Lock()
+    waiting = [True]
+
+    def leave_queue() -> None:
+        with lock:
+            if waiting[0]:
+                waiting[0] = False
+                db_offload_queue_depth.dec()
+
+    def run() -> R:
+        leave_queue()
+        db_offload_wait_time.labels(scope=scope).observe(time.monotonic() - submitted)
+        return func(*args, **kwargs)
+
+    db_offload_queue_depth.inc()
+    try:
+        return await _db_loop.run_in_executor(_get_db_executor(), run)
+    finally:
+        leave_queue() # cancelled before a thread picked it up
 
 def fqn(func: Callable) -> str:
     """
@@ -127,32 +184,53 @@ def fqn(func: Callable) -> str:
 
     return f"{func.__module__}.{func.__qualname__}".replace(".<locals>.", ".").replace("<lambda>", "lambda")
 
-def uses_db(sessionmaker):
+def uses_db(sessionmaker, scopefunc: Callable[[], Any] | None = None, offload: bool = False):
     """
     Decorator that injects a SQLAlchemy scoped session as the `session` keyword
     argument to the wrapped function. Commits on success, rolls back on
     RollbackException or other exceptions. Handles MySQL error 4031 by
     notifying the bot owner.
 
+    With `offload=True` the wrapped function must be synchronous; the decorated
+    function becomes a coroutine function that runs it through `run_offloaded` on
+    the database thread pool, with a thread-local session that never leaves the
+    worker thread. Nothing the function returns should need that session afterwards.
+
     Args:
         sessionmaker: A callable that returns a Session (e.g. sessionmaker()
             from SQLAlchemy).
+        scopefunc: Optional scope function for the scoped session. Defaults to
+            thread-local scoping; pass `asyncio.current_task` to give each task
+            its own session when several tasks use the decorated functions
+            concurrently. Nested calls in the same scope share the session, the
+            outermost call removes it from the registry when it returns. Ignored
+            when offloading.
+        offload: Run the function on the database thread pool instead of the
+            event loop.
 
     Returns:
         A decorator that wraps sync or async functions and provides a
         session. The wrapped function must accept a `session` keyword argument.
+        Pass `metrics_scope=False` to the decorator for functions that never return,
+        like a worker loop: their `dbmetrics.scope` would never close, so they should
+        open one per unit of work themselves.
     """
 
-    session_scope = scoped_session(sessionmaker)
-    def decorator(func):
+    session_scope = scoped_session(sessionmaker, scopefunc=None if offload else scopefunc)
+    # task keyed registries would keep one session per task forever, so those entries are removed again
+    task_scoped = scopefunc is not None and not offload
+    def decorator(func, metrics_scope: bool = True):
         logger.debug(f"decorating {func.__name__}")
+        if offload and inspect.iscoroutinefunction(func):
+            raise TypeError(f"uses_db can only offload synchronous functions, not {fqn(func)}")
         original_signature = Signature.from_callable(func)
         new_params = [param for name, param in original_signature.parameters.items() if name != "session"]
         new_signature = original_signature.replace(parameters=new_params)
         if inspect.iscoroutinefunction(func):
             @wraps(func)
             async def wrapper(*args, **kwargs):
-                with session_scope() as session:
+                owner = task_scoped and not session_scope.registry.has()
+                with session_scope() as session, (dbmetrics.scope(fqn(func)) if metrics_scope else nullcontext()):
                     try:
                         logger.debug(f"calling {fqn(func)}")
                         created_sessions.labels(scope=fqn(func)).inc()
@@ -195,10 +273,13 @@ def uses_db(sessionmaker):
                         raise e
                     finally:
                         inflight_sessions.labels(scope=fqn(func)).dec()
+                        if owner:
+                            session_scope.remove()
         else:
             @wraps(func)
             def wrapper(*args, **kwargs):
-                with session_scope() as session:
+                owner = task_scoped and not session_scope.registry.has()
+                with session_scope() as session, (dbmetrics.scope(fqn(func)) if metrics_scope else nullcontext()):
                     try:
                         logger.debug(f"calling {fqn(func)}")
                         created_sessions.labels(scope=fqn(func)).inc()
@@ -232,11 +313,15 @@ def uses_db(sessionmaker):
                                     loop = asyncio.get_running_loop()
                                     asyncio.create_task(_notify_owner_mysql_error_4031())
                                 except RuntimeError:
-                                    # No running loop, create a new one
-                                    loop = asyncio.new_event_loop()
-                                    asyncio.set_event_loop(loop)
-                                    loop.run_until_complete(_notify_owner_mysql_error_4031())
-                                    loop.close()
+                                    if _db_loop is not None and _db_loop.is_running():
+                                        # offloaded to a worker thread, notify from the bot's loop
+                                        asyncio.run_coroutine_threadsafe(_notify_owner_mysql_error_4031(), _db_loop)
+                                    else:
+                                        # No running loop, create a new one
+                                        loop = asyncio.new_event_loop()
+                                        asyncio.set_event_loop(loop)
+                                        loop.run_until_complete(_notify_owner_mysql_error_4031())
+                                        loop.close()
                             except Exception as notify_error:
                                 logger.error(f"Failed to notify owner about MySQL error 4031: {notify_error}")
                         logger.debug(f"rolling back session for {fqn(func)} due to OperationalError")
@@ -250,10 +335,121 @@ def uses_db(sessionmaker):
                         raise e
                     finally:
                         inflight_sessions.labels(scope=fqn(func)).dec()
+                        if owner:
+                            session_scope.remove()
+        if offload:
+            blocking = wrapper
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await run_offloaded(blocking, *args, scope=fqn(func), **kwargs)
         wrapper.__signature__ = new_signature # type: ignore[attr-defined]
         return wrapper
     return decorator
 
+def _mysql_error_code(e: OperationalError) -> int | None:
+    """The MySQL error number of an OperationalError, or None if the driver didn't give one."""
+
+    orig = getattr(e, "orig", None)
+    if orig is None:
+        return None
+    # errno first (PyMySQL, aiomysql), then args[0] (mysqlclient)
+    if hasattr(orig, "errno"):
+        return orig.errno
+    if getattr(orig, "args", None):
+        return orig.args[0]
+    return None
+
+def uses_async_db(sessionmaker):
+    """
+    Decorator that injects a SQLAlchemy AsyncSession as the `session` keyword argument
+    to the wrapped coroutine function, so its queries are awaited instead of blocking the
+    event loop. Same contract as `uses_db`: commits on success, rolls back on
+    RollbackException or other exceptions, counts the session in the session metrics and
+    notifies the bot owner on MySQL error 4031.
+
+    Code written against the sync Session can be moved over as is with
+    `await session.run_sync(func)`, which runs `func(sync_session)` on the async driver.
+
+    Args:
+        sessionmaker: An `async_sessionmaker`, e.g. `CustomClient().async_sessionmaker`.
+            Each call gets its own session.
+
+    Returns:
+        A decorator for coroutine functions that accept a `session` keyword argument.
+    """
+
+    if sessionmaker is None:
+        raise ValueError("uses_async_db needs an async_sessionmaker, set ASYNC_DATABASE and install the async driver")
+    def decorator(func):
+        if not inspect.iscoroutinefunction(func):
+            raise TypeError(f"uses_async_db can only decorate coroutine functions, not {fqn(func)}")
+        logger.debug(f"decorating {func.__name__}")
+        original_signature = Signature.from_callable(func)
+        new_signature = original_signature.replace(parameters=[param for name, param in original_signature.parameters.items() if name != "session"])
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with sessionmaker() as session:
+                with dbmetrics.scope(fqn(func)):
+                    try:
+                        logger.debug(f"calling {fqn(func)}")
+                        created_sessions.labels(scope=fqn(func)).inc()
+                        inflight_sessions.labels(scope=fqn(func)).inc()
+                        result = await func(*args, session=session, **kwargs)
+                        logger.debug(f"commiting session for {fqn(func)}")
+                        await session.commit()
+                        logger.debug(f"committed session for {fqn(func)}")
+                        return result
+                    except RollbackException:
+                        logger.debug(f"rolling back session for {fqn(func)}")
+                        await session.rollback()
+                        return None
+                    except OperationalError as e:
+                        if _mysql_error_code(e) == 4031:
+                            logger.error(f"MySQL OperationalError 4031 detected in {fqn(func)}, notifying owner")
+                            try:
+                                await _notify_owner_mysql_error_4031()
+                            except Exception as notify_error:
+                                logger.error(f"Failed to notify owner about MySQL error 4031: {notify_error}")
+                        logger.debug(f"rolling back session for {fqn(func)} due to OperationalError")
+                        await session.rollback()
+                        raise e
+                    except Exception as e:
+                        logger.debug(f"rolling back session for {fqn(func)} due to unhandled exception")
+                        await session.rollback()
+                        raise e
+                    finally:
+                        inflight_sessions.labels(scope=fqn(func)).dec()
+        wrapper.__signature__ = new_signature # type: ignore[attr-defined]
+        return wrapper
+    return decorator
+
+# async drivers for the sync database backends, the first one installed is used
+ASYNC_DRIVERS = {
+    "mysql": ("aiomysql", "asyncmy"),
+    "mariadb": ("aiomysql", "asyncmy"),
+    "sqlite": ("aiosqlite",),
+    "postgresql": ("asyncpg", "psycopg"),
+}
+
+def async_database_url(database_url: str) -> str | None:
+    """
+    Derive the URL of the async database engine from the sync DATABASE_URL by swapping
+    its driver for an installed async one.
+
+    Returns:
+        The async URL, or None if no async driver for the backend is installed.
+    """
+
+    from importlib.util import find_spec
+    from sqlalchemy.engine import make_url
+
+    url = make_url(database_url)
+    for driver in ASYNC_DRIVERS.get(url.get_backend_name(), ()):
+        if find_spec(driver) is not None:
+            return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+    return None
+
 
 def string_to_list(string: str) -> list[str]:
     """
@@ -933,7 +1129,8 @@ def fuzzy_autocomplete(column: ColumnElement[str], *union_columns: ColumnElement
     )
 
     async def autocomplete(interaction: Interaction, current: str):
-        return [ac.Choice(name=item, value=item) for item in lookup(current.strip().lower())]
+        # cache misses query the database, which must not hold up the event loop while the user types
+        return [ac.Choice(name=item, value=item) for item in await run_offloaded(lookup, current.strip().lower(), scope=fqn(fuzzy_autocomplete))]
 
     # Register the cache in the global registry
     fuzzy_autocomplete_caches.append(lookup)
@@ -1243,6 +1440,20 @@ def hide_arg(arg_name: str, default: Any) -> Callable[[F], F]:
         return cast(F, wrapper)
     return _decorator
 
+def content_hash(content: str) -> str:
+    """
+    Hash the rendered content of a Discord message, so a later render can be compared
+    against what was last published without fetching the message.
+
+    Args:
+        content: The message content.
+
+    Returns:
+        The hex SHA-256 digest of the content, 64 characters long.
+    """
+
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
 def chunked_join(items: Iterable[str], chunk_size: int = 2000, separator: str = " ") -> Generator[str, None, None]:
     """
     Join strings into chunks that do not exceed chunk_size (e.g. Discord
@@ -1363,4 +1574,55 @@ class RecordingModal(discord.ui.Modal):
 class RecordingLayoutView(discord.ui.LayoutView):
     @on_error_decorator(error_counter, has_self=True)
     async def on_error(self, interaction: Interaction, error: Exception, item: Item[Any], /) -> None:
-        return await super().on_error(interaction, error, item)
\ No newline at end of file
+        return await super().on_error(interaction, error, item)
+
+def paginate(content: str, limit: int = 2000) -> list[str]:
+    """
+    Split message content into pages of at most `limit` characters, so content longer
+    than a Discord message can be sent as several messages. Pages break before a
+    markdown heading where possible so a unit is not split across messages, then at
+    line ends, and only cut a line that is longer than a whole page.
+
+    Args:
+        content: The message content.
+        limit: The maximum length of a page, Discord's message limit by default.
+
+    Returns:
+        The pages in order, a single page if the content fits in one message.
+    """
+
+    if len(content) <= limit:
+        return [content]
+    # sections start at a heading line, the first one holds everything before the first heading
+    sections: list[str] = []
+    for line in content.splitlines(keepends=True):
+        if not sections or line.startswith("#"):
+            sections.append(line)
+        else:
+            sections[-1] += line
+    pages: list[str] = []
+    page = ""
+    for section in sections:
+        if len(page) + len(section) <= limit:
+            page += section
+            continue
+        if page:
+            pages.append(page)
+            page = ""
+        if len(section) <= limit:
+            page = section
+            continue
+        for line in section.splitlines(keepends=True):
+            while len(line) > limit:
+                if page:
+                    pages.append(page)
+                    page = ""
+                pages.append(line[:limit])
+                line = line[limit:]
+            if len(page) + len(line) > limit:
+                pages.append(page)
+                page = ""
+            page += line
+    if page:
+        pages.append(page)
+    return [page for page in pages if page.strip()] or [content[:limit]]